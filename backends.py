@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Inference Backends
+The stage functions talk to whatever connect() returns through one call,
+predict(**kwargs), with the same arguments and return values as the
+Gradio Spaces. Besides the remote Spaces (spaces.SpaceClient) that call can
+go to:
+
+    HTTPBackend   a model server on our own box, e.g. http://gpu-box:8000
+    StubBackend   an in-process CPU stand-in for CI, demos and load tests
+
+Pick a backend per stage in .env / the environment:
+    VTON_STEP1_BACKEND=gradio                  # virtual try-on (default)
+    VTON_STEP2_BACKEND=http://gpu-box:8000     # IDM refinement
+    VTON_STEP2_BACKEND=stub
+
+HTTP protocol (what a model server implements): POST <base_url><api_name>
+(e.g. /virtual_tryon, /tryon) as multipart/form-data with a "params" part
+holding the predict kwargs as JSON, in which every file is replaced by
+{"file": "<part name>"}, plus one part per file. The answer is JSON
+{"files": [{"name": "image.png", "data": "<base64>"}, ...]}: one file is
+returned as a path, several as a tuple, like the Spaces do.
+
+Usage:
+    python backends.py serve --port 8000     # reference server backed by the stub
+"""
+
+import argparse
+import base64
+import email
+import email.policy
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+from PIL import Image
+
+from compositing import region_box
+from downloads import call_dir
+
+HTTP_TIMEOUT = 300
+
+
+def _is_file(value):
+    return isinstance(value, dict) and isinstance(value.get("path"), str)
+
+
+def _file_path(value):
+    return value["path"] if _is_file(value) else None
+
+
+class StubBackend:
+    """
+    Deterministic CPU stand-in for both Spaces: the garment is pasted over
+    its region of the person and IDM-VTON's gray "masked person" image is
+    imitated, so mask caching and compositing behave as with the real
+    models. `latency` (+ up to `jitter`) seconds of sleep per call model the
+    remote service for load tests; with `slots`, at most that many calls per
+    Space are served at once (process-wide) and the rest queue, like a Space
+    with a fixed number of GPU workers.
+    """
+
+    backend = "stub"
+    _capacity = {}
+    _capacity_lock = threading.Lock()
+
+    def __init__(self, space, latency=0.0, jitter=0.0, seed=None, slots=None):
+        self.space = space
+        self.latency = latency
+        self.jitter = jitter
+        self.slots = slots
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, space):
+        return cls(space, latency=float(os.getenv("VTON_STUB_LATENCY", 0)),
+                   jitter=float(os.getenv("VTON_STUB_JITTER", 0)),
+                   slots=int(os.getenv("VTON_STUB_SLOTS", 0)) or None)
+
+    def _slot(self):
+        """Semaphore shared by every stub of this Space (a new backend is built per connect)"""
+        with StubBackend._capacity_lock:
+            key = (self.space, self.slots)
+            if key not in StubBackend._capacity:
+                StubBackend._capacity[key] = threading.BoundedSemaphore(self.slots)
+            return StubBackend._capacity[key]
+
+    def _sleep(self):
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+    def _serve(self):
+        if not self.slots:
+            self._sleep()
+            return
+        with self._slot():
+            self._sleep()
+
+    def _try_on(self, person_path, garment_path, garment_type, mask_path=None, with_mask=True):
+        out_dir = Path(call_dir("stub"))
+        with Image.open(person_path) as person, Image.open(garment_path) as garment:
+            person = person.convert("RGB")
+            box = tuple(int(v) for v in region_box(person.size, garment_type, mask_path=mask_path))
+            size = (max(box[2] - box[0], 1), max(box[3] - box[1], 1))
+            patch = garment.convert("RGB").resize(size)
+            result = person.copy()
+            result.paste(Image.blend(person.crop(box), patch, 0.85), box[:2])
+            masked = person.copy()
+            masked.paste((128, 128, 128), box)
+        result_path, mask_out = out_dir / "image.png", out_dir / "mask.png"
+        # Fast PNG compression: under load the stand-in's own CPU time should not dominate
+        result.save(result_path, compress_level=1)
+        if not with_mask:
+            # virtual-try-on returns the image only
+            return str(result_path), None
+        masked.save(mask_out, compress_level=1)
+        return str(result_path), str(mask_out)
+
+    def predict(self, api_name=None, **kwargs):
+        self._serve()
+        if api_name == "/virtual_tryon":
+            result, _ = self._try_on(_file_path(kwargs["person_path"]), _file_path(kwargs["garment_path"]),
+                                     kwargs.get("garment_type", "upper_body"), with_mask=False)
+            return result
+        if api_name == "/tryon":
+            editor = kwargs["dict"]
+            layers = [_file_path(layer) for layer in editor.get("layers") or [] if _is_file(layer)]
+            return self._try_on(_file_path(editor["background"]), _file_path(kwargs["garm_img"]),
+                                "upper_body", mask_path=layers[0] if layers else None)
+        raise ValueError(f"Stub backend does not implement {api_name}")
+
+
+def _split_files(kwargs):
+    """kwargs -> (JSON-able params with {"file": name} placeholders, {name: path})"""
+    files = {}
+
+    def walk(value):
+        if _is_file(value) and not value["path"].startswith(("http://", "https://")):
+            name = f"f{len(files)}"
+            files[name] = value["path"]
+            return {"file": name}
+        if isinstance(value, dict):
+            return {k: walk(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [walk(v) for v in value]
+        return value
+
+    return walk(kwargs), files
+
+
+def _decode_files(payload, out_dir):
+    paths = []
+    for i, item in enumerate(payload["files"]):
+        path = Path(out_dir) / f"{i}_{Path(item.get('name') or 'output.png').name}"
+        path.write_bytes(base64.b64decode(item["data"]))
+        paths.append(str(path))
+    return paths[0] if len(paths) == 1 else tuple(paths)
+
+
+class HTTPBackend:
+    """Client for a model server speaking the protocol above, over one keep-alive connection pool"""
+
+    backend = "http"
+
+    def __init__(self, space, base_url, timeout=HTTP_TIMEOUT, http=None):
+        self.space = space
+        self.base_url = base_url.rstrip("/")
+        self.http = http or _shared_http(timeout)
+
+    def predict(self, api_name=None, **kwargs):
+        params, files = _split_files(kwargs)
+        handles = {name: open(path, "rb") for name, path in files.items()}
+        try:
+            response = self.http.post(
+                f"{self.base_url}{api_name}",
+                data={"params": json.dumps(params)},
+                files={name: (Path(files[name]).name, handle) for name, handle in handles.items()},
+            )
+        finally:
+            for handle in handles.values():
+                handle.close()
+        response.raise_for_status()
+        return _decode_files(response.json(), call_dir("http"))
+
+
+_http_clients = {}
+_http_lock = threading.Lock()
+
+
+def _shared_http(timeout):
+    with _http_lock:
+        if timeout not in _http_clients:
+            _http_clients[timeout] = httpx.Client(timeout=timeout, limits=httpx.Limits(max_keepalive_connections=8))
+        return _http_clients[timeout]
+
+
+def backend_spec(stage):
+    """Configured backend for "step1" / "step2": 'gradio', 'stub' or a base URL"""
+    return os.getenv(f"VTON_{stage.upper()}_BACKEND", "gradio").strip() or "gradio"
+
+
+def make_backend(spec, space):
+    """Build a non-Gradio backend from its spec (None for 'gradio')"""
+    if spec == "gradio":
+        return None
+    if spec == "stub":
+        return StubBackend.from_env(space)
+    if spec.startswith(("http://", "https://")):
+        return HTTPBackend(space, spec)
+    raise ValueError(f"Unknown backend '{spec}' (use gradio, stub or an http:// URL)")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Reference model server: decodes the protocol and answers with the stub"""
+
+    backends = {}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        message = email.message_from_bytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + body, policy=email.policy.HTTP
+        )
+        parts = {part.get_param("name", header="content-disposition"): part for part in message.iter_parts()}
+        work_dir = tempfile.mkdtemp(prefix="vton_serve_")
+        try:
+            files = {}
+            for name, part in parts.items():
+                if name != "params":
+                    path = Path(work_dir) / f"{name}_{Path(part.get_filename() or 'upload.png').name}"
+                    path.write_bytes(part.get_payload(decode=True))
+                    files[name] = str(path)
+
+            def restore(value):
+                if isinstance(value, dict) and set(value) == {"file"}:
+                    return {"path": files[value["file"]], "meta": {"_type": "gradio.FileData"}}
+                if isinstance(value, dict):
+                    return {k: restore(v) for k, v in value.items()}
+                if isinstance(value, list):
+                    return [restore(v) for v in value]
+                return value
+
+            kwargs = restore(json.loads(parts["params"].get_payload(decode=True)))
+            result = self.backends.setdefault(self.path, StubBackend.from_env(self.path)).predict(
+                api_name=self.path, **kwargs)
+            outputs = [result] if isinstance(result, str) else list(result)
+            payload = {"files": [{"name": Path(p).name, "data": base64.b64encode(Path(p).read_bytes()).decode()}
+                                 for p in outputs]}
+            status, body = 200, json.dumps(payload).encode()
+        except Exception as e:
+            status, body = 500, json.dumps({"error": str(e)}).encode()
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=8000, host="127.0.0.1"):
+    """Start the reference server; returns the (not yet serving) ThreadingHTTPServer"""
+    return ThreadingHTTPServer((host, port), _StubHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reference model server backed by the CPU stub")
+    parser.add_argument("command", choices=["serve"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.host)
+    print(f"🧪 Stub model server on http://{args.host}:{args.port} (VTON_STEP1_BACKEND=http://{args.host}:{args.port})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
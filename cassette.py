@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Record/Replay Cassettes
+Captures every Space `predict` request and response (including the returned
+image files) into a cassette directory, and serves them back from disk so the
+pipelines can run offline and deterministically for tests and benchmarks.
+
+Enable from .env / the environment:
+    VTON_CASSETTE=./examples/cassettes/demo
+    VTON_CASSETTE_MODE=record        # or replay
+    VTON_CASSETTE_TIMING=1           # replay: sleep for the recorded duration
+    VTON_CASSETTE_SPEED=2            # ... divided by this (2 = twice as fast)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from downloads import call_dir
+from mask_cache import file_hash
+
+
+class CassetteMiss(KeyError):
+    """Replay found no recorded interaction for a request"""
+
+
+def is_file_data(value):
+    return isinstance(value, dict) and value.get("meta", {}).get("_type") == "gradio.FileData"
+
+
+def request_fingerprint(space, kwargs):
+    """
+    Canonical form of a predict call. Files are identified by their content,
+    not their (timestamped / temporary) path, so a replayed pipeline produces
+    the same keys as the recorded one.
+    """
+    def canonical(value):
+        if is_file_data(value):
+            return {"file_sha256": file_hash(value["path"])}
+        if isinstance(value, dict):
+            return {k: canonical(v) for k, v in sorted(value.items())}
+        if isinstance(value, (list, tuple)):
+            return [canonical(v) for v in value]
+        return value
+
+    return {"space": space, "kwargs": canonical(kwargs)}
+
+
+def request_key(fingerprint):
+    data = json.dumps(fingerprint, sort_keys=True, default=str).encode()
+    return hashlib.sha256(data).hexdigest()[:24]
+
+
+class Cassette:
+    """A directory of recorded interactions: interactions/<key>.json + files/"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.interactions_dir = self.path / "interactions"
+        self.files_dir = self.path / "files"
+        self._lock = threading.Lock()
+
+    def record(self, fingerprint, result, duration):
+        key = request_key(fingerprint)
+        with self._lock:
+            self.interactions_dir.mkdir(parents=True, exist_ok=True)
+            self.files_dir.mkdir(parents=True, exist_ok=True)
+            counter = [0]
+
+            def store(value):
+                if isinstance(value, dict) and "path" in value and Path(str(value["path"])).is_file():
+                    return {**value, "path": store(value["path"])}
+                if isinstance(value, str) and Path(value).is_file():
+                    name = f"{key}_{counter[0]}{Path(value).suffix}"
+                    counter[0] += 1
+                    shutil.copy(value, self.files_dir / name)
+                    return {"__file__": name}
+                if isinstance(value, (list, tuple)):
+                    return {"__tuple__" if isinstance(value, tuple) else "__list__": [store(v) for v in value]}
+                return value
+
+            entry = {
+                "request": fingerprint,
+                "duration": round(duration, 4),
+                "recorded_at": time.time(),
+                "result": store(result),
+            }
+            (self.interactions_dir / f"{key}.json").write_text(json.dumps(entry, indent=2, default=str))
+        return key
+
+    def replay(self, fingerprint):
+        """Return (result, recorded duration); files are copied to a fresh download directory"""
+        key = request_key(fingerprint)
+        entry_path = self.interactions_dir / f"{key}.json"
+        if not entry_path.exists():
+            raise CassetteMiss(
+                f"No recorded interaction {key} for {fingerprint['space']} "
+                f"{fingerprint['kwargs'].get('api_name')} in {self.path}"
+            )
+        entry = json.loads(entry_path.read_text())
+        out_dir = Path(call_dir("replay"))
+
+        def load(value):
+            if isinstance(value, dict) and "__file__" in value:
+                dest = out_dir / value["__file__"]
+                shutil.copy(self.files_dir / value["__file__"], dest)
+                return str(dest)
+            if isinstance(value, dict) and "__tuple__" in value:
+                return tuple(load(v) for v in value["__tuple__"])
+            if isinstance(value, dict) and "__list__" in value:
+                return [load(v) for v in value["__list__"]]
+            if isinstance(value, dict):
+                return {k: load(v) for k, v in value.items()}
+            return value
+
+        return load(entry["result"]), entry["duration"]
+
+
+class CassetteClient:
+    """
+    Drop-in for SpaceClient. In record mode it forwards to `inner` and stores
+    the interaction; in replay mode it never touches the network.
+    """
+
+    def __init__(self, space, cassette, mode, inner=None, timing=False, speed=1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode == "record" and inner is None:
+            raise ValueError("Record mode needs an inner client")
+        self.space = space
+        self.cassette = cassette
+        self.mode = mode
+        self.inner = inner
+        self.timing = timing
+        self.speed = speed
+
+    def predict(self, **kwargs):
+        fingerprint = request_fingerprint(self.space, kwargs)
+        if self.mode == "replay":
+            result, duration = self.cassette.replay(fingerprint)
+            if self.timing:
+                time.sleep(duration / self.speed)
+            return result
+
+        start_time = time.time()
+        result = self.inner.predict(**kwargs)
+        self.cassette.record(fingerprint, result, time.time() - start_time)
+        return result
+
+
+_active = None
+_active_loaded = False
+_active_lock = threading.Lock()
+
+
+def use_cassette(path, mode="replay", timing=False, speed=1.0):
+    """Turn cassette mode on for this process (path=None turns it off)"""
+    global _active, _active_loaded
+    with _active_lock:
+        _active = None if path is None else {
+            "cassette": Cassette(path), "mode": mode, "timing": timing, "speed": speed
+        }
+        _active_loaded = True
+
+
+def active_cassette():
+    """Current cassette settings (from VTON_CASSETTE* on first use), or None"""
+    global _active, _active_loaded
+    with _active_lock:
+        if not _active_loaded:
+            path = os.getenv("VTON_CASSETTE", "").strip()
+            if path:
+                _active = {
+                    "cassette": Cassette(path),
+                    "mode": os.getenv("VTON_CASSETTE_MODE", "replay").strip().lower(),
+                    "timing": os.getenv("VTON_CASSETTE_TIMING", "").strip().lower() in ("1", "true", "yes"),
+                    "speed": float(os.getenv("VTON_CASSETTE_SPEED", "1.0")),
+                }
+            _active_loaded = True
+        return _active
+
+
+def replaying():
+    """True when Space calls are served from a cassette (no token needed)"""
+    active = active_cassette()
+    return bool(active and active["mode"] == "replay")
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Crop-to-Region Compositing
+Crops the person image to the garment region before it is uploaded to
+IDM-VTON and blends the result back into the full-resolution original, so
+only the region that changes is sent and diffused.
+"""
+
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from mask_cache import binary_mask_from_output
+
+# Fallback region (left, top, right, bottom) of a centered full-body photo per garment type
+GARMENT_REGIONS = {
+    "upper_body": (0.10, 0.08, 0.90, 0.68),
+    "lower_body": (0.15, 0.40, 0.85, 1.00),
+    "dresses": (0.10, 0.08, 0.90, 1.00),
+}
+
+# IDM-VTON works at 768x1024, so crops are grown to a 3:4 (width:height) box
+TARGET_ASPECT = 3 / 4
+DEFAULT_MARGIN = 0.08
+DEFAULT_FEATHER = 12
+
+
+def region_box(image_size, garment_type, mask_path=None, margin=DEFAULT_MARGIN):
+    """
+    Return the (left, top, right, bottom) crop box for a garment type.
+
+    When a mask layer for this person is known its bounding box (plus
+    `margin` of its size on every side) is used, otherwise the fixed region
+    from GARMENT_REGIONS. The box is grown to 3:4 and kept inside the image.
+    """
+    width, height = image_size
+    box = None
+
+    if mask_path:
+        with Image.open(mask_path) as mask:
+            channel = mask.getchannel("A") if "A" in mask.getbands() else mask.convert("L")
+            bbox = channel.getbbox()
+            mask_width, mask_height = mask.size
+        if bbox:
+            sx, sy = width / mask_width, height / mask_height
+            left, top, right, bottom = bbox[0] * sx, bbox[1] * sy, bbox[2] * sx, bbox[3] * sy
+            mx, my = (right - left) * margin, (bottom - top) * margin
+            box = (left - mx, top - my, right + mx, bottom + my)
+
+    if box is None:
+        left, top, right, bottom = GARMENT_REGIONS.get(garment_type, GARMENT_REGIONS["upper_body"])
+        box = (left * width, top * height, right * width, bottom * height)
+
+    return _fit_aspect(box, width, height)
+
+
+def _fit_aspect(box, width, height, aspect=TARGET_ASPECT):
+    """Grow a box around its center to the target aspect and clamp it to the image"""
+    left, top, right, bottom = box
+    box_width, box_height = right - left, bottom - top
+
+    if box_width / box_height < aspect:
+        box_width = box_height * aspect
+    else:
+        box_height = box_width / aspect
+    box_width, box_height = min(box_width, width), min(box_height, height)
+
+    cx, cy = (left + right) / 2, (top + bottom) / 2
+    left = min(max(cx - box_width / 2, 0), width - box_width)
+    top = min(max(cy - box_height / 2, 0), height - box_height)
+    return (int(round(left)), int(round(top)),
+            int(round(left + box_width)), int(round(top + box_height)))
+
+
+def crop_to_region(image_path, garment_type, mask_path=None, margin=DEFAULT_MARGIN, output_dir=None):
+    """
+    Crop an image to its garment region.
+
+    Returns (crop_path, box, image_size); box and image_size are needed for
+    crop_layer() and paste_back().
+    """
+    output_dir = Path(output_dir or tempfile.mkdtemp(prefix="vton_crop_"))
+    with Image.open(image_path) as img:
+        image_size = img.size
+        box = region_box(image_size, garment_type, mask_path, margin)
+        crop_path = output_dir / f"{Path(image_path).stem}_{garment_type}_crop.png"
+        img.convert("RGB").crop(box).save(crop_path)
+    return str(crop_path), box, image_size
+
+
+def crop_layer(layer_path, box, image_size, output_dir=None):
+    """Crop a (possibly 768x1024) mask layer with a box given in image coordinates"""
+    output_dir = Path(output_dir or tempfile.mkdtemp(prefix="vton_crop_"))
+    with Image.open(layer_path) as layer:
+        sx, sy = layer.width / image_size[0], layer.height / image_size[1]
+        layer_box = (int(box[0] * sx), int(box[1] * sy), int(box[2] * sx), int(box[3] * sy))
+        crop_path = output_dir / f"{Path(layer_path).stem}_crop.png"
+        layer.crop(layer_box).save(crop_path)
+    return str(crop_path)
+
+
+def feathered_alpha(size, box, image_size, feather=DEFAULT_FEATHER):
+    """
+    Alpha for a pasted crop: opaque inside, ramping to zero over `feather`
+    pixels on every edge that is not on the image border.
+    """
+    width, height = size
+    ramp = max(feather, 1)
+    x = np.arange(width, dtype=np.float32)
+    y = np.arange(height, dtype=np.float32)
+
+    fade_x = np.ones(width, dtype=np.float32)
+    fade_y = np.ones(height, dtype=np.float32)
+    if box[0] > 0:
+        fade_x = np.minimum(fade_x, (x + 1) / ramp)
+    if box[2] < image_size[0]:
+        fade_x = np.minimum(fade_x, (width - x) / ramp)
+    if box[1] > 0:
+        fade_y = np.minimum(fade_y, (y + 1) / ramp)
+    if box[3] < image_size[1]:
+        fade_y = np.minimum(fade_y, (height - y) / ramp)
+
+    alpha = np.clip(np.outer(fade_y, fade_x), 0, 1)
+    return Image.fromarray((alpha * 255).astype(np.uint8))
+
+
+def paste_back(original_path, result_path, box, dest_path, blend_mask_path=None, feather=DEFAULT_FEATHER):
+    """
+    Blend a crop result back into the full-resolution original.
+
+    With `blend_mask_path` (the IDM-VTON mask preview of the crop) only the
+    garment region plus a soft edge is replaced; otherwise the whole box is
+    pasted with feathered edges. Pixels outside the blend stay untouched.
+    """
+    with Image.open(original_path) as original:
+        base = original.convert("RGB")
+    size = (box[2] - box[0], box[3] - box[1])
+
+    with Image.open(result_path) as result:
+        patch = result.convert("RGB").resize(size, Image.LANCZOS)
+
+    alpha = feathered_alpha(size, box, base.size, feather)
+    if blend_mask_path:
+        mask = binary_mask_from_output(blend_mask_path).resize(size)
+        grow = 2 * (feather // 2) + 1
+        mask = mask.filter(ImageFilter.MaxFilter(grow)).filter(ImageFilter.GaussianBlur(feather / 2))
+        alpha = Image.fromarray(np.minimum(np.asarray(alpha), np.asarray(mask)))
+
+    base.paste(patch, box[:2], alpha)
+    base.save(dest_path)
+    return str(dest_path)
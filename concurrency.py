@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency (AIMD)
+Each Space gets an in-flight limit that adapts to how the Space is coping,
+like TCP congestion control: every healthy call raises the limit by
+1/limit (about +1 per round of calls at the limit), and a call that shows
+congestion cuts it by half, at most once per round trip so a burst of slow
+calls counts as one signal. Congestion is:
+
+    queue wait   latency above the Space's no-load latency by more than
+                 `queue_tolerance` x that, while other calls of ours were in
+                 flight (a call running alone did not queue behind us)
+    over SLO     latency above the stage SLO (VTON_STEP1_SLO / VTON_STEP2_SLO)
+    error        any failure except token quota errors (the token
+                 scheduler handles those)
+
+Every stage call goes through spaces.connect(), which takes a slot here
+first, so batch runners and services only need a pool at least as large as
+VTON_AIMD_MAX and the controller decides how much of it each Space gets.
+
+Enable from .env / the environment:
+    VTON_AIMD=1
+    VTON_AIMD_INITIAL=2
+    VTON_AIMD_MAX=8
+    VTON_AIMD_TOLERANCE=1.0
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from token_scheduler import QUOTA_ERRORS
+
+DEFAULT_INITIAL = 2
+DEFAULT_MIN = 1
+DEFAULT_MAX = 8
+DEFAULT_DECREASE = 0.5
+DEFAULT_QUEUE_TOLERANCE = 1.0
+LATENCY_WINDOW = 50
+MIN_BASELINE_SAMPLES = 3
+
+
+class AIMDLimiter:
+    """In-flight limit of one Space: acquire() before a call, release() with its outcome after"""
+
+    def __init__(self, space, initial=DEFAULT_INITIAL, min_limit=DEFAULT_MIN, max_limit=DEFAULT_MAX,
+                 decrease=DEFAULT_DECREASE, queue_tolerance=DEFAULT_QUEUE_TOLERANCE, slo_seconds=None,
+                 clock=time.monotonic):
+        self.space = space
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.queue_tolerance = queue_tolerance
+        self.slo_seconds = slo_seconds
+        self.clock = clock
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self.waiting = 0
+        self.increases = 0
+        self.cuts = 0
+        self.last_signal = None
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._last_cut = -math.inf
+        self._cond = threading.Condition()
+
+    @property
+    def current(self):
+        """Whole number of calls allowed in flight right now"""
+        return max(self.min_limit, int(self.limit))
+
+    def baseline(self):
+        """
+        No-load latency estimate: the fastest of the last LATENCY_WINDOW
+        successful calls (None until enough samples). Every success is
+        recorded, congested or not, so a lasting shift in the Space's
+        latency moves the baseline within one window.
+        """
+        if len(self._latencies) < MIN_BASELINE_SAMPLES:
+            return None
+        return min(self._latencies)
+
+    def acquire(self):
+        """Block until a slot is free; returns the seconds spent waiting locally"""
+        start = self.clock()
+        with self._cond:
+            self.waiting += 1
+            while self.in_flight >= self.current:
+                self._cond.wait()
+            self.waiting -= 1
+            self.in_flight += 1
+        return self.clock() - start
+
+    def _congestion(self, seconds, error, in_flight):
+        if error is not None:
+            return f"error: {error}"
+        if self.slo_seconds and seconds > self.slo_seconds:
+            return f"{seconds:.0f}s vs {self.slo_seconds:.0f}s SLO"
+        baseline = self.baseline()
+        if in_flight > 1 and baseline is not None and seconds - baseline > baseline * self.queue_tolerance:
+            return f"queue wait ~{seconds - baseline:.0f}s"
+        return None
+
+    def release(self, seconds, error=None):
+        """Free the slot and adapt the limit to the call's outcome; returns (old, new) when it changed"""
+        # Quota errors say nothing about the Space's load: no cut, no growth
+        quota = error is not None and any(marker in str(error).lower() for marker in QUOTA_ERRORS)
+        with self._cond:
+            saturated = self.in_flight >= self.current or self.waiting > 0
+            in_flight = self.in_flight
+            self.in_flight -= 1
+            old = self.current
+            signal = None if quota else self._congestion(seconds, error, in_flight)
+            if error is None:
+                self._latencies.append(seconds)
+            if signal:
+                self.last_signal = signal
+                round_trip = self.baseline() or seconds
+                if self.clock() - self._last_cut >= round_trip:
+                    self.limit = max(float(self.min_limit), self.limit * self.decrease)
+                    self._last_cut = self.clock()
+                    self.cuts += 1
+            elif not quota:
+                # Only grow a limit that is actually in use
+                if saturated and self.limit < self.max_limit:
+                    self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+                    self.increases += 1
+            new = self.current
+            self._cond.notify_all()
+        if new != old:
+            print(f"🎚️  {self.space}: concurrency {old} → {new}" + (f" ({signal})" if signal else ""))
+            return old, new
+        return None
+
+    def status(self):
+        with self._cond:
+            return {"space": self.space, "limit": self.current, "in_flight": self.in_flight,
+                    "waiting": self.waiting, "baseline": self.baseline(), "increases": self.increases,
+                    "cuts": self.cuts, "last_signal": self.last_signal}
+
+
+class ConcurrencyController:
+    """AIMD limiters for all Spaces"""
+
+    def __init__(self, slos=None, initial=DEFAULT_INITIAL, min_limit=DEFAULT_MIN, max_limit=DEFAULT_MAX,
+                 decrease=DEFAULT_DECREASE, queue_tolerance=DEFAULT_QUEUE_TOLERANCE, clock=time.monotonic):
+        self.slos = dict(slos or {})
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.queue_tolerance = queue_tolerance
+        self.clock = clock
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, slos=None):
+        """Controller configured from VTON_AIMD_* (None unless VTON_AIMD is set)"""
+        if os.getenv("VTON_AIMD", "").strip().lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            slos=slos,
+            initial=int(os.getenv("VTON_AIMD_INITIAL", DEFAULT_INITIAL)),
+            max_limit=int(os.getenv("VTON_AIMD_MAX", DEFAULT_MAX)),
+            queue_tolerance=float(os.getenv("VTON_AIMD_TOLERANCE", DEFAULT_QUEUE_TOLERANCE)),
+        )
+
+    def limiter(self, space):
+        with self._lock:
+            if space not in self._limiters:
+                self._limiters[space] = AIMDLimiter(
+                    space, self.initial, self.min_limit, self.max_limit, self.decrease,
+                    self.queue_tolerance, self.slos.get(space), self.clock
+                )
+            return self._limiters[space]
+
+    def limit(self, space):
+        return self.limiter(space).current
+
+    def status(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.status() for limiter in limiters]
+
+    def print_report(self):
+        print("\n🎚️  Adaptive concurrency")
+        for entry in self.status():
+            baseline = f"{entry['baseline']:.1f}s" if entry["baseline"] is not None else "-"
+            print(f"   {entry['space']}: limit {entry['limit']} (no-load {baseline}, "
+                  f"{entry['increases']} increase(s), {entry['cuts']} cut(s)"
+                  + (f", last: {entry['last_signal']}" if entry["last_signal"] else "") + ")")
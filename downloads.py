@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Managed Downloads
+Space outputs are downloaded into a directory this process owns instead of
+gradio_client's /tmp/gradio, one subdirectory per call, and the pipelines
+move them into ./examples/results rather than copying them. Whatever is not
+moved (a failed call, the raw output behind a composited crop, a file
+handed to the background encoder) is deleted when the call fails, when it
+is no longer needed and at the latest when the process exits. The default
+directory is on the same filesystem as the results, so a move is a rename.
+
+Each process gets its own session directory (<host>_<pid>_<id>) under the
+root; directories of dead processes on this host are removed on start-up.
+With a cap, the oldest call directories past a grace period are evicted
+whenever a new call would exceed it (long-running workers).
+
+Configure in .env / the environment:
+    VTON_DOWNLOAD_DIR=./examples/cache/downloads   # "off" = gradio_client's temp dir, files copied
+                                                   # (local work dirs are still removed when done)
+    VTON_DOWNLOAD_MAX_MB=2048
+    VTON_DOWNLOAD_GRACE=900
+
+Usage:
+    python downloads.py          # disk use per session
+    python downloads.py --clean  # remove directories left by dead processes
+"""
+
+import argparse
+import atexit
+import itertools
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+DEFAULT_ROOT = "./examples/cache/downloads"
+DEFAULT_GRACE = 900.0
+
+
+def _size(path):
+    """Bytes and files under `path`"""
+    total = files = 0
+    for dirpath, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+                files += 1
+            except OSError:
+                pass
+    return total, files
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class DownloadDir:
+    """Per-process download directory: call_dir() per call, take() results into place, discard() the rest"""
+
+    def __init__(self, root=DEFAULT_ROOT, max_bytes=None, grace=DEFAULT_GRACE, clock=time.time):
+        self.root = Path(root).resolve()
+        self.max_bytes = max_bytes
+        self.grace = grace
+        self.clock = clock
+        self.host = socket.gethostname()
+        self.session = self.root / f"{self.host}_{os.getpid()}_{uuid.uuid4().hex[:6]}"
+        self.session.mkdir(parents=True, exist_ok=True)
+        self.moved = self.moved_bytes = 0
+        self.copied = 0
+        self.discarded = self.discarded_bytes = 0
+        self.evicted = self.evicted_bytes = 0
+        self.peak_bytes = 0
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self.reap_stale()
+
+    @classmethod
+    def from_env(cls):
+        """Download directory from VTON_DOWNLOAD_* (None with VTON_DOWNLOAD_DIR=off)"""
+        root = os.getenv("VTON_DOWNLOAD_DIR", DEFAULT_ROOT).strip()
+        if root.lower() in ("", "off", "0", "false"):
+            return None
+        max_mb = os.getenv("VTON_DOWNLOAD_MAX_MB", "").strip()
+        return cls(root, max_bytes=int(float(max_mb) * 1024 * 1024) if max_mb else None,
+                   grace=float(os.getenv("VTON_DOWNLOAD_GRACE", DEFAULT_GRACE)))
+
+    def owns(self, path):
+        """True for paths inside this session's directory"""
+        try:
+            Path(path).resolve().relative_to(self.session)
+        except ValueError:
+            return False
+        return True
+
+    def call_dir(self, prefix="call"):
+        """A fresh directory for one call's outputs"""
+        self.enforce_cap()
+        path = self.session / f"{prefix}_{next(self._seq):06d}"
+        path.mkdir(parents=True, exist_ok=True)
+        return str(path)
+
+    def take(self, src, dest):
+        """Move a downloaded file to `dest` (files outside the session are copied); returns dest"""
+        dest = str(dest)
+        if not self.owns(src):
+            shutil.copy(src, dest)
+            with self._lock:
+                self.copied += 1
+            return dest
+        size = os.path.getsize(src)
+        shutil.move(src, dest)
+        self._prune(Path(src).parent)
+        with self._lock:
+            self.moved += 1
+            self.moved_bytes += size
+        return dest
+
+    def discard(self, *paths):
+        """Delete downloaded files or call directories (anything outside the session is left alone)"""
+        for path in paths:
+            if not isinstance(path, (str, os.PathLike)) or not self.owns(path) or Path(path).resolve() == self.session:
+                continue
+            path = Path(path)
+            size, files = _size(path) if path.is_dir() else (path.stat().st_size if path.exists() else 0, 1)
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            elif path.exists():
+                path.unlink(missing_ok=True)
+            else:
+                continue
+            self._prune(path.parent)
+            with self._lock:
+                self.discarded += files
+                self.discarded_bytes += size
+
+    def _prune(self, directory):
+        """Remove empty directories from `directory` up to (not including) the session"""
+        directory = Path(directory).resolve()
+        while directory != self.session and self.owns(directory):
+            try:
+                directory.rmdir()
+            except OSError:
+                return
+            directory = directory.parent
+
+    def usage(self):
+        """(bytes, files) under this session"""
+        size, files = _size(self.session)
+        with self._lock:
+            self.peak_bytes = max(self.peak_bytes, size)
+        return size, files
+
+    def enforce_cap(self):
+        """Evict the oldest call directories past the grace period while the session is over its cap"""
+        if not self.max_bytes:
+            return
+        size, _ = self.usage()
+        if size <= self.max_bytes:
+            return
+        cutoff = self.clock() - self.grace
+        calls = sorted((entry.stat().st_mtime, entry) for entry in self.session.iterdir() if entry.is_dir())
+        for mtime, entry in calls:
+            if size <= self.max_bytes or mtime > cutoff:
+                break
+            freed, _ = _size(entry)
+            shutil.rmtree(entry, ignore_errors=True)
+            size -= freed
+            with self._lock:
+                self.evicted += 1
+                self.evicted_bytes += freed
+        if size > self.max_bytes:
+            print(f"⚠️  Downloads use {size / 1e6:.0f} MB, over the {self.max_bytes / 1e6:.0f} MB cap "
+                  f"(nothing older than {self.grace:.0f}s left to evict)")
+
+    def reap_stale(self):
+        """Remove session directories of processes on this host that are gone; returns how many"""
+        reaped = 0
+        for entry in self.root.iterdir() if self.root.exists() else []:
+            # <host>_<pid>_<id>; host names may contain underscores
+            host, _, pid = entry.name.rpartition("_")[0].rpartition("_")
+            if entry == self.session or host != self.host or not pid.isdigit() or _alive(int(pid)):
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            reaped += 1
+        return reaped
+
+    def close(self):
+        """Delete everything this process downloaded and did not move"""
+        shutil.rmtree(self.session, ignore_errors=True)
+
+    def report(self):
+        size, files = self.usage()
+        with self._lock:
+            return {"session": str(self.session), "bytes": size, "files": files, "peak_bytes": self.peak_bytes,
+                    "max_bytes": self.max_bytes, "moved": self.moved, "moved_bytes": self.moved_bytes,
+                    "copied": self.copied, "discarded": self.discarded, "discarded_bytes": self.discarded_bytes,
+                    "evicted": self.evicted, "evicted_bytes": self.evicted_bytes}
+
+    def print_report(self):
+        report = self.report()
+        cap = f" of {report['max_bytes'] / 1e6:.0f} MB" if report["max_bytes"] else ""
+        print(f"\n🧹 Downloads: {report['moved']} moved into place ({report['moved_bytes'] / 1e6:.1f} MB), "
+              f"{report['discarded']} discarded, {report['evicted']} evicted; "
+              f"{report['bytes'] / 1e6:.1f} MB{cap} in use (peak {report['peak_bytes'] / 1e6:.1f} MB)")
+
+
+_downloads = None
+_downloads_loaded = False
+_downloads_lock = threading.Lock()
+
+
+def get_downloads():
+    """Process-wide download directory (VTON_DOWNLOAD_DIR), None when gradio_client's temp dir is used"""
+    global _downloads, _downloads_loaded
+    with _downloads_lock:
+        if not _downloads_loaded:
+            _downloads = DownloadDir.from_env()
+            if _downloads:
+                atexit.register(_downloads.close)
+            _downloads_loaded = True
+        return _downloads
+
+
+def set_downloads(downloads):
+    """Install a download directory explicitly (or None for gradio_client's temp dir)"""
+    global _downloads, _downloads_loaded
+    with _downloads_lock:
+        _downloads, _downloads_loaded = downloads, True
+
+
+# Temp directories handed out by call_dir() while downloads are not managed
+_temp_dirs = set()
+_temp_lock = threading.Lock()
+
+
+def _temp_root(path):
+    """The call_dir() temp directory `path` is in (None for anything else)"""
+    if not isinstance(path, (str, os.PathLike)):
+        return None
+    real = os.path.realpath(path)
+    with _temp_lock:
+        for root in _temp_dirs:
+            if real == root or real.startswith(root + os.sep):
+                return root
+    return None
+
+
+def _prune_temp(directory, root):
+    """Remove empty directories from `directory` up to and including the temp root"""
+    directory = os.path.realpath(directory)
+    while directory == root or directory.startswith(root + os.sep):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            return
+        if directory == root:
+            with _temp_lock:
+                _temp_dirs.discard(root)
+            return
+        directory = os.path.dirname(directory)
+
+
+def call_dir(prefix="call"):
+    """Directory for one call's outputs: managed when enabled, a plain temp dir otherwise"""
+    downloads = get_downloads()
+    if downloads:
+        return downloads.call_dir(prefix)
+    path = tempfile.mkdtemp(prefix=f"vton_{prefix}_")
+    with _temp_lock:
+        _temp_dirs.add(os.path.realpath(path))
+    return path
+
+
+def take(src, dest):
+    """Move a downloaded file into place (copy when downloads are not managed); returns dest"""
+    downloads = get_downloads()
+    if downloads:
+        return downloads.take(src, dest)
+    root = _temp_root(src)
+    if root:
+        shutil.move(src, dest)
+        _prune_temp(os.path.dirname(os.path.realpath(src)), root)
+    else:
+        shutil.copy(src, dest)
+    return str(dest)
+
+
+def discard(*paths):
+    """Delete downloaded files / call directories that are no longer needed"""
+    downloads = get_downloads()
+    if downloads:
+        downloads.discard(*paths)
+        return
+    # Unmanaged: only what call_dir() created is ours to delete (gradio_client's temp files are left alone)
+    for path in paths:
+        root = _temp_root(path)
+        if root is None:
+            continue
+        real = os.path.realpath(path)
+        if os.path.isdir(real):
+            shutil.rmtree(real, ignore_errors=True)
+        elif os.path.exists(real):
+            os.unlink(real)
+        if real == root:
+            with _temp_lock:
+                _temp_dirs.discard(root)
+        else:
+            _prune_temp(os.path.dirname(real), root)
+
+
+def discard_when_done(futures, *paths):
+    """Discard `paths` once every future has finished (e.g. a call directory shared by background encodes)"""
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def settled(_):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            discard(*paths)
+
+    if not futures:
+        discard(*paths)
+    for future in futures:
+        future.add_done_callback(settled)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show or clean the managed download directory")
+    parser.add_argument("--clean", action="store_true", help="remove directories left by dead processes")
+    args = parser.parse_args()
+
+    root = Path(os.getenv("VTON_DOWNLOAD_DIR", DEFAULT_ROOT))
+    if not root.exists():
+        print(f"📭 {root} does not exist")
+        return
+    if args.clean:
+        downloads = DownloadDir(root)
+        downloads.close()
+        print(f"🧹 Removed left-over downloads under {root}")
+    for entry in sorted(root.iterdir()):
+        size, files = _size(entry)
+        print(f"   {entry.name}: {files} file(s), {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Garment Ingest
+A garment added to the catalog is compiled once into an upload-ready asset
+instead of being copied as is and normalized again on every request:
+
+    orientation   EXIF rotation applied
+    color         embedded ICC profile converted to sRGB, any mode to RGB
+                  (transparency flattened onto white)
+    borders       uniform background borders trimmed, leaving a small margin
+    size          padded with the background color to the Spaces' 3:4
+                  input aspect and scaled down to at most 768x1024
+    encoding      baseline RGB JPEG, no metadata
+    hash          64-bit perceptual hash (dHash) and mean color, used to
+                  spot the same garment being added twice
+
+Assets go to ./examples/garment_images/<shirts|pants|dresses>/<name>.jpg and are
+listed with their source hash, perceptual hash and trim box in
+./examples/garment_images/assets.json. Adding the same file again returns
+the existing asset; a near-duplicate of a catalog garment is reported and
+the existing asset is reused. With the upload cache on, the asset can also
+be uploaded to the Spaces right away so the first try-on finds it there.
+
+Configure in .env / the environment:
+    VTON_INGEST=off            # copy new garments unchanged (previous behaviour)
+    VTON_INGEST_PREUPLOAD=1    # upload new assets straight away (needs VTON_UPLOAD_ONCE)
+
+Usage:
+    python garment_ingest.py new_shirt.png --type upper_body
+    python garment_ingest.py            # list the compiled assets
+"""
+
+import argparse
+import io
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageCms, ImageOps
+
+from mask_cache import file_hash
+from run_ledger import start_run
+from spaces import prefetch_uploads
+from validation import GARMENT_TYPES, MIN_SIDE, ValidationError, check_image, to_rgb
+
+CATALOG_DIR = "./examples/garment_images"
+INDEX_NAME = "assets.json"
+TARGET_SIZE = (768, 1024)
+JPEG_QUALITY = 95
+TRIM_TOLERANCE = 24
+TRIM_MARGIN = 0.04
+# Border pixels that may differ from the background color before the border counts as non-uniform
+BORDER_OUTLIERS = 0.1
+DUPLICATE_BITS = 6
+DUPLICATE_COLOR = 12.0
+CATALOG_FOLDERS = {"upper_body": "shirts", "lower_body": "pants", "dresses": "dresses"}
+
+_index_lock = threading.Lock()
+
+
+def catalog_folder(garment_type):
+    """Catalog folder of a garment type; raises ValidationError for unknown types"""
+    if garment_type not in GARMENT_TYPES:
+        raise ValidationError(f"unknown garment_type '{garment_type}'; use one of {', '.join(GARMENT_TYPES)}")
+    return CATALOG_FOLDERS[garment_type]
+
+
+def to_srgb(img):
+    """Convert an image with an embedded ICC profile to sRGB (others are returned unchanged)"""
+    icc = img.info.get("icc_profile")
+    if not icc or img.mode not in ("RGB", "CMYK"):
+        return img
+    try:
+        return ImageCms.profileToProfile(img, ImageCms.ImageCmsProfile(io.BytesIO(icc)),
+                                         ImageCms.createProfile("sRGB"), outputMode="RGB")
+    except (ImageCms.PyCMSError, OSError) as e:
+        print(f"⚠️  Ignoring unreadable color profile: {e}")
+        return img
+
+
+def trim_borders(img, tolerance=TRIM_TOLERANCE, margin=TRIM_MARGIN):
+    """
+    Crop uniform background borders, keeping `margin` x the longer side
+    around the garment. Returns (image, crop box or None, background color
+    or None when the border is not uniform).
+    """
+    pixels = np.asarray(img, dtype=np.int16)
+    border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+    background = np.median(border, axis=0)
+    if (np.abs(border - background).max(axis=1) > tolerance).mean() > BORDER_OUTLIERS:
+        return img, None, None
+    content = np.abs(pixels - background).max(axis=2) > tolerance
+    # Rows / columns with only a few differing pixels are compression noise
+    rows = np.flatnonzero(content.mean(axis=1) > 0.002)
+    cols = np.flatnonzero(content.mean(axis=0) > 0.002)
+    color = tuple(int(c) for c in background)
+    if not rows.size or not cols.size:
+        return img, None, color
+    pad = round(margin * max(img.size))
+    box = (max(0, cols[0] - pad), max(0, rows[0] - pad),
+           min(img.width, cols[-1] + 1 + pad), min(img.height, rows[-1] + 1 + pad))
+    if box == (0, 0, img.width, img.height) or min(box[2] - box[0], box[3] - box[1]) < MIN_SIDE:
+        return img, None, color
+    return img.crop(box), tuple(int(v) for v in box), color
+
+
+def fit_to_target(img, background=None, target=TARGET_SIZE):
+    """Pad to the target aspect with the background color, then scale down to fit (never up)"""
+    aspect = target[0] / target[1]
+    width, height = img.size
+    if abs(width / height - aspect) > 0.01:
+        canvas_size = (width, round(width / aspect)) if width / height > aspect else (round(height * aspect), height)
+        canvas = Image.new("RGB", canvas_size, background or (255, 255, 255))
+        canvas.paste(img, ((canvas_size[0] - width) // 2, (canvas_size[1] - height) // 2))
+        img = canvas
+    if img.width > target[0]:
+        img = img.resize(target, Image.LANCZOS)
+    return img
+
+
+def perceptual_hash(img):
+    """64-bit difference hash as 16 hex digits"""
+    gray = np.asarray(img.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):016x}"
+
+
+def hash_distance(a, b):
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def compile_garment(src_path):
+    """Normalized asset image and its metadata (no files written)"""
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img)
+        img = to_rgb(to_srgb(img))
+    original_size = img.size
+    img, trim_box, background = trim_borders(img)
+    img = fit_to_target(img, background)
+    return img, {
+        "original_size": list(original_size),
+        "trim_box": list(trim_box) if trim_box else None,
+        "background": list(background) if background else None,
+        "size": list(img.size),
+        "phash": perceptual_hash(img),
+        "mean_color": [round(float(c), 1) for c in np.asarray(img, dtype=np.float32).reshape(-1, 3).mean(axis=0)],
+    }
+
+
+class GarmentCatalog:
+    """Compiled garment assets of a catalog directory and their index"""
+
+    def __init__(self, root=CATALOG_DIR):
+        self.root = Path(root)
+        self.index_path = self.root / INDEX_NAME
+
+    def load(self):
+        if not self.index_path.exists():
+            return {}
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable {self.index_path}: {e}")
+            return {}
+
+    def _save(self, index):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(index, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.index_path)
+
+    def find(self, source_hash=None, phash=None, mean_color=None, garment_type=None):
+        """(asset path, entry, reason) of an existing asset for the same source or a near-duplicate image"""
+        for rel_path, entry in self.load().items():
+            if not (self.root / rel_path).exists():
+                continue
+            if source_hash and entry["source_sha256"] == source_hash and entry["type"] == garment_type:
+                return str(self.root / rel_path), entry, "same file"
+            if phash and entry["type"] == garment_type and hash_distance(entry["phash"], phash) <= DUPLICATE_BITS \
+                    and np.abs(np.subtract(entry["mean_color"], mean_color)).max() <= DUPLICATE_COLOR:
+                return str(self.root / rel_path), entry, "near-duplicate"
+        return None, None, None
+
+    def ingest(self, src_path, garment_type, preupload=None):
+        """
+        Compile `src_path` into a catalog asset; returns the asset path.
+        Raises ValidationError for files that are not usable garment images.
+        """
+        if preupload is None:
+            preupload = os.getenv("VTON_INGEST_PREUPLOAD", "").strip().lower() in ("1", "true", "yes", "on")
+        run = start_run("ingest", None, inputs={"garment": src_path}, params={"garment_type": garment_type})
+        try:
+            # Cheap checks first: an unknown type or unreadable file is rejected before any work
+            dest_dir = self.root / catalog_folder(garment_type)
+            check_image(src_path, "garment")
+            source_hash = file_hash(src_path)
+            existing, _, _ = self.find(source_hash=source_hash, garment_type=garment_type)
+            if existing:
+                run.params.update(reused="same file")
+                print(f"✅ Garment already in the catalog: {existing}")
+                return existing
+
+            asset, meta = compile_garment(src_path)
+            run.mark("compile")
+            existing, _, reason = self.find(phash=meta["phash"], mean_color=meta["mean_color"],
+                                            garment_type=garment_type)
+            if existing:
+                run.params.update(reused=reason, phash=meta["phash"])
+                print(f"♻️  {Path(src_path).name} looks like {Path(existing).name} ({reason}) - reusing it")
+                return existing
+
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            dest = dest_dir / f"{Path(src_path).stem}.jpg"
+            if dest.exists():
+                dest = dest_dir / f"{Path(src_path).stem}_{source_hash[:8]}.jpg"
+            tmp_path = dest.with_suffix(f".{os.getpid()}.tmp.jpg")
+            asset.save(tmp_path, format="JPEG", quality=JPEG_QUALITY, subsampling=0, optimize=True)
+            os.replace(tmp_path, dest)
+            run.mark("encode")
+
+            meta.update(type=garment_type, source=Path(src_path).name, source_sha256=source_hash,
+                        bytes=dest.stat().st_size, ingested_at=round(time.time()))
+            with _index_lock:
+                index = self.load()
+                index[dest.relative_to(self.root).as_posix()] = meta
+                self._save(index)
+            run.params.update(phash=meta["phash"], trimmed=bool(meta["trim_box"]), bytes=meta["bytes"],
+                              source_bytes=os.path.getsize(src_path))
+            print(f"✅ New garment compiled to {dest} ({meta['size'][0]}x{meta['size'][1]}, "
+                  f"{meta['bytes'] / 1024:.0f} KB" + (", borders trimmed" if meta["trim_box"] else "") + ")")
+            if preupload:
+                self.preupload(dest, garment_type)
+            return str(dest)
+        except Exception as e:
+            run.finish(error=e)
+            raise
+        finally:
+            run.finish()
+
+    def preupload(self, asset_path, garment_type):
+        """Start uploading an asset to the Spaces (needs the upload cache); returns the Futures"""
+        futures = prefetch_uploads({"garment": str(asset_path), "type": garment_type})
+        if futures:
+            print(f"📤 Pre-uploading {Path(asset_path).name} to {len(futures)} Space(s) in the background")
+        else:
+            print("⚠️  Pre-upload needs the upload cache (VTON_UPLOAD_ONCE=1)")
+        return futures
+
+
+def ingest_garment(garment_path, garment_type, catalog_dir=CATALOG_DIR):
+    """Add a garment to the catalog: compiled asset (default) or plain copy with VTON_INGEST=off"""
+    if os.getenv("VTON_INGEST", "on").strip().lower() in ("0", "off", "false", "no"):
+        dest_dir = Path(catalog_dir) / catalog_folder(garment_type)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        dest_path = dest_dir / Path(garment_path).name
+        if not dest_path.exists():
+            shutil.copy(garment_path, dest_path)
+            print(f"✅ New garment auto-processed and saved to: {dest_path}")
+        return str(dest_path)
+    return GarmentCatalog(catalog_dir).ingest(garment_path, garment_type)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile garments into upload-ready catalog assets")
+    parser.add_argument("garments", nargs="*")
+    parser.add_argument("--type", default="upper_body", choices=GARMENT_TYPES)
+    parser.add_argument("--catalog", default=CATALOG_DIR)
+    parser.add_argument("--preupload", action="store_true", help="upload the assets to the Spaces as well")
+    args = parser.parse_args()
+
+    catalog = GarmentCatalog(args.catalog)
+    for path in args.garments:
+        asset = catalog.ingest(path, args.type, preupload=False)
+        # Wait here: the uploads are cancelled when the process exits
+        for future in catalog.preupload(asset, args.type) if args.preupload else []:
+            future.result()
+    if not args.garments:
+        for rel_path, entry in sorted(catalog.load().items()):
+            trimmed = " trimmed" if entry["trim_box"] else ""
+            print(f"   {rel_path}: {entry['size'][0]}x{entry['size'][1]}, {entry['bytes'] / 1024:.0f} KB, "
+                  f"phash {entry['phash']}{trimmed} (from {entry['source']})")
+
+
+if __name__ == "__main__":
+    main()
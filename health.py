@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Space Health and Circuit Breakers
+Every Space call reports its outcome here. A Space that keeps failing, or
+keeps answering far outside its latency SLO, is taken out of rotation
+(circuit open) so jobs can degrade instead of waiting on it. After a
+cooldown a health probe checks the Space and one trial call decides
+whether normal routing resumes.
+
+Usage:
+    python health.py          # probe both Spaces and print their runtime stage
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_SLOW_FACTOR = 3.0
+DEFAULT_COOLDOWN = 120
+DEFAULT_SLO_SECONDS = 90
+
+RUNTIME_URL = "https://huggingface.co/api/spaces/{space}/runtime"
+# Stages in which a Space cannot answer; SLEEPING wakes up on the first request
+UNHEALTHY_STAGES = ("BUILD_ERROR", "RUNTIME_ERROR", "CONFIG_ERROR", "NO_APP_FILE", "PAUSED", "STOPPED", "DELETING")
+
+
+def probe_space(space, token=None, timeout=10):
+    """Ask the Hub for the Space's runtime stage; returns (healthy, detail)"""
+    headers = {"authorization": f"Bearer {token}"} if token else {}
+    try:
+        response = httpx.get(RUNTIME_URL.format(space=space), headers=headers, timeout=timeout)
+        response.raise_for_status()
+        stage = response.json().get("stage", "UNKNOWN")
+    except (httpx.HTTPError, ValueError) as e:
+        return False, f"probe failed: {e}"
+    return stage not in UNHEALTHY_STAGES, stage
+
+
+class CircuitBreaker:
+    """
+    Closed: calls flow; `failure_threshold` consecutive failures or calls
+    slower than slo * slow_factor open the circuit. Open: calls are refused
+    until `cooldown` has passed. Half-open: one trial call is let through and
+    its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, space, slo_seconds=DEFAULT_SLO_SECONDS, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 slow_factor=DEFAULT_SLOW_FACTOR, cooldown=DEFAULT_COOLDOWN, clock=time.time):
+        self.space = space
+        self.slo_seconds = slo_seconds
+        self.failure_threshold = failure_threshold
+        self.slow_factor = slow_factor
+        self.cooldown = cooldown
+        self.clock = clock
+        self.state = CLOSED
+        self.strikes = 0
+        self.opened_at = None
+        self.reason = None
+        self.trial_in_flight = False
+        self.calls = 0
+        self.last_latency = None
+
+    def trip(self, reason):
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.reason = reason
+        self.trial_in_flight = False
+
+    def cooled_down(self):
+        return self.state == OPEN and self.clock() - self.opened_at >= self.cooldown
+
+    def allow(self):
+        """True if a call may go to the Space now (claims the trial when half-open)"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if not self.cooled_down():
+                return False
+            self.state = HALF_OPEN
+        if self.trial_in_flight:
+            return False
+        self.trial_in_flight = True
+        return True
+
+    def record(self, seconds, error=None):
+        self.calls += 1
+        self.last_latency = seconds
+        if error is None and seconds <= self.slo_seconds * self.slow_factor:
+            self.state, self.strikes, self.reason, self.trial_in_flight = CLOSED, 0, None, False
+            return
+        reason = f"error: {error}" if error is not None else f"{seconds:.0f}s vs {self.slo_seconds:.0f}s SLO"
+        if self.state == HALF_OPEN:
+            self.trip(f"trial failed ({reason})")
+            return
+        self.strikes += 1
+        if self.strikes >= self.failure_threshold:
+            self.trip(f"{self.strikes} bad calls in a row, last {reason}")
+
+
+class HealthMonitor:
+    """Circuit breakers for all Spaces, plus the health probe used before trial calls"""
+
+    def __init__(self, slos=None, failure_threshold=DEFAULT_FAILURE_THRESHOLD, slow_factor=DEFAULT_SLOW_FACTOR,
+                 cooldown=DEFAULT_COOLDOWN, probe=None, clock=time.time):
+        self.slos = dict(slos or {})
+        self.failure_threshold = failure_threshold
+        self.slow_factor = slow_factor
+        self.cooldown = cooldown
+        self.probe = probe or probe_space
+        self.clock = clock
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, slos=None, probe=None):
+        """Monitor configured from VTON_BREAKER_* (None when VTON_HEALTH=off)"""
+        if os.getenv("VTON_HEALTH", "on").strip().lower() in ("0", "off", "false", "no"):
+            return None
+        return cls(
+            slos=slos,
+            failure_threshold=int(os.getenv("VTON_BREAKER_FAILURES", DEFAULT_FAILURE_THRESHOLD)),
+            slow_factor=float(os.getenv("VTON_BREAKER_SLOW_FACTOR", DEFAULT_SLOW_FACTOR)),
+            cooldown=float(os.getenv("VTON_BREAKER_COOLDOWN", DEFAULT_COOLDOWN)),
+            probe=probe,
+        )
+
+    def breaker(self, space):
+        with self._lock:
+            if space not in self._breakers:
+                self._breakers[space] = CircuitBreaker(
+                    space, self.slos.get(space, DEFAULT_SLO_SECONDS), self.failure_threshold,
+                    self.slow_factor, self.cooldown, self.clock
+                )
+            return self._breakers[space]
+
+    def allow(self, space):
+        """
+        May a call go to `space`? An open circuit past its cooldown is probed
+        first; a failed probe keeps it open for another cooldown.
+        """
+        breaker = self.breaker(space)
+        with self._lock:
+            probe_due = breaker.cooled_down()
+        if probe_due:
+            healthy, detail = self.probe(space)
+            with self._lock:
+                if not healthy and breaker.state == OPEN:
+                    breaker.trip(f"probe: {detail}")
+                    print(f"🩺 {space} still unhealthy ({detail})")
+                    return False
+        with self._lock:
+            return breaker.allow()
+
+    def is_open(self, space):
+        """Peek: refused right now (open and still cooling down)? Does not claim a trial"""
+        breaker = self.breaker(space)
+        with self._lock:
+            return breaker.state == OPEN and not breaker.cooled_down()
+
+    def record(self, space, seconds, error=None):
+        breaker = self.breaker(space)
+        with self._lock:
+            was = breaker.state
+            breaker.record(seconds, error)
+            now = breaker.state
+        if was != now and now == OPEN:
+            print(f"🔌 Circuit opened for {space}: {breaker.reason}")
+        elif was != now and now == CLOSED:
+            print(f"✅ {space} recovered, circuit closed")
+
+    def check(self, space):
+        """Probe a Space nobody has called yet (one-shot scripts); trips the circuit if it is down"""
+        breaker = self.breaker(space)
+        if breaker.calls or breaker.state != CLOSED:
+            return self.allow(space)
+        healthy, detail = self.probe(space)
+        if not healthy:
+            with self._lock:
+                breaker.trip(f"probe: {detail}")
+            print(f"🔌 Circuit opened for {space}: probe says {detail}")
+        return healthy
+
+    def status(self):
+        with self._lock:
+            return [
+                {"space": b.space, "state": b.state, "reason": b.reason, "calls": b.calls,
+                 "last_latency": b.last_latency}
+                for b in self._breakers.values()
+            ]
+
+
+if __name__ == "__main__":
+    env_file = Path(".env")
+    if env_file.exists():
+        with open(env_file, 'r') as f:
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    key, value = line.strip().split('=', 1)
+                    os.environ[key] = value.strip('"')
+
+    from spaces import IDM_VTON_SPACE, VIRTUAL_TRYON_SPACE, default_token
+    for space in (VIRTUAL_TRYON_SPACE, IDM_VTON_SPACE):
+        healthy, detail = probe_space(space, default_token())
+        print(f"{'✅' if healthy else '❌'} {space}: {detail}")
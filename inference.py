@@ -4,6 +4,9 @@ from pathlib import Path
 import time
 import shutil
 
+from spaces import VIRTUAL_TRYON_SPACE, get_health_monitor
+from validation import ValidationError, validate_or_reject
+
 # Try to load from .env file
 env_file = Path(".env")
 if env_file.exists():
@@ -29,6 +32,35 @@ UPPER_IMAGE = "./examples/garment_images/gucci upper.jpg"
 OUTFIT_DESCRIPTION = "Complete outfit: Dark cargo pants + Gucci upper"
 USE_LAYERED_APPROACH = True  # True for pants→upper, False for single garment
 USE_TWO_STEP = True  # Set to False for direct IDM-VTON only
+DEGRADED = None  # Set when virtual-try-on is down and the two-step path falls back to direct IDM-VTON
+LATENCY_BUDGET = None  # Seconds; when set, planner.py picks two-step or direct IDM-VTON instead of USE_TWO_STEP
+
+# Reject missing, corrupt, tiny or mistyped inputs before any remote call
+if USE_LAYERED_APPROACH:
+    job = {"person": PERSON_IMAGE, "pants": PANTS_IMAGE, "upper": UPPER_IMAGE}
+else:
+    job = {"person": PERSON_IMAGE, "garment": UPPER_IMAGE, "type": "upper_body"}
+try:
+    job = validate_or_reject(job)
+except ValidationError:
+    exit(1)
+PERSON_IMAGE, UPPER_IMAGE = job["person"], job.get("upper", job.get("garment"))
+PANTS_IMAGE = job.get("pants", PANTS_IMAGE)
+
+if LATENCY_BUDGET and not USE_LAYERED_APPROACH:
+    from planner import choose_plan
+    decision = choose_plan({"person": PERSON_IMAGE, "garment": UPPER_IMAGE, "type": "upper_body",
+                            "budget": LATENCY_BUDGET})
+    if decision["plan"]:
+        USE_TWO_STEP = decision["plan"] == "two_step"
+        print(f"🧭 Plan: {decision['plan']} - {decision['reason']}")
+
+# Health probe: run direct IDM-VTON instead of failing while virtual-try-on is down
+monitor = get_health_monitor()
+if USE_TWO_STEP and not USE_LAYERED_APPROACH and monitor and not monitor.check(VIRTUAL_TRYON_SPACE):
+    USE_TWO_STEP = False
+    DEGRADED = f"{VIRTUAL_TRYON_SPACE} unhealthy"
+    print(f"⚠️  {DEGRADED} - using direct IDM-VTON (degraded mode)")
 
 if USE_LAYERED_APPROACH:
     print("👔 Layered Virtual Try-On Processing")
@@ -170,8 +202,9 @@ if USE_LAYERED_APPROACH:
     final_tryon_path = f"./examples/results/complete_outfit_{timestamp}.png"
     final_mask_path = f"./examples/results/outfit_mask_{timestamp}.png"
 else:
-    final_tryon_path = f"./examples/results/final_tryon_{timestamp}.png"
-    final_mask_path = f"./examples/results/final_mask_{timestamp}.png"
+    suffix = "_degraded" if DEGRADED else ""
+    final_tryon_path = f"./examples/results/final_tryon_{timestamp}{suffix}.png"
+    final_mask_path = f"./examples/results/final_mask_{timestamp}{suffix}.png"
 
 if len(final_result) >= 2:
     shutil.copy(final_result[0], final_tryon_path)
@@ -181,7 +214,9 @@ if len(final_result) >= 2:
     print(f"📸 Results saved:")
     print(f"   Main result: {final_tryon_path}")
     print(f"   Mask result: {final_mask_path}")
-    if USE_TWO_STEP:
+    if USE_TWO_STEP and not USE_LAYERED_APPROACH:
         print(f"   Step 1 result: {step1_path}")
+    if DEGRADED:
+        print(f"   ⚠️  Degraded mode: {DEGRADED}")
 
 print("\nResult paths:", final_result)
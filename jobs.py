@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Background Jobs
+The interactive menus submit each selection as a background job and come
+straight back to the prompt, so the next selection can be queued while a
+60-second try-on runs. Up to VTON_JOBS_WORKERS jobs run at once; the rest
+wait in submission order. Whatever a job prints is kept in its log instead
+of interleaving with the menu, and a one-line notice is printed when it
+finishes.
+
+Menu commands (every REPL):
+    jobs          list queued, running and finished jobs
+    watch N       follow job N's output until it finishes (Ctrl-C stops watching)
+    cancel N      drop a queued job, or stop a running one at its next checkpoint
+                  (between garments / examples; a Space call in flight is finished)
+    open N        job N's full output and results; result images are opened in the viewer
+
+Configure in .env / the environment:
+    VTON_JOBS_WORKERS=2   # 0 = run each selection in the foreground as before
+"""
+
+import contextvars
+import itertools
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+
+from priority import inherit
+
+DEFAULT_WORKERS = 2
+IMAGE_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp", ".avif", ".gif")
+
+_current_job = contextvars.ContextVar("vton_job", default=None)
+
+
+class JobCancelled(Exception):
+    """Raised by checkpoint() inside a job that was cancelled"""
+
+
+def checkpoint():
+    """Stop the current job here if it was cancelled (no-op outside jobs)"""
+    job = _current_job.get()
+    if job and job.cancel_requested.is_set():
+        raise JobCancelled(f"job {job.id} cancelled")
+
+
+class _JobOutput:
+    """sys.stdout stand-in: text printed by a job goes to its log, everything else to the console"""
+
+    def __init__(self, console):
+        self.console = console
+
+    def write(self, text):
+        job = _current_job.get()
+        if job is None:
+            return self.console.write(text)
+        job._append(text)
+        return len(text)
+
+    def flush(self):
+        self.console.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.console, name)
+
+
+class Job:
+    """One submitted selection: state, timing, captured output and the function's return value"""
+
+    def __init__(self, job_id, label):
+        self.id = job_id
+        self.label = label
+        self.state = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.cancel_requested = threading.Event()
+        self.future = None
+        self._text = []
+        self._cond = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.state in ("done", "failed", "cancelled")
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def _append(self, text):
+        with self._cond:
+            self._text.append(text)
+            self._cond.notify_all()
+
+    def _finish(self, state, result=None, error=None):
+        with self._cond:
+            self.state, self.result, self.error = state, result, error
+            self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def output(self):
+        with self._cond:
+            return "".join(self._text)
+
+    def follow(self, poll=0.5):
+        """Yield the job's output as it is printed, until the job finishes"""
+        sent = 0
+        while True:
+            with self._cond:
+                if len(self._text) == sent and not self.finished:
+                    self._cond.wait(poll)
+                chunks, sent = self._text[sent:], len(self._text)
+                finished = self.finished
+            if chunks:
+                yield "".join(chunks)
+            if finished and not chunks:
+                return
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns True when it did"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.finished, timeout)
+
+    def paths(self):
+        """Existing files among the job's results (futures of background encodes included once done)"""
+        found = []
+
+        def walk(value):
+            if isinstance(value, Future):
+                if value.done() and not value.exception():
+                    walk(value.result())
+            elif isinstance(value, (tuple, list)):
+                for item in value:
+                    walk(item)
+            elif isinstance(value, (str, os.PathLike)) and Path(value).is_file():
+                found.append(str(value))
+        walk(self.result)
+        return found
+
+    def summary(self):
+        timing = {"queued": "", "running": f" {self.elapsed:.0f}s"}.get(self.state, f" in {self.elapsed:.0f}s")
+        state = "cancelling" if self.state == "running" and self.cancel_requested.is_set() else self.state
+        return f"#{self.id} {state}{timing}: {self.label}" + (f" ({self.error})" if self.error else "")
+
+
+class JobManager:
+    """Runs REPL selections in the background: submit() returns at once, command() handles the job commands"""
+
+    def __init__(self, workers=DEFAULT_WORKERS, notify=True):
+        self.workers = workers
+        self.notify = notify
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._stdout = None
+        if not isinstance(sys.stdout, _JobOutput):
+            self._stdout = sys.stdout
+            sys.stdout = _JobOutput(sys.stdout)
+
+    @classmethod
+    def from_env(cls):
+        """Job manager with VTON_JOBS_WORKERS workers (None with 0: selections run in the foreground)"""
+        workers = int(os.getenv("VTON_JOBS_WORKERS", DEFAULT_WORKERS))
+        return cls(workers) if workers > 0 else None
+
+    def _console(self, text):
+        console = sys.stdout.console if isinstance(sys.stdout, _JobOutput) else sys.stdout
+        console.write(text + "\n")
+        console.flush()
+
+    def submit(self, label, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) as a job; returns the Job"""
+        with self._lock:
+            job = Job(next(self._ids), label)
+            self._jobs[job.id] = job
+        job.future = self._pool.submit(inherit(self._run), job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        if job.cancel_requested.is_set():
+            job._finish("cancelled")
+            return
+        job.state, job.started_at = "running", time.time()
+        token = _current_job.set(job)
+        try:
+            result = fn(*args, **kwargs)
+        except JobCancelled as e:
+            job._finish("cancelled", error=str(e))
+        except Exception as e:
+            print(f"❌ {type(e).__name__}: {e}")
+            job._finish("failed", error=f"{type(e).__name__}: {e}")
+        else:
+            job._finish("cancelled" if job.cancel_requested.is_set() else "done", result)
+        finally:
+            _current_job.reset(token)
+        if self.notify:
+            icon = {"done": "✅", "failed": "❌", "cancelled": "🛑"}[job.state]
+            self._console(f"\n{icon} Job {job.summary()} - 'open {job.id}' for details")
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(int(job_id))
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def active(self):
+        return [job for job in self.jobs() if not job.finished]
+
+    def cancel(self, job_id):
+        """Cancel a job; returns its state afterwards (None for an unknown id)"""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return job.state if job else None
+        job.cancel_requested.set()
+        if job.future.cancel():
+            job._finish("cancelled")
+        return "cancelling" if job.state == "running" else job.state
+
+    def print_jobs(self):
+        jobs = self.jobs()
+        if not jobs:
+            print("📭 No jobs yet")
+            return
+        print(f"\n📋 Jobs ({len(self.active())} active, {self.workers} at a time)")
+        for job in jobs:
+            print(f"   {job.summary()}")
+
+    def watch(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            print(f"❌ No job {job_id}")
+            return
+        print(f"👀 Watching job {job.summary()} (Ctrl-C to stop watching)")
+        try:
+            for text in job.follow():
+                sys.stdout.write(text)
+        except KeyboardInterrupt:
+            print("\n↩️  Stopped watching; the job keeps running")
+            return
+        print(f"👀 Job {job.summary()}")
+
+    def open(self, job_id, show=True):
+        """Print a job's output and results; returns the result files"""
+        job = self.get(job_id)
+        if job is None:
+            print(f"❌ No job {job_id}")
+            return []
+        print(f"\n📂 Job {job.summary()}")
+        print(job.output().rstrip() or "   (no output yet)")
+        paths = job.paths()
+        for path in paths:
+            print(f"   📄 {path}")
+            if show and Path(path).suffix.lower() in IMAGE_SUFFIXES:
+                try:
+                    with Image.open(path) as image:
+                        image.show()
+                except Exception as e:
+                    print(f"   ⚠️  Could not open a viewer: {e}")
+        if job.state == "done" and not paths:
+            print("   (no result files)")
+        return paths
+
+    def command(self, line):
+        """Handle 'jobs', 'watch N', 'cancel N' and 'open N'; returns False for anything else"""
+        words = line.strip().lower().split()
+        if words == ["jobs"]:
+            self.print_jobs()
+            return True
+        if len(words) != 2 or words[0] not in ("watch", "cancel", "open"):
+            return False
+        if not words[1].lstrip("#").isdigit():
+            print(f"❌ Usage: {words[0]} <job number>")
+            return True
+        job_id = int(words[1].lstrip("#"))
+        if words[0] == "watch":
+            self.watch(job_id)
+        elif words[0] == "open":
+            self.open(job_id)
+        else:
+            state = self.cancel(job_id)
+            print(f"🛑 Job {job_id}: {state}" if state else f"❌ No job {job_id}")
+        return True
+
+    def shutdown(self, cancel=False):
+        """Wait for the jobs (cancelling them first with cancel=True) and restore sys.stdout"""
+        if cancel:
+            for job in self.active():
+                self.cancel(job.id)
+        self._pool.shutdown(wait=True)
+        if self._stdout is not None and isinstance(sys.stdout, _JobOutput):
+            sys.stdout = self._stdout
+
+    def close(self):
+        """Menu quit: ask whether to wait for unfinished jobs or cancel them, then shut down"""
+        active = self.active()
+        cancel = False
+        if active:
+            answer = input(f"⏳ {len(active)} job(s) unfinished - wait for them? (y = wait, n = cancel) [y]: ")
+            cancel = answer.strip().lower() == "n"
+            print("🛑 Cancelling..." if cancel else "⏳ Waiting for the jobs to finish...")
+        self.shutdown(cancel=cancel)
+
+
+def run_or_submit(manager, label, fn, *args, **kwargs):
+    """Submit a menu selection as a job, or run it in the foreground without a manager"""
+    if manager is None:
+        return fn(*args, **kwargs)
+    job = manager.submit(label, fn, *args, **kwargs)
+    print(f"📥 Job {job.id} submitted: {label} ('jobs' to list, 'watch {job.id}' to follow)")
+    return job
+
+
+def print_commands():
+    print("• 'jobs', 'watch N', 'cancel N', 'open N' to manage background jobs")
@@ -5,11 +5,22 @@ Step 1: Apply pants using virtual-try-on
 Step 2: Apply upper garment using IDM-VTON on the result
 """
 
-from gradio_client import Client, handle_file
+from gradio_client import handle_file
 import os
 from pathlib import Path
 import time
-import shutil
+
+from compositing import crop_layer, crop_to_region, paste_back
+from downloads import call_dir, discard, discard_when_done, get_downloads, take
+from jobs import JobManager, checkpoint, print_commands, run_or_submit
+from mask_cache import MaskCache
+from output_encoding import OutputEncoder, check_return_mode, load_result, result_file
+from priority import set_default_priority
+from profiling import profiled
+from run_ledger import start_run
+from spaces import (IDM_VTON_SPACE, VIRTUAL_TRYON_SPACE, backend_name, connect, default_token, get_concurrency,
+                    get_health_monitor, get_priority_gates, get_scheduler, prefetch_uploads, requires_token)
+from validation import ValidationError, validate_or_reject
 
 # Try to load from .env file
 env_file = Path(".env")
@@ -20,16 +31,34 @@ if env_file.exists():
                 key, value = line.strip().split('=', 1)
                 os.environ[key] = value.strip('"')
 
-# Get token from environment
-hf_token = os.getenv("HUGGINGFACE_TOKEN")
-if not hf_token:
+# Get token from environment (HUGGINGFACE_TOKENS=tok1,tok2 spreads calls over several)
+hf_token = default_token()
+if not hf_token and requires_token():
     print("❌ Please set your Hugging Face token!")
     exit(1)
 
-def apply_complete_outfit(person_path, pants_path, upper_path, outfit_description):
+def apply_complete_outfit(person_path, pants_path, upper_path, outfit_description, encoder=None, mask_cache=None,
+                          crop_region=False, output_tag="", returns="path"):
     """
     Apply complete outfit: pants first, then upper garment
+
+    With an `encoder` the returned paths are Futures of the encoded outputs.
+    With a `mask_cache` the upper-body mask of this person is reused.
+    With `crop_region` only the upper-body region of the pants result is sent
+    to IDM-VTON and the result is blended back into the full image locally.
+    `output_tag` is appended to the file names so concurrent outfits do not
+    overwrite each other.
+
+    With `returns="bytes"` / `"array"` the outfit, pants result and mask are
+    returned in memory (see two_step_pipeline.step2_idm_vton); nothing is
+    saved unless an `encoder` is passed, which writes the outfit and mask in
+    the background.
+
+    There is no degraded path for outfits (IDM-VTON cannot apply the pants),
+    so while either Space's circuit is open this raises before any upload.
+    Invalid inputs raise ValidationError, also before any upload.
     """
+    check_return_mode(returns)
     print("\n" + "="*70)
     print("👔 Sequential Layered Virtual Try-On Pipeline")
     print("="*70)
@@ -39,33 +68,64 @@ def apply_complete_outfit(person_path, pants_path, upper_path, outfit_descriptio
     print(f"📝 Description: {outfit_description}")
     print("-"*70)
     
-    timestamp = int(time.time())
+    timestamp = f"{int(time.time())}_{output_tag}" if output_tag else int(time.time())
+    
+    job = validate_or_reject({"person": person_path, "pants": pants_path, "upper": upper_path})
+    person_path, pants_path, upper_path = job["person"], job["pants"], job["upper"]
+    
+    monitor = get_health_monitor()
+    if monitor and monitor.is_open(IDM_VTON_SPACE):
+        raise RuntimeError(f"{IDM_VTON_SPACE} is unavailable (circuit open)")
+    if monitor and not monitor.allow(VIRTUAL_TRYON_SPACE):
+        raise RuntimeError(f"{VIRTUAL_TRYON_SPACE} is unavailable (circuit open)")
+    
+    # Upload the upper garment to IDM-VTON while the pants step runs (with VTON_UPLOAD_ONCE)
+    prefetch_uploads({"person": person_path, "pants": pants_path, "upper": upper_path})
     
     # STEP 1: Apply pants using virtual-try-on
     print("\n🚀 STEP 1: Applying pants with virtual-try-on...")
     print("   Model: blackmamba2408/virtual-try-on")
     print("   Garment: Lower body (pants)")
     
-    client1 = Client("blackmamba2408/virtual-try-on", hf_token=hf_token)
+    run1 = start_run("step1", VIRTUAL_TRYON_SPACE,
+                     inputs={"person": person_path, "garment": pants_path},
+                     params={"garment_type": "lower_body", "pipeline": "layered"})
+    client1 = connect(VIRTUAL_TRYON_SPACE)
+    run1.params["backend"] = backend_name(VIRTUAL_TRYON_SPACE)
+    run1.mark("connect")
     
     step1_start = time.time()
-    pants_result = client1.predict(
-        person_path=handle_file(person_path),
-        garment_path=handle_file(pants_path),
-        garment_type="lower_body",  # Apply pants
-        api_name="/virtual_tryon"
-    )
+    try:
+        run1.add_upload(person_path, pants_path)
+        pants_result = client1.predict(
+            person_path=handle_file(person_path),
+            garment_path=handle_file(pants_path),
+            garment_type="lower_body",  # Apply pants
+            api_name="/virtual_tryon"
+        )
+    except Exception as e:
+        run1.finish(error=e)
+        raise
+    run1.mark("predict")
     step1_end = time.time()
     
     # Save pants result
-    pants_result_path = f"./examples/results/step1_pants_{timestamp}.png"
+    pants_download_path = result_file(pants_result)
+    run1.add_download(pants_download_path)
     
-    if isinstance(pants_result, dict) and 'path' in pants_result:
-        shutil.copy(pants_result['path'], pants_result_path)
-    elif isinstance(pants_result, str):
-        shutil.copy(pants_result, pants_result_path)
+    if returns != "path":
+        # Step 2 uploads the download; it is deleted once the outfit is done
+        pants_result_path = pants_download_path
+        pants_output = load_result(pants_download_path, returns)
+    elif encoder:
+        # Step 2 uploads the downloaded file; the saved copy is encoded in the background
+        pants_result_path = pants_download_path
+        pants_output = encoder.submit(pants_download_path, f"./examples/results/step1_pants_{timestamp}")
     else:
-        shutil.copy(pants_result[0] if isinstance(pants_result, (list, tuple)) else pants_result, pants_result_path)
+        pants_result_path = take(pants_download_path, f"./examples/results/step1_pants_{timestamp}.png")
+        pants_output = pants_result_path
+    run1.mark("save")
+    run1.finish()
     
     print(f"✅ STEP 1 completed in {step1_end - step1_start:.1f}s")
     print(f"   Result: Person wearing pants → {pants_result_path}")
@@ -78,23 +138,59 @@ def apply_complete_outfit(person_path, pants_path, upper_path, outfit_descriptio
     print("   Input: Person with pants (from Step 1)")
     print("   Garment: Upper body (shirt/top)")
     
-    client2 = Client("blackmamba2408/IDM-VTON", hf_token=hf_token)
-    
-    step2_start = time.time()
-    final_result = client2.predict(
-        dict={
-            "background": handle_file(pants_result_path),  # Use person with pants as background
-            "layers": [],
-            "composite": None
-        },
-        garm_img=handle_file(upper_path),  # Apply upper garment
-        garment_des=outfit_description,
-        is_checked=True,
-        is_checked_crop=False,
-        denoise_steps=30,
-        seed=42,
-        api_name="/tryon"
-    )
+    run2 = start_run("step2", IDM_VTON_SPACE,
+                     inputs={"background": pants_result_path, "garment": upper_path, "person": person_path},
+                     params={"garment_type": "upper_body", "description": outfit_description, "pipeline": "layered",
+                             "crop_region": crop_region, "denoise_steps": 30, "seed": 42})
+    # Prepare the upload before connecting: a failure here must not leave a Space call half-open
+    background_path, crop_box, crop_dir = pants_result_path, None, None
+    try:
+        cached_mask = mask_cache.get(person_path, "upper_body") if mask_cache else None
+        if mask_cache:
+            run2.cache = "hit" if cached_mask else "miss"
+        if cached_mask:
+            print("   Mask: cached (auto-masking skipped)")
+        
+        mask_layer = cached_mask
+        if crop_region:
+            crop_dir = call_dir("crop")
+            background_path, crop_box, image_size = crop_to_region(pants_result_path, "upper_body",
+                                                                   mask_path=cached_mask, output_dir=crop_dir)
+            if cached_mask:
+                mask_layer = crop_layer(cached_mask, crop_box, image_size, output_dir=crop_dir)
+            print(f"   Upload: upper-body region only {crop_box}")
+    except Exception as e:
+        discard(crop_dir, pants_download_path if returns != "path" else None)
+        run2.finish(error=e)
+        raise
+    run2.mark("prepare")
+    
+    try:
+        client2 = connect(IDM_VTON_SPACE)
+        run2.params["backend"] = backend_name(IDM_VTON_SPACE)
+        run2.mark("connect")
+        
+        step2_start = time.time()
+        run2.add_upload(background_path, mask_layer, upper_path)
+        final_result = client2.predict(
+            dict={
+                "background": handle_file(background_path),  # Use person with pants as background
+                "layers": [handle_file(mask_layer)] if mask_layer else [],
+                "composite": None
+            },
+            garm_img=handle_file(upper_path),  # Apply upper garment
+            garment_des=outfit_description,
+            is_checked=not cached_mask,
+            is_checked_crop=False,
+            denoise_steps=30,
+            seed=42,
+            api_name="/tryon"
+        )
+    except Exception as e:
+        discard(crop_dir, pants_download_path if returns != "path" else None)
+        run2.finish(error=e)
+        raise
+    run2.mark("predict")
     step2_end = time.time()
     
     # Save final complete outfit result
@@ -102,8 +198,57 @@ def apply_complete_outfit(person_path, pants_path, upper_path, outfit_descriptio
     final_mask_path = f"./examples/results/outfit_mask_{timestamp}.png"
     
     if len(final_result) >= 2:
-        shutil.copy(final_result[0], final_outfit_path)
-        shutil.copy(final_result[1], final_mask_path)
+        run2.add_download(final_result[0], final_result[1])
+    
+    if len(final_result) >= 2 and crop_box:
+        # Untouched pixels (pants, background) stay exactly as in Step 1; the raw crop outputs are not kept
+        downloaded = final_result
+        final_result = (
+            paste_back(pants_result_path, final_result[0], crop_box,
+                       Path(background_path).with_name("composite.png"), blend_mask_path=final_result[1]),
+            paste_back(pants_result_path, final_result[1], crop_box,
+                       Path(background_path).with_name("composite_mask.png"))
+        )
+        discard(*downloaded[:2])
+        run2.mark("composite")
+    
+    if len(final_result) >= 2 and mask_cache and not cached_mask:
+        mask_cache.put(person_path, "upper_body", final_result[1])
+    
+    outputs = None
+    if len(final_result) >= 2 and returns != "path":
+        outputs = load_result(final_result[0], returns), pants_output, load_result(final_result[1], returns)
+        discard(pants_download_path)
+        run2.mark("load")
+    
+    if len(final_result) >= 2 and encoder:
+        outfit_future = encoder.submit(final_result[0], f"./examples/results/complete_outfit_{timestamp}")
+        mask_future = encoder.submit(final_result[1], f"./examples/results/outfit_mask_{timestamp}")
+        outfit_future.add_done_callback(lambda _: discard(final_result[0]))
+        mask_future.add_done_callback(lambda _: discard(final_result[1]))
+        # With a crop both composites live in crop_dir: remove it only after both encodes
+        discard_when_done([outfit_future, mask_future], crop_dir)
+        run2.mark("save")
+        run2.finish()
+        
+        print(f"✅ STEP 2 completed in {step2_end - step2_start:.1f}s")
+        print(f"📦 Outfit results queued for {encoder.fmt} encoding")
+        
+        return outputs if outputs is not None else (outfit_future, pants_output, mask_future)
+    elif outputs is not None:
+        discard(final_result[0], final_result[1], crop_dir)
+        run2.finish()
+        
+        print(f"✅ STEP 2 completed in {step2_end - step2_start:.1f}s")
+        print(f"📤 Outfit results returned in memory ({returns})")
+        
+        return outputs
+    elif len(final_result) >= 2:
+        take(final_result[0], final_outfit_path)
+        take(final_result[1], final_mask_path)
+        discard(crop_dir)
+        run2.mark("save")
+        run2.finish()
         
         print(f"✅ STEP 2 completed in {step2_end - step2_start:.1f}s")
         print(f"   Result: Complete outfit → {final_outfit_path}")
@@ -118,8 +263,10 @@ def apply_complete_outfit(person_path, pants_path, upper_path, outfit_descriptio
         
         return final_outfit_path, pants_result_path, final_mask_path
     else:
+        discard(crop_dir, result_file(final_result), pants_download_path if returns != "path" else None)
+        run2.finish(error="unexpected result format")
         print("❌ STEP 2 failed - unexpected result format")
-        return None, pants_result_path, None
+        return None, pants_output, None
 
 # Example outfit combinations
 OUTFIT_EXAMPLES = {
@@ -155,8 +302,35 @@ OUTFIT_EXAMPLES = {
     }
 }
 
+def try_outfit(person_path, pants_path, upper_path, description, encoder=None, mask_cache=None):
+    """One menu selection; a rejected input has already printed its reason"""
+    try:
+        return apply_complete_outfit(person_path, pants_path, upper_path, description,
+                                     encoder=encoder, mask_cache=mask_cache)
+    except ValidationError:
+        return None
+
+def run_all_outfits(encoder=None, mask_cache=None):
+    """Menu 'all': every outfit example in turn; returns their results"""
+    print("🚀 Trying all complete outfits...")
+    outfits = list(OUTFIT_EXAMPLES.items())
+    results = []
+    for i, (key, example) in enumerate(outfits):
+        checkpoint()
+        if i + 1 < len(outfits):
+            prefetch_uploads(outfits[i + 1][1])  # next outfit uploads during this one
+        print(f"\n{'='*50}")
+        print(f"Outfit Example {key}")
+        print('='*50)
+        results.append(try_outfit(example['person'], example['pants'], example['upper'], example['description'],
+                                  encoder, mask_cache))
+        print("-" * 50)
+    return results
+
 def main():
     """Interactive menu for complete outfit try-on"""
+    # Someone is waiting on every call made from here; batch runs in this process queue behind it
+    set_default_priority("interactive")
     print("\n" + "="*70)
     print("👔 Sequential Layered Virtual Try-On")
     print("Step 1: Pants (virtual-try-on) → Step 2: Upper (IDM-VTON)")
@@ -175,42 +349,54 @@ def main():
     print("• 'custom' to use your own garments")
     print("• 'q' to quit")
     
+    # Optional background re-encoding (VTON_OUTPUT_FORMAT in .env)
+    encoder = OutputEncoder.from_env()
+    # Optional person mask cache (VTON_MASK_CACHE in .env)
+    mask_cache = MaskCache.from_env()
+    # Selections run as background jobs (VTON_JOBS_WORKERS in .env, 0 = foreground)
+    jobs = JobManager.from_env()
+    if jobs:
+        print_commands()
+    
     while True:
         choice = input("\nEnter your choice: ").strip().lower()
         
+        if jobs and jobs.command(choice):
+            continue
+        
         if choice == 'q':
+            if jobs:
+                jobs.close()
+            if encoder:
+                print("⏳ Finishing background encodes...")
+                encoder.shutdown()
+            if get_scheduler():
+                get_scheduler().print_report()
+            if get_concurrency():
+                get_concurrency().print_report()
+            if get_priority_gates():
+                get_priority_gates().print_report()
+            if get_downloads():
+                get_downloads().print_report()
             print("👋 Goodbye!")
             break
         elif choice == 'all':
-            print("🚀 Trying all complete outfits...")
-            for key, example in OUTFIT_EXAMPLES.items():
-                print(f"\n{'='*50}")
-                print(f"Outfit Example {key}")
-                print('='*50)
-                apply_complete_outfit(
-                    example['person'],
-                    example['pants'], 
-                    example['upper'],
-                    example['description']
-                )
-                print("-" * 50)
+            run_or_submit(jobs, "All outfits", run_all_outfits, encoder, mask_cache)
         elif choice == 'custom':
             person_path = input("Enter person image path: ").strip()
             pants_path = input("Enter pants image path: ").strip() 
             upper_path = input("Enter upper garment path: ").strip()
             description = input("Enter outfit description: ").strip()
             
-            apply_complete_outfit(person_path, pants_path, upper_path, description)
+            run_or_submit(jobs, f"{Path(person_path).stem} → {Path(pants_path).stem} + {Path(upper_path).stem}",
+                          try_outfit, person_path, pants_path, upper_path, description, encoder, mask_cache)
         elif choice in OUTFIT_EXAMPLES:
             example = OUTFIT_EXAMPLES[choice]
-            apply_complete_outfit(
-                example['person'],
-                example['pants'],
-                example['upper'], 
-                example['description']
-            )
+            run_or_submit(jobs, f"Outfit example {choice}", try_outfit, example['person'], example['pants'],
+                          example['upper'], example['description'], encoder, mask_cache)
         else:
-            print("❌ Invalid choice. Please enter 1-5, 'all', 'custom', or 'q'")
+            print("❌ Invalid choice. Please enter 1-5, 'all', 'custom', 'q' or a job command")
 
 if __name__ == "__main__":
-    main()
+    with profiled("layered_pipeline"):
+        main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Open-Loop Load Generator
+Replays try-on requests at their arrival times, whether or not earlier ones
+have finished. This is how real traffic behaves, unlike the `all` loops,
+which wait for each job before starting the next. Arrivals are either
+Poisson at a target rate or a recorded trace, rescaled to the rate if asked:
+a file with one timestamp per line (CSV: first column, JSON lines: "t" or
+"started_at"), or "ledger" for the jobs the run ledger recorded on the real
+Spaces (stub runs, such as earlier load tests, are left out).
+
+Requests go to a small service wrapper around a pipeline (two_step, outfit
+or planned):
+    workers      requests served at once
+    queue        requests waiting for a worker; arrivals beyond it are shed
+    shed-after   requests that waited longer than this are shed when dequeued
+
+By default every stage runs on the stub backend, shaped with the stub's
+latency, jitter and slots, so a whole sweep runs on one CPU box. Each rate
+of each configuration reports the following, and is stored in the ledger as
+a "loadtest" row:
+- latency and queue wait over time
+- shed requests
+- whether the configuration kept up
+
+A configuration is saturated at a rate when it sheds more than 1% of the
+requests, completes less than 90% of them, or its p95 latency
+exceeds 3x the lowest rate's median. Its saturation point is the highest
+rate it still kept up with.
+
+Usage:
+    python loadgen.py --rates 0.5 1 2 4 --duration 60 --workers 2 4 --stub-latency 2 --stub-slots 2
+    python loadgen.py --trace arrivals.txt --rate 3 --workers 4 --queue 8
+    python loadgen.py --trace ledger --window 24h --speedup 10
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+
+import spaces
+from layered_pipeline import apply_complete_outfit
+from planner import run_planned
+from priority import inherit
+from run_ledger import get_ledger, parse_window, percentile, start_run
+from two_step_pipeline import EXAMPLES, run_two_step_pipeline
+
+DEFAULT_DURATION = 30.0
+DEFAULT_BUCKETS = 10
+SHED_LIMIT = 0.01
+GOODPUT_LIMIT = 0.9
+LATENCY_FACTOR = 3.0
+
+
+def poisson_arrivals(rate, duration, seed=None):
+    """Arrival offsets (seconds from the start) of a Poisson process at `rate` per second"""
+    rng = random.Random(seed)
+    arrivals, t = [], rng.expovariate(rate)
+    while t < duration:
+        arrivals.append(t)
+        t += rng.expovariate(rate)
+    return arrivals
+
+
+def _parse_time(text):
+    text = text.strip()
+    if text.startswith("{"):
+        entry = json.loads(text)
+        return float(entry.get("t", entry.get("started_at")))
+    return float(text.split(",")[0])
+
+
+def load_trace(path):
+    """Arrival offsets from a trace file (timestamps or offsets, one per line; header lines are skipped)"""
+    times = []
+    for line in Path(path).read_text().splitlines():
+        try:
+            times.append(_parse_time(line))
+        except (ValueError, TypeError):
+            continue
+    if not times:
+        raise ValueError(f"no arrival times in {path}")
+    times.sort()
+    return [t - times[0] for t in times]
+
+
+def ledger_arrivals(window="24h", backend="gradio"):
+    """
+    Arrival offsets of the jobs in the run ledger served by `backend`:
+    their first remote stage (or a direct plan). Only jobs on the real
+    Spaces count by default, so synthetic load-test traffic is not replayed.
+    """
+    ledger = get_ledger()
+    if not ledger:
+        raise ValueError("the run ledger is off (VTON_LEDGER)")
+    rows = ledger.rows(since=time.time() - parse_window(window))
+    times = []
+    for row in rows:
+        params = row.get("params") or {}
+        if params.get("backend", "gradio") != backend:
+            continue
+        if row["stage"] == "step1" or (row["stage"] == "plan" and params.get("plan") == "direct"):
+            times.append(row["started_at"])
+    times.sort()
+    if not times:
+        raise ValueError(f"no jobs on the {backend} backend in the run ledger in the last {window}")
+    return [t - times[0] for t in times]
+
+
+def rescale(arrivals, rate=None, speedup=1.0):
+    """Compress or stretch a trace to a mean rate (or by a speed-up factor), keeping its shape"""
+    if rate and len(arrivals) > 1 and arrivals[-1] > 0:
+        speedup = rate * arrivals[-1] / (len(arrivals) - 1)
+    return [t / speedup for t in arrivals]
+
+
+def outfit_jobs():
+    """Pants + shirt outfits for every person of the two-step examples (their garment files exist)"""
+    garments = {"upper_body": [], "lower_body": []}
+    for example in EXAMPLES.values():
+        if example["type"] in garments and example["garment"] not in garments[example["type"]]:
+            garments[example["type"]].append(example["garment"])
+    persons = list(dict.fromkeys(example["person"] for example in EXAMPLES.values()))
+    return [{"person": person, "pants": pants, "upper": upper,
+             "description": f"Outfit: {Path(pants).stem} + {Path(upper).stem}"}
+            for person in persons for pants in garments["lower_body"] for upper in garments["upper_body"]]
+
+
+def job_source(target):
+    """Endless cycle of example jobs for a target"""
+    if target == "outfit":
+        return itertools.cycle(outfit_jobs())
+    return itertools.cycle([{"person": e["person"], "garment": e["garment"], "description": e["description"],
+                             "type": e["type"]} for e in EXAMPLES.values()])
+
+
+def run_target(target, job, tag):
+    """One request against a pipeline; raises when it produced no result"""
+    if target == "two_step":
+        result, _ = run_two_step_pipeline(job["person"], job["garment"], job["description"], job["type"],
+                                          returns="bytes")
+    elif target == "outfit":
+        result, _, _ = apply_complete_outfit(job["person"], job["pants"], job["upper"], job["description"],
+                                             output_tag=tag, returns="bytes")
+    elif target == "planned":
+        result, _, decision = run_planned(job, output_tag=tag)
+        if not decision["plan"]:
+            raise RuntimeError(decision["reason"])
+    else:
+        raise ValueError(f"unknown target '{target}'")
+    if result is None:
+        raise RuntimeError("no result")
+
+
+class Request:
+    """Timeline of one request, in seconds from the start of the run"""
+
+    def __init__(self, index, arrival, job):
+        self.index = index
+        self.arrival = arrival
+        self.job = job
+        self.started = None
+        self.finished = None
+        self.status = "queued"
+        self.reason = None
+
+    @property
+    def latency(self):
+        return self.finished - self.arrival if self.finished is not None else None
+
+    @property
+    def wait(self):
+        return self.started - self.arrival if self.started is not None else None
+
+
+def run_load(arrivals, handler, workers=2, queue_limit=0, shed_after=None, jobs=None, clock=time.perf_counter):
+    """
+    Offer requests at `arrivals` (seconds from now) to `workers` threads
+    running handler(job, tag). Returns the Requests: status "ok", "error"
+    or "shed" (reason "queue full" at arrival, "deadline" when it waited
+    longer than `shed_after` for a worker).
+    """
+    jobs = jobs or itertools.repeat(None)
+    waiting = queue.Queue(maxsize=queue_limit or 0)
+    requests = []
+    start = clock()
+
+    def serve():
+        while True:
+            request = waiting.get()
+            if request is None:
+                return
+            request.started = clock() - start
+            if shed_after is not None and request.wait > shed_after:
+                request.status, request.reason, request.finished = "shed", "deadline", request.started
+                continue
+            try:
+                handler(request.job, f"load{request.index}")
+                request.status = "ok"
+            except Exception as e:
+                request.status, request.reason = "error", str(e) or type(e).__name__
+            request.finished = clock() - start
+
+    threads = [threading.Thread(target=inherit(serve), daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for index, (offset, job) in enumerate(zip(arrivals, jobs)):
+        delay = offset - (clock() - start)
+        if delay > 0:
+            time.sleep(delay)
+        request = Request(index, offset, job)
+        requests.append(request)
+        try:
+            waiting.put_nowait(request)
+        except queue.Full:
+            request.status, request.reason = "shed", "queue full"
+            request.started = request.finished = clock() - start
+    for _ in threads:
+        waiting.put(None)
+    for thread in threads:
+        thread.join()
+    return requests
+
+
+def _stats(values):
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "max": max(values)}
+
+
+def queue_depth(requests, t):
+    """Requests admitted and still waiting for a worker at time t"""
+    return sum(1 for r in requests if r.arrival <= t and r.reason != "queue full"
+               and (r.started is None or r.started > t))
+
+
+def timeline(requests, bucket):
+    """Per `bucket` seconds of arrivals: requests, shed, latency p50 / p95, mean wait and peak queue depth"""
+    if not requests:
+        return []
+    end = max(r.finished or r.arrival for r in requests)
+    rows = []
+    for n in range(int(max(r.arrival for r in requests) // bucket) + 1):
+        low, high = n * bucket, (n + 1) * bucket
+        batch = [r for r in requests if low <= r.arrival < high]
+        latencies = [r.latency for r in batch if r.status == "ok"]
+        waits = [r.wait for r in batch if r.status == "ok"]
+        samples = [low + bucket * i / 10 for i in range(10) if low + bucket * i / 10 <= end]
+        rows.append({"start": low, "requests": len(batch), "shed": sum(1 for r in batch if r.status == "shed"),
+                     "errors": sum(1 for r in batch if r.status == "error"), **_stats(latencies),
+                     "wait": sum(waits) / len(waits) if waits else None,
+                     "queue": max((queue_depth(requests, t) for t in samples), default=0)})
+    return rows
+
+
+def summarize(requests, duration):
+    """Totals of one run: offered and completed rate, shed, errors, latency and wait percentiles"""
+    ok = [r for r in requests if r.status == "ok"]
+    shed = [r for r in requests if r.status == "shed"]
+    return {
+        "offered": len(requests), "ok": len(ok), "errors": sum(1 for r in requests if r.status == "error"),
+        "shed": len(shed), "shed_queue_full": sum(1 for r in shed if r.reason == "queue full"),
+        "shed_deadline": sum(1 for r in shed if r.reason == "deadline"),
+        "offered_rate": len(requests) / duration if duration else 0.0,
+        "latency": _stats([r.latency for r in ok]),
+        "wait": _stats([r.wait for r in ok]),
+        "service": _stats([r.finished - r.started for r in ok]),
+    }
+
+
+def saturation(summary, baseline_p50=None):
+    """Why a run is saturated, or None when the configuration kept up"""
+    if summary["offered"] and summary["shed"] / summary["offered"] > SHED_LIMIT:
+        return f"shed {summary['shed']}/{summary['offered']}"
+    if summary["ok"] < summary["offered"] * GOODPUT_LIMIT:
+        return f"completed {summary['ok']}/{summary['offered']}"
+    p95 = summary["latency"]["p95"]
+    if baseline_p50 and p95 is not None and p95 > baseline_p50 * LATENCY_FACTOR:
+        return f"p95 {p95:.1f}s > {LATENCY_FACTOR:.0f}x {baseline_p50:.1f}s"
+    return None
+
+
+def _fmt(seconds):
+    return "-" if seconds is None else f"{seconds:.1f}s"
+
+
+def print_run(label, summary, rows, reason):
+    print(f"\n📈 {label}: {summary['offered']} offered ({summary['offered_rate']:.2f}/s), "
+          f"{summary['ok']} ok, {summary['errors']} error(s), "
+          f"{summary['shed']} shed ({summary['shed_queue_full']} queue full, {summary['shed_deadline']} deadline)")
+    print(f"   latency p50 {_fmt(summary['latency']['p50'])}, p95 {_fmt(summary['latency']['p95'])}, "
+          f"max {_fmt(summary['latency']['max'])}; queue wait p50 {_fmt(summary['wait']['p50'])}, "
+          f"p95 {_fmt(summary['wait']['p95'])}; service p50 {_fmt(summary['service']['p50'])}")
+    print(f"   {'t':>6} {'reqs':>5} {'shed':>5} {'err':>4} {'p50':>7} {'p95':>7} {'wait':>7} {'queue':>6}")
+    for row in rows:
+        print(f"   {row['start']:>5.0f}s {row['requests']:>5} {row['shed']:>5} {row['errors']:>4} "
+              f"{_fmt(row['p50']):>7} {_fmt(row['p95']):>7} {_fmt(row['wait']):>7} {row['queue']:>6}")
+    print(f"   {'🔴 saturated: ' + reason if reason else '🟢 kept up'}")
+
+
+def run_config(target, arrivals_for, rates, workers, queue_limit=0, shed_after=None, bucket=None,
+               stop_at_saturation=True, quiet=True, duration=None):
+    """
+    Run one service configuration at each rate (ascending). Returns a list
+    of (rate, summary, saturation reason) and the saturation point: the
+    highest rate that kept up (None if even the lowest did not).
+    """
+    results, baseline, point = [], None, None
+    config = f"{target}, {workers} worker(s), queue {queue_limit or 'unbounded'}" + \
+        (f", shed after {shed_after:.0f}s" if shed_after is not None else "")
+    for rate in rates:
+        arrivals = arrivals_for(rate)
+        span = duration or (arrivals[-1] if arrivals else 0.0)
+        run = start_run("loadtest", None, params={"target": target, "workers": workers, "queue": queue_limit,
+                                                  "shed_after": shed_after, "rate": rate})
+        output = open(os.devnull, "w") if quiet else None
+        with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+            requests = run_load(arrivals, lambda job, tag: run_target(target, job, tag), workers, queue_limit,
+                                shed_after, job_source(target))
+        if output:
+            output.close()
+        summary = summarize(requests, span)
+        if baseline is None and summary["latency"]["p50"] is not None:
+            baseline = summary["latency"]["p50"]
+        reason = saturation(summary, baseline)
+        run.params.update(summary, saturated=reason)
+        run.mark("load")
+        run.finish()
+        rate_label = f"{rate:g}/s" if rate else "trace"
+        rows = timeline(requests, bucket or max(span / DEFAULT_BUCKETS, 1))
+        print_run(f"{config} @ {rate_label}", summary, rows, reason)
+        results.append((rate, summary, reason))
+        if reason:
+            if stop_at_saturation:
+                break
+        else:
+            point = rate or summary["offered_rate"]
+    return config, results, point
+
+
+def print_sweep(configs):
+    print("\n🏁 Saturation points")
+    for config, results, point in configs:
+        tested = ", ".join(f"{rate:g}" + ("🔴" if reason else "") for rate, _, reason in results if rate)
+        kept = f"keeps up to {point:g} req/s" if point else "saturated at the lowest rate"
+        print(f"   {config}: {kept}" + (f" (tested {tested})" if tested else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of the try-on pipelines on the stub backend")
+    parser.add_argument("--target", default="two_step", choices=["two_step", "outfit", "planned"])
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.5, 1, 2, 4],
+                        help="Poisson arrival rates (requests/s) to sweep")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds of arrivals per rate")
+    parser.add_argument("--trace", help="arrival trace file, or 'ledger' for the jobs in the run ledger")
+    parser.add_argument("--window", default="24h", help="ledger window with --trace ledger")
+    parser.add_argument("--trace-backend", default="gradio",
+                        help="with --trace ledger, replay the jobs served by this backend (default the real Spaces)")
+    parser.add_argument("--rate", type=float, help="rescale the trace to this mean rate")
+    parser.add_argument("--speedup", type=float, default=1.0, help="replay the trace this much faster")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2], help="service configurations to compare")
+    parser.add_argument("--queue", type=int, default=0, help="waiting requests before arrivals are shed (0 = no limit)")
+    parser.add_argument("--shed-after", type=float, help="shed requests that waited this many seconds for a worker")
+    parser.add_argument("--bucket", type=float, help="seconds per timeline row (default duration / 10)")
+    parser.add_argument("--backend", default="stub", help="backend of both stages: stub (default), an http:// "
+                                                          "model server, or 'env' for VTON_STEP*_BACKEND")
+    parser.add_argument("--stub-latency", type=float, help="stub seconds per call (VTON_STUB_LATENCY)")
+    parser.add_argument("--stub-jitter", type=float, help="stub extra random seconds (VTON_STUB_JITTER)")
+    parser.add_argument("--stub-slots", type=int, help="stub calls per Space at once (VTON_STUB_SLOTS)")
+    parser.add_argument("--all-rates", action="store_true", help="keep going after a rate saturates")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="show the pipelines' output")
+    args = parser.parse_args()
+
+    for flag, name in ((args.stub_latency, "VTON_STUB_LATENCY"), (args.stub_jitter, "VTON_STUB_JITTER"),
+                       (args.stub_slots, "VTON_STUB_SLOTS")):
+        if flag is not None:
+            os.environ[name] = str(flag)
+    if args.backend != "env":
+        spaces.set_backend("step1", args.backend)
+        spaces.set_backend("step2", args.backend)
+
+    if args.trace:
+        trace = ledger_arrivals(args.window, args.trace_backend) if args.trace == "ledger" else load_trace(args.trace)
+        rates = [args.rate]
+        arrivals_for = lambda rate: rescale(trace, rate, args.speedup)
+        print(f"📼 Trace: {len(trace)} arrival(s) over {trace[-1]:.0f}s")
+    else:
+        rates = sorted(args.rates)
+        arrivals_for = lambda rate: poisson_arrivals(rate, args.duration, args.seed)
+
+    configs = []
+    for workers in args.workers:
+        configs.append(run_config(args.target, arrivals_for, rates, workers, args.queue, args.shed_after,
+                                  args.bucket, stop_at_saturation=not args.all_rates, quiet=not args.verbose,
+                                  duration=None if args.trace else args.duration))
+    print_sweep(configs)
+
+
+if __name__ == "__main__":
+    main()
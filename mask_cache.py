@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Person Mask Cache
+Stores the masks IDM-VTON computes for a person so later runs with the same
+person and garment type can send the mask through the editor `layers` input
+and skip server-side pose estimation and auto-masking.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+DEFAULT_CACHE_DIR = "./examples/cache/masks"
+
+# IDM-VTON returns the person with the masked region painted mid-gray
+MASK_GRAY = 128
+MASK_TOLERANCE = 3
+
+
+def file_hash(path):
+    """SHA-256 of a file's contents"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def binary_mask_from_output(mask_output_path):
+    """Return the garment region of an IDM-VTON mask preview (a path or an RGB array) as an L image (255 = mask)"""
+    if isinstance(mask_output_path, np.ndarray):
+        pixels = mask_output_path.astype(np.int16)
+    else:
+        with Image.open(mask_output_path) as img:
+            pixels = np.asarray(img.convert("RGB"), dtype=np.int16)
+
+    is_mask = (np.abs(pixels - MASK_GRAY) <= MASK_TOLERANCE).all(axis=2)
+    mask = Image.fromarray((is_mask * 255).astype(np.uint8))
+    # Morphological opening drops isolated gray pixels of the person photo
+    return mask.filter(ImageFilter.MinFilter(5)).filter(ImageFilter.MaxFilter(5))
+
+
+def mask_layer_from_output(mask_output_path, dest_path):
+    """
+    Convert the gray mask preview returned by IDM-VTON into an editor layer:
+    opaque white where the garment goes, transparent black everywhere else
+    (the Space flattens the layer to RGB before thresholding it).
+    """
+    mask = binary_mask_from_output(mask_output_path)
+    layer = Image.merge("RGBA", (mask, mask, mask, mask))
+    layer.save(dest_path)
+    return dest_path
+
+
+class MaskCache:
+    """On-disk cache of editor mask layers keyed by person hash and garment type"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from VTON_MASK_CACHE, or return None when it is not set"""
+        cache_dir = os.getenv("VTON_MASK_CACHE", "").strip()
+        return cls(cache_dir) if cache_dir else None
+
+    def key(self, person_path, garment_type):
+        return f"{file_hash(person_path)[:32]}_{garment_type}"
+
+    def path_for(self, person_path, garment_type):
+        return self.cache_dir / f"{self.key(person_path, garment_type)}.png"
+
+    def get(self, person_path, garment_type):
+        """Return the cached mask layer path, or None on a miss"""
+        path = self.path_for(person_path, garment_type)
+        if path.exists():
+            self.hits += 1
+            return str(path)
+        self.misses += 1
+        return None
+
+    def put(self, person_path, garment_type, mask_output_path):
+        """Store the mask returned by IDM-VTON for this person and garment type"""
+        path = self.path_for(person_path, garment_type)
+        # Unique temp name: concurrent variants may store the same key at once
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp.png")
+        mask_layer_from_output(mask_output_path, tmp_path)
+        os.replace(tmp_path, path)
+        return str(path)
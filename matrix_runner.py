@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Catalog Matrix Runner
+Tries every person in examples/person_images on every garment in shirts/
+and pants/ (and optionally every pants + shirt outfit), then tiles the
+results into one contact sheet.
+
+Each distinct Step 1 (person, garment) runs once and its result feeds every
+Step 2 that needs it: the pants try-on is both the pants cell and the base
+of each outfit. Files are uploaded to each Space once (see uploads.py).
+Every person and garment is validated once up front; cells using a
+rejected input are marked "rejected" on the sheet and never sent.
+
+Usage:
+    python matrix_runner.py
+    python matrix_runner.py --outfits --concurrency 3
+    python matrix_runner.py --persons Joe "Full Man"
+"""
+
+import argparse
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageOps
+
+import spaces
+from spaces import prefetch_uploads
+from downloads import get_downloads
+from mask_cache import MaskCache
+from priority import set_default_priority
+from profiling import profiled
+from two_step_pipeline import list_available_items, step1_virtual_tryon, step2_idm_vton
+from uploads import UploadCache
+from validation import ValidationError, record_rejection, validate_input
+
+DEFAULT_CONCURRENCY = 2
+CELL_SIZE = (192, 256)
+LABEL_HEIGHT = 18
+
+
+def _tag(*parts):
+    return re.sub(r"[^A-Za-z0-9]+", "-", "_".join(parts)).strip("-")
+
+
+def build_jobs(persons, shirts, pants, outfits=False):
+    """
+    Plan the matrix. Returns (columns, step1_jobs, cells):
+    columns are (label, garment_paths) in sheet order, step1_jobs maps
+    (person, garment, garment_type) to the cells waiting on it, and each cell
+    is a dict describing one Step 2 call.
+    """
+    columns, step1_jobs, cells = [], {}, []
+    for shirt in shirts:
+        columns.append((shirt.stem, [shirt]))
+    for pant in pants:
+        columns.append((pant.stem, [pant]))
+    if outfits:
+        for pant in pants:
+            for shirt in shirts:
+                columns.append((f"{pant.stem} + {shirt.stem}", [pant, shirt]))
+
+    for person in persons:
+        for label, garments in columns:
+            if len(garments) == 2:
+                # Outfit: shirt applied on top of the shared pants Step 1
+                base, garment, base_type, garment_type = garments[0], garments[1], "lower_body", "upper_body"
+            else:
+                garment = base = garments[0]
+                garment_type = base_type = "lower_body" if garment.parent.name == "pants" else "upper_body"
+            cell = {
+                "person": person,
+                "column": label,
+                "base": base,
+                "garment": garment,
+                "garment_type": garment_type,
+                "description": f"{garment.stem} {'pants' if garment_type == 'lower_body' else 'shirt'}",
+            }
+            cells.append(cell)
+            step1_jobs.setdefault((person, base, base_type), []).append(cell)
+    return columns, step1_jobs, cells
+
+
+def validate_inputs(persons, shirts, pants):
+    """
+    Validate every person and garment once. Returns (checked, rejected):
+    the path to send for each valid input and the reason for each rejected
+    one, both keyed by the original path.
+    """
+    checked, rejected = {}, {}
+    inputs = ([(person, "person", None) for person in persons] + [(shirt, "garment", "upper_body") for shirt in shirts]
+              + [(pant, "garment", "lower_body") for pant in pants])
+    for path, key, garment_type in inputs:
+        try:
+            checked[path] = validate_input(path, garment_type)
+        except ValidationError as e:
+            record_rejection({key: str(path)}, e)
+            rejected[path] = str(e)
+    return checked, rejected
+
+
+def run_matrix(persons, shirts, pants, outfits=False, max_concurrency=DEFAULT_CONCURRENCY,
+               mask_cache=None, crop_region=False, sheet_path=None):
+    """
+    Run the whole matrix with at most `max_concurrency` Space calls in flight.
+
+    Step 2 calls start as soon as the Step 1 they depend on finishes.
+    Returns (results, sheet_path) where results maps (person, column label)
+    to the final result path (None for failed or rejected cells).
+    """
+    checked, rejected = validate_inputs(persons, shirts, pants)
+    columns, step1_jobs, cells = build_jobs(persons, shirts, pants, outfits)
+    results, notes = {}, {}
+    for cell in cells:
+        if {cell["person"], cell["base"], cell["garment"]} & set(rejected):
+            results[(cell["person"], cell["column"])] = None
+            notes[(cell["person"], cell["column"])] = "rejected"
+    step1_jobs = {key: [cell for cell in waiting if (cell["person"], cell["column"]) not in notes]
+                  for key, waiting in step1_jobs.items()}
+    step1_jobs = {key: waiting for key, waiting in step1_jobs.items() if waiting}
+    print(f"\n🧮 Matrix: {len(persons)} person(s) × {len(columns)} column(s) = {len(cells)} try-on(s), "
+          f"{len(step1_jobs)} Step 1 call(s)" + (f", {len(notes)} rejected" if notes else ""))
+
+    # Start every person/garment upload now; they overlap with the first Step 1 calls
+    for cell in cells:
+        if (cell["person"], cell["column"]) in notes:
+            continue
+        person, base, garment = checked[cell["person"]], checked[cell["base"]], checked[cell["garment"]]
+        if cell["base"] != cell["garment"]:
+            prefetch_uploads({"person": person, "pants": base, "upper": garment})
+        else:
+            prefetch_uploads({"person": person, "garment": garment})
+
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        pending = {}
+        for (person, garment, garment_type), waiting in step1_jobs.items():
+            future = pool.submit(step1_virtual_tryon, checked[person], checked[garment], garment_type,
+                                 output_tag=_tag(person.stem, garment.stem))
+            pending[future] = ("step1", waiting)
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, payload = pending.pop(future)
+                if kind == "step1":
+                    step1_result = future.result()
+                    for cell in payload:
+                        if not step1_result:
+                            results[(cell["person"], cell["column"])] = None
+                            continue
+                        next_future = pool.submit(
+                            step2_idm_vton, step1_result, checked[cell["garment"]], cell["description"],
+                            person_path=checked[cell["person"]], garment_type=cell["garment_type"],
+                            mask_cache=mask_cache, crop_region=crop_region,
+                            output_tag=_tag(cell["person"].stem, cell["column"])
+                        )
+                        pending[next_future] = ("step2", cell)
+                else:
+                    final_result, _ = future.result()
+                    results[(payload["person"], payload["column"])] = final_result
+                    print(f"🧩 {len(results)}/{len(cells)}: {payload['person'].stem} × {payload['column']}"
+                          + ("" if final_result else " failed"))
+
+    sheet_path = sheet_path or f"./examples/results/contact_sheet_{int(time.time())}.png"
+    contact_sheet(persons, columns, results, sheet_path, notes=notes)
+    print(f"🖼️  Contact sheet saved: {sheet_path}")
+    if rejected:
+        print(f"🚫 {len(rejected)} input(s) rejected, {len(notes)} cell(s) not run:")
+        for path, reason in rejected.items():
+            print(f"   {Path(path).name}: {reason}")
+    return results, sheet_path
+
+
+def _tile(path, size):
+    tile = Image.new("RGB", size, (235, 235, 235))
+    if path and Path(path).exists():
+        with Image.open(path) as image:
+            image = ImageOps.contain(image.convert("RGB"), size)
+            tile.paste(image, ((size[0] - image.width) // 2, (size[1] - image.height) // 2))
+    return tile
+
+
+def contact_sheet(persons, columns, results, dest, cell_size=CELL_SIZE, notes=None):
+    """
+    Tile results into a grid: one row per person, one column per garment,
+    with the garments across the top and the persons down the left side.
+    Empty cells are labelled with their entry in `notes` ("failed" by default).
+    """
+    notes = notes or {}
+    width, height = cell_size
+    row_height = height + LABEL_HEIGHT
+    sheet = Image.new("RGB", (width * (len(columns) + 1), row_height * (len(persons) + 1)), "white")
+    draw = ImageDraw.Draw(sheet)
+
+    for col, (label, garments) in enumerate(columns, 1):
+        # Outfit headers show the garments side by side
+        part = (width // len(garments), height)
+        for i, garment in enumerate(garments):
+            sheet.paste(_tile(garment, part), (col * width + i * part[0], 0))
+        draw.text((col * width + 4, height + 3), label[:28], fill="black")
+
+    for row, person in enumerate(persons, 1):
+        y = row * row_height
+        sheet.paste(_tile(person, cell_size), (0, y))
+        draw.text((4, y + height + 3), person.stem[:28], fill="black")
+        for col, (label, _) in enumerate(columns, 1):
+            result = results.get((person, label))
+            sheet.paste(_tile(result, cell_size), (col * width, y))
+            if not result:
+                draw.text((col * width + 4, y + height // 2), notes.get((person, label), "failed"), fill="red")
+
+    Path(dest).parent.mkdir(parents=True, exist_ok=True)
+    sheet.save(dest)
+    return dest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Try every catalog garment on every person")
+    parser.add_argument("--persons", nargs="+", help="only these persons (file stems)")
+    parser.add_argument("--outfits", action="store_true", help="also run every pants + shirt combination")
+    parser.add_argument("--concurrency", type=int,
+                        help=f"worker threads (default {DEFAULT_CONCURRENCY}, or VTON_AIMD_MAX with VTON_AIMD)")
+    parser.add_argument("--crop-region", action="store_true", help="upload only the garment region to Step 2")
+    parser.add_argument("--sheet", help="contact sheet path")
+    args = parser.parse_args()
+
+    persons, shirts, pants = (sorted(items) for items in list_available_items())
+    if args.persons:
+        persons = [p for p in persons if p.stem in args.persons]
+    if not persons or not (shirts or pants):
+        print("❌ Need at least one person and one garment in ./examples/")
+        return
+
+    if not spaces.get_upload_cache():
+        spaces.set_upload_cache(UploadCache())
+    set_default_priority("bulk")
+
+    # With adaptive concurrency the threads only bound the limit; the controller sets the pace per Space
+    controller = spaces.get_concurrency()
+    concurrency = args.concurrency or (controller.max_limit if controller else DEFAULT_CONCURRENCY)
+    run_matrix(persons, shirts, pants, outfits=args.outfits, max_concurrency=concurrency,
+               mask_cache=MaskCache.from_env(), crop_region=args.crop_region, sheet_path=args.sheet)
+    spaces.get_upload_cache().print_report()
+    if spaces.get_scheduler():
+        spaces.get_scheduler().print_report()
+    if controller:
+        controller.print_report()
+    if spaces.get_priority_gates():
+        spaces.get_priority_gates().print_report()
+    if get_downloads():
+        get_downloads().print_report()
+
+
+if __name__ == "__main__":
+    with profiled("matrix_runner"):
+        main()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Output Encoding Stage
+Re-encodes try-on results and masks in a process pool (PNG / WebP / JPEG)
+and writes optional thumbnails, so the pipelines can start the next remote
+call while the files are being written. In the in-memory return modes
+("bytes", "array") the encoder is the only thing that writes results to
+disk, and only if one is passed.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import io
+import os
+from pathlib import Path
+import threading
+
+import numpy as np
+from PIL import Image
+
+# Supported output formats
+OUTPUT_FORMATS = {
+    "png": {"extension": ".png", "pil_format": "PNG"},
+    "webp": {"extension": ".webp", "pil_format": "WEBP"},
+    "jpeg": {"extension": ".jpg", "pil_format": "JPEG"},
+}
+
+DEFAULT_QUALITY = 90
+
+# What the pipeline stages return: saved file paths, the downloaded file's bytes or decoded uint8 arrays
+RETURN_MODES = ("path", "bytes", "array")
+
+
+def result_file(result):
+    """Return the local file path from a gradio_client result (dict, str or tuple)"""
+    if isinstance(result, dict) and 'path' in result:
+        return result['path']
+    if isinstance(result, (list, tuple)):
+        return result[0]
+    return result
+
+
+def check_return_mode(returns):
+    if returns not in RETURN_MODES:
+        raise ValueError(f"Unknown return mode '{returns}'; use one of {', '.join(RETURN_MODES)}")
+    return returns
+
+
+def load_result(path, returns="bytes"):
+    """
+    A result file in memory: its bytes as downloaded (PNG/WebP, read once,
+    no re-encode) or a decoded (H, W, 3) uint8 RGB array
+    """
+    if returns == "bytes":
+        return Path(path).read_bytes()
+    with Image.open(path) as img:
+        return np.asarray(img.convert("RGB"))
+
+
+def encode_image(src_path, dest_stem, fmt="png", quality=DEFAULT_QUALITY, thumbnail_sizes=()):
+    """
+    Encode one image to `dest_stem` + extension; runs inside the worker processes.
+
+    PNG is always lossless (optimized), WebP is lossless at quality 100,
+    JPEG drops any alpha channel. Thumbnails are written next to the main
+    file as `<stem>_thumb<size><ext>`, bounded by `size` on the longest side.
+    """
+    fmt = fmt.lower()
+    if fmt == "jpg":
+        fmt = "jpeg"
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {fmt}")
+
+    spec = OUTPUT_FORMATS[fmt]
+    dest_path = Path(f"{dest_stem}{spec['extension']}")
+    dest_path.parent.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(src_path) as img:
+        img.load()
+        data = _encode(img, fmt, quality)
+        with open(dest_path, "wb") as f:
+            f.write(data)
+
+        thumbnails = {}
+        for size in thumbnail_sizes:
+            thumb = img.copy()
+            thumb.thumbnail((size, size))
+            thumb_path = Path(f"{dest_stem}_thumb{size}{spec['extension']}")
+            with open(thumb_path, "wb") as f:
+                f.write(_encode(thumb, fmt, quality))
+            thumbnails[size] = str(thumb_path)
+
+    return {
+        "path": str(dest_path),
+        "bytes": data,
+        "format": fmt,
+        "source_size": os.path.getsize(src_path),
+        "encoded_size": len(data),
+        "thumbnails": thumbnails,
+    }
+
+
+def _encode(img, fmt, quality):
+    """Encode a PIL image to bytes in the given format"""
+    buffer = io.BytesIO()
+    if fmt == "png":
+        img.save(buffer, format="PNG", optimize=True)
+    elif fmt == "webp":
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        img.save(buffer, format="WEBP", quality=quality, lossless=quality >= 100, method=4)
+    else:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        img.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+class OutputEncoder:
+    """Process pool that encodes pipeline outputs in the background"""
+
+    def __init__(self, fmt="webp", quality=DEFAULT_QUALITY, thumbnail_sizes=(), max_workers=None):
+        fmt = fmt.lower()
+        if fmt == "jpg":
+            fmt = "jpeg"
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {fmt}")
+        self.fmt = fmt
+        self.quality = quality
+        self.thumbnail_sizes = tuple(thumbnail_sizes)
+        self.extension = OUTPUT_FORMATS[fmt]["extension"]
+        self._pool = ProcessPoolExecutor(max_workers=max_workers)
+        # Only encodes still running: a finished future holds the encoded bytes and is the caller's to keep
+        self.pending = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build an encoder from VTON_OUTPUT_FORMAT / VTON_OUTPUT_QUALITY /
+        VTON_THUMBNAIL_SIZES, or return None when no output format is set.
+        """
+        fmt = os.getenv("VTON_OUTPUT_FORMAT", "").strip()
+        if not fmt:
+            return None
+        quality = int(os.getenv("VTON_OUTPUT_QUALITY", DEFAULT_QUALITY))
+        sizes = os.getenv("VTON_THUMBNAIL_SIZES", "")
+        thumbnail_sizes = [int(s) for s in sizes.split(",") if s.strip()]
+        return cls(fmt, quality, thumbnail_sizes)
+
+    def submit(self, src_path, dest_stem, fmt=None):
+        """Queue `src_path` for encoding; returns a Future of the encode_image() dict"""
+        future = self._pool.submit(
+            encode_image, str(src_path), str(dest_stem),
+            fmt or self.fmt, self.quality, self.thumbnail_sizes
+        )
+        with self._lock:
+            self.pending.add(future)
+        future.add_done_callback(self._settled)
+        return future
+
+    def _settled(self, future):
+        with self._lock:
+            self.pending.discard(future)
+
+    def wait(self):
+        """Block until every pending encode is done and return their results"""
+        with self._lock:
+            pending = list(self.pending)
+        results = [future.result() for future in pending]
+        # result() can return before the done-callbacks have run
+        for future in pending:
+            self._settled(future)
+        return results
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        return False
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Execution Planner
+Chooses per job between direct IDM-VTON (one remote call), the two-step
+pipeline (virtual-try-on + IDM-VTON) and the layered outfit pipeline, from
+the requested garments, the job's latency budget, per-Space latency
+measured in the run ledger and how many calls are already queued on each
+Space. The cheapest plan (estimated GPU seconds) that meets the budget wins
+and the decision is recorded in the ledger with its reason.
+
+Usage:
+    python planner.py "./examples/person_images/Joe.jpg" "./examples/garment_images/shirts/upper_2.jpg" \\
+        "Alternative upper garment" --budget 120 --dry-run
+"""
+
+import argparse
+import threading
+import time
+from pathlib import Path
+
+from layered_pipeline import apply_complete_outfit
+from profiling import profiled
+from quality import step2_needed
+from run_ledger import get_ledger, percentile, refinement_summary, start_run
+from spaces import (IDM_VTON_SPACE, VIRTUAL_TRYON_SPACE, backend_name, get_health_monitor, in_flight,
+                    prefetch_uploads)
+from two_step_pipeline import step1_as_final, step1_or_degrade, step2_idm_vton
+from validation import ValidationError, validate_or_reject
+
+# Remote stages of each plan, in order
+PLANS = {
+    "direct": (IDM_VTON_SPACE,),
+    "two_step": (VIRTUAL_TRYON_SPACE, IDM_VTON_SPACE),
+    "layered": (VIRTUAL_TRYON_SPACE, IDM_VTON_SPACE),
+}
+# Used until the ledger has MIN_SAMPLES successful runs for a Space
+DEFAULT_STAGE_SECONDS = {VIRTUAL_TRYON_SPACE: 45.0, IDM_VTON_SPACE: 60.0}
+MIN_SAMPLES = 5
+DEFAULT_WINDOW = 86400
+DEFAULT_PERCENTILE = 90
+# Seconds a shared LatencyModel is reused before the ledger is read again
+MODEL_TTL = 30.0
+
+_model_lock = threading.Lock()
+_shared_model = {"key": None, "built_at": 0.0, "model": None}
+
+
+def feasible_plans(job):
+    """Plans that can produce the requested garments, with reasons for the others"""
+    if job.get("pants") and job.get("upper"):
+        return ["layered"], {"direct": "outfits need the pants step", "two_step": "outfits need the pants step"}
+    if job.get("type", "upper_body") == "upper_body":
+        return ["direct", "two_step"], {"layered": "single garment"}
+    reason = f"IDM-VTON alone cannot apply {job['type']}"
+    return ["two_step"], {"direct": reason, "layered": "single garment"}
+
+
+class LatencyModel:
+    """Per-Space latency from recent ledger runs plus local queue depth"""
+
+    def __init__(self, ledger=None, window=DEFAULT_WINDOW, pct=DEFAULT_PERCENTILE, queue_depth=in_flight):
+        self.pct = pct
+        self.queue_depth = queue_depth
+        self.samples = {}
+        rows = ledger.rows(since=time.time() - window) if ledger else []
+        scored, skipped = refinement_summary(rows)
+        # Share of two-step jobs whose Step 2 was skipped by the quality gate (see quality.py)
+        self.skip_rate = skipped / scored if scored >= MIN_SAMPLES else 0.0
+        for row in rows:
+            if row["stage"] not in ("step1", "step2") or row.get("error") or not row.get("total_seconds"):
+                continue
+            # Only runs on the backend that currently serves the Space predict its latency
+            if (row.get("params") or {}).get("backend", "gradio") == backend_name(row["space"]):
+                self.samples.setdefault(row["space"], []).append(row["total_seconds"])
+
+    def stage(self, space):
+        """(typical seconds, percentile seconds, source) for one call to `space`"""
+        values = self.samples.get(space, [])
+        if len(values) < MIN_SAMPLES:
+            default = DEFAULT_STAGE_SECONDS.get(space, 60.0)
+            return default, default, "default"
+        return percentile(values, 50), percentile(values, self.pct), f"{len(values)} runs"
+
+    def estimate(self, plan):
+        """Expected latency (percentile + time behind local queue) and GPU cost of a plan"""
+        latency, gpu_seconds, stages = 0.0, 0.0, []
+        for space in PLANS[plan]:
+            typical, high, source = self.stage(space)
+            queued = self.queue_depth(space)
+            latency += high + queued * typical
+            # Latency stays worst case; the expected GPU cost counts skipped refinements
+            share = 1 - self.skip_rate if plan == "two_step" and space == IDM_VTON_SPACE else 1
+            gpu_seconds += typical * share
+            stages.append({"space": space, "seconds": round(high, 1), "queued": queued, "source": source})
+        return {"latency": round(latency, 1), "gpu_seconds": round(gpu_seconds, 1), "stages": stages}
+
+
+def latency_model(ttl=MODEL_TTL):
+    """
+    LatencyModel shared by every job, rebuilt from the ledger at most every
+    `ttl` seconds (and when the ledger or a stage backend changes). Queue
+    depth is read live on each estimate either way.
+    """
+    ledger = get_ledger()
+    key = (ledger, backend_name(VIRTUAL_TRYON_SPACE), backend_name(IDM_VTON_SPACE))
+    with _model_lock:
+        now = time.monotonic()
+        if _shared_model["key"] != key or now - _shared_model["built_at"] >= ttl:
+            _shared_model.update(key=key, built_at=now, model=LatencyModel(ledger))
+        return _shared_model["model"]
+
+
+def choose_plan(job, model=None, monitor=None):
+    """
+    Pick the plan for one job. `job` uses the streaming/example dict format
+    plus an optional "budget" (seconds) and "plans" (allowed plan names).
+    Returns a dict with the plan, its estimate, the reason and all candidates.
+    """
+    model = model or latency_model()
+    monitor = monitor if monitor is not None else get_health_monitor()
+    budget = job.get("budget")
+    feasible, excluded = feasible_plans(job)
+    allowed = job.get("plans")
+
+    candidates = {}
+    for plan in feasible:
+        if allowed and plan not in allowed:
+            excluded[plan] = "not allowed for this job"
+            continue
+        down = [space for space in PLANS[plan] if monitor and monitor.is_open(space)]
+        if down:
+            excluded[plan] = f"{down[0]} circuit open"
+            continue
+        candidates[plan] = model.estimate(plan)
+
+    if not candidates:
+        return {"plan": None, "budget": budget, "reason": "no usable plan: " +
+                "; ".join(f"{p} ({r})" for p, r in excluded.items()), "candidates": {}, "excluded": excluded}
+
+    fitting = {p: e for p, e in candidates.items() if budget is None or e["latency"] <= budget}
+    if fitting:
+        plan = min(fitting, key=lambda p: (fitting[p]["gpu_seconds"], fitting[p]["latency"]))
+        estimate = candidates[plan]
+        reason = f"cheapest of {len(fitting)} plan(s) at {estimate['gpu_seconds']:.0f} GPU s"
+        if budget is not None:
+            reason += f", ~{estimate['latency']:.0f}s within {budget:.0f}s budget"
+    else:
+        plan = min(candidates, key=lambda p: candidates[p]["latency"])
+        estimate = candidates[plan]
+        reason = f"no plan fits {budget:.0f}s budget, fastest is ~{estimate['latency']:.0f}s"
+    if len(feasible) == 1:
+        reason += f" (only {plan} fits the garments)"
+
+    return {"plan": plan, "budget": budget, "latency": estimate["latency"], "gpu_seconds": estimate["gpu_seconds"],
+            "reason": reason, "candidates": candidates, "excluded": excluded}
+
+
+def run_planned(job, mask_cache=None, crop_region=False, model=None, output_tag=""):
+    """
+    Plan and run one job. Returns (result, mask, decision); the decision is
+    also stored in the ledger as a "plan" row. Invalid inputs are rejected
+    before planning (decision["plan"] is None).
+    """
+    try:
+        job = validate_or_reject(job)
+    except ValidationError as e:
+        return None, None, {"plan": None, "budget": job.get("budget"), "reason": f"invalid input: {e}",
+                            "candidates": {}, "excluded": {}}
+    decision = choose_plan(job, model)
+    run = start_run("plan", None, inputs={"person": job.get("person")},
+                    params={"plan": decision["plan"], "budget": decision["budget"], "reason": decision["reason"],
+                            "latency": decision.get("latency"), "gpu_seconds": decision.get("gpu_seconds"),
+                            "backend": backend_name(PLANS[decision["plan"]][0]) if decision["plan"] else None})
+    print(f"🧭 Plan: {decision['plan'] or 'none'} - {decision['reason']}")
+    run.finish(error=None if decision["plan"] else decision["reason"])
+
+    plan = decision["plan"]
+    if plan:
+        prefetch_uploads({**job, "plan": plan})
+    tag = f"{output_tag}_{plan}" if output_tag else plan
+    garment_type = job.get("type", "upper_body")
+    if plan == "layered":
+        result, _, mask = apply_complete_outfit(job["person"], job["pants"], job["upper"], job["description"],
+                                                mask_cache=mask_cache, crop_region=crop_region, output_tag=tag)
+        return result, mask, decision
+    if plan == "direct":
+        result, mask = step2_idm_vton(job["person"], job["garment"], job["description"],
+                                      person_path=job["person"], garment_type=garment_type,
+                                      mask_cache=mask_cache, crop_region=crop_region, output_tag=tag)
+        return result, mask, decision
+    if plan == "two_step":
+        step1_result, degraded = step1_or_degrade(job["person"], job["garment"], garment_type, output_tag=tag)
+        if not step1_result:
+            return None, None, decision
+        if not degraded and not step2_needed(step1_result, job["garment"], job["person"], garment_type)[0]:
+            return step1_as_final(step1_result, output_tag=tag), None, decision
+        result, mask = step2_idm_vton(step1_result, job["garment"], job["description"],
+                                      person_path=job["person"], garment_type=garment_type,
+                                      mask_cache=mask_cache, crop_region=crop_region,
+                                      output_tag=tag, degraded=degraded)
+        return result, mask, decision
+    return None, None, decision
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Choose and run the cheapest plan that meets a latency budget")
+    parser.add_argument("person")
+    parser.add_argument("garment", help="shirt, pants or dress image (the upper garment with --pants)")
+    parser.add_argument("description")
+    parser.add_argument("--type", default="upper_body", choices=["upper_body", "lower_body", "dresses"])
+    parser.add_argument("--pants", help="pants image for a layered outfit")
+    parser.add_argument("--budget", type=float, help="latency budget in seconds")
+    parser.add_argument("--dry-run", action="store_true", help="only print the plan")
+    args = parser.parse_args()
+
+    for path in (args.person, args.garment, args.pants):
+        if path and not Path(path).exists():
+            print(f"❌ File not found: {path}")
+            return
+
+    if args.pants:
+        job = {"person": args.person, "pants": args.pants, "upper": args.garment, "description": args.description}
+    else:
+        job = {"person": args.person, "garment": args.garment, "description": args.description, "type": args.type}
+    job["budget"] = args.budget
+
+    if args.dry_run:
+        decision = choose_plan(job)
+        print(f"🧭 Plan: {decision['plan'] or 'none'} - {decision['reason']}")
+        for plan, estimate in decision["candidates"].items():
+            print(f"   {plan:<9} ~{estimate['latency']:6.1f}s  {estimate['gpu_seconds']:6.1f} GPU s  "
+                  + ", ".join(f"{s['space'].split('/')[-1]} {s['seconds']}s ({s['source']}, {s['queued']} queued)"
+                              for s in estimate["stages"]))
+        for plan, reason in decision["excluded"].items():
+            print(f"   {plan:<9} excluded: {reason}")
+        return
+
+    result, mask, decision = run_planned(job)
+    if result:
+        print(f"🎉 {decision['plan']} result: {result}")
+
+
+if __name__ == "__main__":
+    with profiled("planner"):
+        main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Priority Classes
+Stage calls queue per Space in three classes so an interactive try-on does
+not wait behind a catalog batch running in the same process:
+
+    interactive   the pipeline REPLs and API callers waiting on a result
+    normal        anything not marked otherwise
+    bulk          matrix_runner.py and shard_runner.py
+
+A waiting call goes ahead of every call of a lower class, and the last
+VTON_PRIORITY_RESERVED slots of each Space are only given to interactive
+calls. A bulk call that has waited VTON_PRIORITY_AGING seconds is queued as
+normal from then on, in arrival order, so a steady stream of normal calls
+cannot starve it. The number of slots per Space is VTON_PRIORITY_SLOTS, or
+the Space's adaptive limit with VTON_AIMD (see concurrency.py).
+
+Mark the calls of a block (threads started by stream_results() and
+run_variants() inherit it):
+    with priority("interactive"):
+        run_two_step_pipeline(person, garment, "shirt")
+
+Enable from .env / the environment:
+    VTON_PRIORITY=1
+    VTON_PRIORITY_SLOTS=4
+    VTON_PRIORITY_RESERVED=1
+    VTON_PRIORITY_AGING=120
+"""
+
+import contextvars
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+CLASSES = ("interactive", "normal", "bulk")
+DEFAULT_CLASS = "normal"
+DEFAULT_SLOTS = 4
+DEFAULT_RESERVED = 1
+DEFAULT_AGING = 120.0
+WAIT_WINDOW = 500
+# Capacity can change under a waiting call (adaptive limits), so waiters re-check at least this often
+RECHECK_SECONDS = 1.0
+
+_current = contextvars.ContextVar("vton_priority", default=None)
+_default = DEFAULT_CLASS
+
+
+def _checked(name):
+    if name not in CLASSES:
+        raise ValueError(f"unknown priority class '{name}'; use one of {', '.join(CLASSES)}")
+    return name
+
+
+def current_priority():
+    """Priority class of calls made from here: the innermost priority() block or the process default"""
+    return _current.get() or _default
+
+
+def set_default_priority(name):
+    """Priority class of calls outside any priority() block (batch runners set bulk)"""
+    global _default
+    _default = _checked(name)
+
+
+@contextmanager
+def priority(name):
+    """Run the stage calls of a block in priority class `name`"""
+    token = _current.set(_checked(name))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def inherit(fn, name=None):
+    """Wrap `fn` for a worker thread so it runs in the caller's class (or `name`)"""
+    name = _checked(name or current_priority())
+
+    def run(*args, **kwargs):
+        with priority(name):
+            return fn(*args, **kwargs)
+    return run
+
+
+class PriorityGate:
+    """Slots of one Space handed out by class: acquire(name) before a call, release(name) after"""
+
+    def __init__(self, space, slots=DEFAULT_SLOTS, reserved=DEFAULT_RESERVED, aging=DEFAULT_AGING,
+                 capacity=None, clock=time.monotonic):
+        self.space = space
+        self.slots = slots
+        self.reserved = reserved
+        self.aging = aging
+        self.capacity = capacity
+        self.clock = clock
+        self.in_flight = dict.fromkeys(CLASSES, 0)
+        self.promoted = 0
+        self._waiting = []
+        self._waits = {name: deque(maxlen=WAIT_WINDOW) for name in CLASSES}
+        self._calls = dict.fromkeys(CLASSES, 0)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @property
+    def waiting(self):
+        with self._cond:
+            return len(self._waiting)
+
+    def _slots(self):
+        return (self.capacity(self.space) if self.capacity else None) or self.slots
+
+    def _admissible(self, name):
+        used = sum(self.in_flight.values())
+        if name == "interactive":
+            return used < self._slots()
+        # With a single slot nothing can be reserved; interactive calls still go first
+        return used < max(1, self._slots() - self.reserved)
+
+    def _rank(self, waiter, now):
+        rank = CLASSES.index(waiter["class"])
+        if waiter["class"] == "bulk" and now - waiter["arrived"] >= self.aging:
+            rank = CLASSES.index("normal")
+            if not waiter["promoted"]:
+                waiter["promoted"] = True
+                self.promoted += 1
+        return rank, waiter["arrived"], waiter["seq"]
+
+    def _next(self):
+        """The waiter to admit now, if any"""
+        now = self.clock()
+        for waiter in sorted(self._waiting, key=lambda w: self._rank(w, now)):
+            if self._admissible(waiter["class"]):
+                return waiter
+        return None
+
+    def acquire(self, name=None):
+        """Block until the call may start; returns the seconds it queued"""
+        name = _checked(name or current_priority())
+        waiter = {"class": name, "arrived": self.clock(), "seq": next(self._seq), "promoted": False}
+        with self._cond:
+            self._waiting.append(waiter)
+            try:
+                while self._next() is not waiter:
+                    self._cond.wait(RECHECK_SECONDS)
+            finally:
+                self._waiting.remove(waiter)
+            self.in_flight[name] += 1
+            waited = self.clock() - waiter["arrived"]
+            self._waits[name].append(waited)
+            self._calls[name] += 1
+            # Whoever is next may also fit
+            self._cond.notify_all()
+        return waited
+
+    def release(self, name=None):
+        name = _checked(name or current_priority())
+        with self._cond:
+            self.in_flight[name] -= 1
+            self._cond.notify_all()
+
+    def status(self):
+        """Per-class calls, in flight, waiting and queue wait (mean / p95 / max over the recent calls)"""
+        with self._cond:
+            rows = []
+            for name in CLASSES:
+                waits = sorted(self._waits[name])
+                rows.append({
+                    "space": self.space, "class": name, "calls": self._calls[name],
+                    "in_flight": self.in_flight[name],
+                    "waiting": sum(1 for w in self._waiting if w["class"] == name),
+                    "mean_wait": sum(waits) / len(waits) if waits else None,
+                    "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else None,
+                    "max_wait": waits[-1] if waits else None,
+                })
+            return rows
+
+
+class PriorityGates:
+    """Priority gates for all Spaces"""
+
+    def __init__(self, slots=DEFAULT_SLOTS, reserved=DEFAULT_RESERVED, aging=DEFAULT_AGING, capacity=None,
+                 clock=time.monotonic):
+        self.slots = slots
+        self.reserved = reserved
+        self.aging = aging
+        self.capacity = capacity
+        self.clock = clock
+        self._gates = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, capacity=None):
+        """Gates configured from VTON_PRIORITY_* (None unless VTON_PRIORITY is set)"""
+        if os.getenv("VTON_PRIORITY", "").strip().lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            slots=int(os.getenv("VTON_PRIORITY_SLOTS", DEFAULT_SLOTS)),
+            reserved=int(os.getenv("VTON_PRIORITY_RESERVED", DEFAULT_RESERVED)),
+            aging=float(os.getenv("VTON_PRIORITY_AGING", DEFAULT_AGING)),
+            capacity=capacity,
+        )
+
+    def gate(self, space):
+        with self._lock:
+            if space not in self._gates:
+                self._gates[space] = PriorityGate(space, self.slots, self.reserved, self.aging,
+                                                  self.capacity, self.clock)
+            return self._gates[space]
+
+    def status(self):
+        with self._lock:
+            gates = list(self._gates.values())
+        return [row for gate in gates for row in gate.status()]
+
+    def print_report(self):
+        print("\n🚦 Queue wait by priority")
+        for row in self.status():
+            if not row["calls"]:
+                continue
+            print(f"   {row['space']} {row['class']}: {row['calls']} call(s), wait mean {row['mean_wait']:.1f}s, "
+                  f"p95 {row['p95_wait']:.1f}s, max {row['max_wait']:.1f}s")
+        promoted = sum(gate.promoted for gate in self._gates.values())
+        if promoted:
+            print(f"   {promoted} bulk call(s) promoted after waiting {self.aging:.0f}s")
+
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Client-Side Profiling
+Samples every thread of the process while a pipeline runs and writes a
+flame-graph input (folded stacks, one "frame;frame;frame count" line per
+stack, for flamegraph.pl / speedscope / inferno) plus a short per-function
+summary.
+
+CPU mode (default) only counts a sample when the thread actually used CPU
+since the last one, so threads blocked on the Space do not drown out image
+decoding, multipart encoding or file copies. Wall mode counts everything.
+
+Run against recorded Space calls so no remote quota is spent:
+    VTON_CASSETTE=./examples/cassettes/demo VTON_PROFILE=cpu python matrix_runner.py
+    python profiling.py --mode wall two_step_pipeline.py
+
+Enable from .env / the environment:
+    VTON_PROFILE=cpu                 # cpu, wall, or module:callable for your own profiler
+    VTON_PROFILE_INTERVAL=0.005
+    VTON_PROFILE_DIR=./examples/cache/profiles
+
+A custom profiler is any object with start(), stop() and write(dest_stem)
+returning the written paths; VTON_PROFILE=package.module:factory builds it.
+"""
+
+import argparse
+import importlib
+import os
+import runpy
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+DEFAULT_INTERVAL = 0.005
+DEFAULT_PROFILE_DIR = "./examples/cache/profiles"
+SUMMARY_ROWS = 15
+
+
+def _thread_cpu_ticks(native_id):
+    """utime + stime of one thread in clock ticks, or None where /proc is unavailable"""
+    try:
+        with open(f"/proc/self/task/{native_id}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return int(fields[11]) + int(fields[12])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Background thread that samples all other threads every `interval` seconds"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, mode="cpu"):
+        if mode not in ("cpu", "wall"):
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        if mode == "cpu" and _thread_cpu_ticks(threading.get_native_id()) is None:
+            print("⚠️  Per-thread CPU time unavailable, profiling wall time instead")
+            mode = "wall"
+        self.interval = interval
+        self.mode = mode
+        self.stacks = {}        # folded stack -> weight
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._last_ticks = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="vton-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.perf_counter() - self.started_at
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """Take one sample of every thread except the profiler itself"""
+        threads = {t.ident: t for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            thread = threads.get(ident)
+            if thread is None or thread is self._thread:
+                continue
+            weight = 1
+            if self.mode == "cpu":
+                ticks = _thread_cpu_ticks(thread.native_id)
+                if ticks is None:
+                    continue
+                weight = ticks - self._last_ticks.get(ident, ticks)
+                self._last_ticks[ident] = ticks
+                if weight <= 0:
+                    continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(thread.name.split(" ")[0])
+            key = ";".join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + weight
+            self.samples += 1
+
+    def summary(self, rows=SUMMARY_ROWS):
+        """Per-function self and total (inclusive) weight, heaviest self first"""
+        own, total = {}, {}
+        for key, weight in self.stacks.items():
+            frames = key.split(";")[1:]
+            if not frames:
+                continue
+            own[frames[-1]] = own.get(frames[-1], 0) + weight
+            for name in set(frames):
+                total[name] = total.get(name, 0) + weight
+        grand_total = sum(self.stacks.values()) or 1
+        ranked = sorted(total, key=lambda name: (own.get(name, 0), total[name]), reverse=True)
+        return [
+            {"function": name, "self": own.get(name, 0), "total": total[name],
+             "self_pct": 100.0 * own.get(name, 0) / grand_total, "total_pct": 100.0 * total[name] / grand_total}
+            for name in ranked[:rows]
+        ]
+
+    def write(self, dest_stem):
+        """Write <dest_stem>.folded and <dest_stem>.txt; returns both paths"""
+        dest_stem = Path(dest_stem)
+        dest_stem.parent.mkdir(parents=True, exist_ok=True)
+        folded_path = dest_stem.with_suffix(".folded")
+        summary_path = dest_stem.with_suffix(".txt")
+        folded_path.write_text("".join(f"{key} {weight}\n" for key, weight in sorted(self.stacks.items())))
+
+        unit = "CPU ticks" if self.mode == "cpu" else "samples"
+        lines = [
+            f"Profile ({self.mode}): {self.duration:.1f}s, {self.samples} samples every {self.interval * 1000:.0f}ms",
+            f"{'self %':>7} {'total %':>8} {unit:>10}  function",
+        ]
+        for row in self.summary():
+            lines.append(f"{row['self_pct']:7.1f} {row['total_pct']:8.1f} {row['self']:>10}  {row['function']}")
+        summary_path.write_text("\n".join(lines) + "\n")
+        return folded_path, summary_path
+
+
+def profiler_from_env():
+    """Profiler selected by VTON_PROFILE, or None when profiling is off"""
+    spec = os.getenv("VTON_PROFILE", "").strip()
+    if spec.lower() in ("", "0", "off", "false", "no"):
+        return None
+    interval = float(os.getenv("VTON_PROFILE_INTERVAL", DEFAULT_INTERVAL))
+    if spec.lower() in ("1", "true", "yes", "cpu"):
+        return SamplingProfiler(interval, "cpu")
+    if spec.lower() == "wall":
+        return SamplingProfiler(interval, "wall")
+    if ":" in spec:
+        module_name, factory = spec.split(":", 1)
+        return getattr(importlib.import_module(module_name), factory)()
+    raise ValueError(f"Unknown VTON_PROFILE value: {spec}")
+
+
+@contextmanager
+def profiled(label, profiler=None, output_dir=None):
+    """
+    Profile the enclosed block when a profiler is given or VTON_PROFILE is
+    set; does nothing otherwise. Output goes to <output_dir>/<label>_<time>.*
+    """
+    profiler = profiler or profiler_from_env()
+    if not profiler:
+        yield None
+        return
+    output_dir = output_dir or os.getenv("VTON_PROFILE_DIR", DEFAULT_PROFILE_DIR)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        paths = profiler.write(Path(output_dir) / f"{label}_{int(time.time())}")
+        print(f"\n🔬 Profile written: {', '.join(str(p) for p in paths)}")
+        if hasattr(profiler, "summary"):
+            for row in profiler.summary(rows=5):
+                print(f"   {row['self_pct']:5.1f}% self  {row['function']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a pipeline script under the sampling profiler")
+    parser.add_argument("--mode", choices=["cpu", "wall"], default="cpu")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL)
+    parser.add_argument("--output-dir", default=os.getenv("VTON_PROFILE_DIR", DEFAULT_PROFILE_DIR))
+    parser.add_argument("script", help="e.g. two_step_pipeline.py or inference.py")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    sys.argv = [args.script] + args.args
+    sys.path.insert(0, str(Path(args.script).resolve().parent))
+    with profiled(Path(args.script).stem, SamplingProfiler(args.interval, args.mode), args.output_dir):
+        try:
+            runpy.run_path(args.script, run_name="__main__")
+        except (SystemExit, KeyboardInterrupt):
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Step 1 Quality Scoring
+Scores a virtual-try-on result locally (numpy, on <=256 px thumbnails, tens
+of milliseconds) so the IDM-VTON refinement can be skipped when Step 1 is
+already good enough:
+
+    color       histogram intersection between the garment photo (its
+                near-white background ignored) and the pixels Step 1
+                changed inside the garment region
+    structure   block SSIM between the person photo and the Step 1 output
+                outside the garment region (the rest of the photo should be
+                untouched)
+
+Artifacts always send the job to Step 2: "unchanged" (the garment was not
+applied) and "bleed" (Step 1 altered the photo outside the garment region).
+
+Enable with a threshold in .env / the environment (unset = always refine):
+    VTON_SKIP_STEP2_THRESHOLD=0.8
+
+Usage:
+    python quality.py step1_result.png garment.jpg person.jpg --type upper_body
+"""
+
+import argparse
+import os
+
+import numpy as np
+from PIL import Image
+
+from compositing import region_box
+from run_ledger import start_run
+
+THUMBNAIL_SIZE = 256
+HISTOGRAM_BINS = 4          # per RGB channel
+BACKGROUND_LEVEL = 235      # garment photo pixels brighter than this in every channel are background
+CHANGED_LEVEL = 24          # per-pixel mean abs difference that counts as "changed by Step 1"
+MIN_CHANGED_FRACTION = 0.05
+MIN_STRUCTURE = 0.8
+COLOR_WEIGHT = 0.7
+
+
+def skip_threshold():
+    """VTON_SKIP_STEP2_THRESHOLD as a float, None when refinement always runs"""
+    value = os.getenv("VTON_SKIP_STEP2_THRESHOLD", "").strip().lower()
+    if value in ("", "off", "none"):
+        return None
+    return float(value)
+
+
+def _pixels(path, size=None):
+    with Image.open(path) as img:
+        # JPEGs are decoded at reduced scale straight away
+        img.draft("RGB", size or (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        img = img.convert("RGB")
+        if size:
+            img = img.resize(size)
+        else:
+            img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        return np.asarray(img, dtype=np.int16)
+
+
+def color_histogram(pixels):
+    """Normalized HISTOGRAM_BINS^3 RGB histogram of an (N, 3) pixel array"""
+    if not len(pixels):
+        return np.zeros(HISTOGRAM_BINS ** 3)
+    idx = pixels // (256 // HISTOGRAM_BINS)
+    flat = (idx[:, 0] * HISTOGRAM_BINS + idx[:, 1]) * HISTOGRAM_BINS + idx[:, 2]
+    counts = np.bincount(flat, minlength=HISTOGRAM_BINS ** 3)
+    return counts / counts.sum()
+
+
+def block_ssim(a, b, mask=None, block=8):
+    """Mean SSIM of two grayscale arrays over block x block windows (only blocks fully inside `mask`)"""
+    h, w = (a.shape[0] // block) * block, (a.shape[1] // block) * block
+    if not h or not w:
+        return 1.0
+
+    def blocks(x):
+        return x[:h, :w].reshape(h // block, block, w // block, block).swapaxes(1, 2).reshape(-1, block * block)
+
+    a, b = blocks(a.astype(np.float64)), blocks(b.astype(np.float64))
+    mu_a, mu_b = a.mean(axis=1), b.mean(axis=1)
+    var_a, var_b = a.var(axis=1), b.var(axis=1)
+    cov = ((a - mu_a[:, None]) * (b - mu_b[:, None])).mean(axis=1)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    ssim = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a ** 2 + mu_b ** 2 + c1) * (var_a + var_b + c2))
+    if mask is not None:
+        keep = blocks(mask).all(axis=1)
+        if not keep.any():
+            return 1.0
+        ssim = ssim[keep]
+    return float(ssim.mean())
+
+
+def score_step1(step1_path, garment_path, person_path, garment_type="upper_body"):
+    """
+    Score a Step 1 result. Returns a dict with "score" (0-1), its "color"
+    and "structure" parts and the list of "artifacts" found.
+    """
+    result = _pixels(step1_path)
+    height, width = result.shape[:2]
+    person = _pixels(person_path, size=(width, height))
+    garment = _pixels(garment_path).reshape(-1, 3)
+
+    left, top, right, bottom = (int(round(v)) for v in region_box((width, height), garment_type))
+    inside = np.zeros((height, width), dtype=bool)
+    inside[top:bottom, left:right] = True
+
+    changed = np.abs(result - person).mean(axis=2) > CHANGED_LEVEL
+    worn = result[changed & inside]
+    changed_fraction = len(worn) / max(int(inside.sum()), 1)
+
+    garment = garment[~(garment > BACKGROUND_LEVEL).all(axis=1)]
+    color = float(np.minimum(color_histogram(garment), color_histogram(worn)).sum())
+    gray = np.array([0.299, 0.587, 0.114])
+    structure = block_ssim(result @ gray, person @ gray, mask=~inside)
+
+    artifacts = []
+    if changed_fraction < MIN_CHANGED_FRACTION:
+        artifacts.append("unchanged")
+    if structure < MIN_STRUCTURE:
+        artifacts.append("bleed")
+    score = COLOR_WEIGHT * color + (1 - COLOR_WEIGHT) * structure
+    return {"score": round(score, 4), "color": round(color, 4), "structure": round(structure, 4),
+            "changed": round(changed_fraction, 4), "artifacts": artifacts}
+
+
+def step2_needed(step1_path, garment_path, person_path, garment_type="upper_body", threshold=None):
+    """
+    Decide whether Step 2 should refine a Step 1 result. Returns (needed,
+    scores); scores is None when no threshold is configured (always refine).
+    Every decision is stored in the ledger as a "quality" row.
+    """
+    threshold = skip_threshold() if threshold is None else threshold
+    if threshold is None:
+        return True, None
+    run = start_run("quality", None, inputs={"step1": step1_path, "garment": garment_path, "person": person_path},
+                    params={"garment_type": garment_type, "threshold": threshold})
+    try:
+        scores = score_step1(step1_path, garment_path, person_path, garment_type)
+    except Exception as e:
+        run.finish(error=e)
+        print(f"⚠️  Could not score Step 1 ({e}) - refining")
+        return True, None
+    needed = bool(scores["artifacts"]) or scores["score"] < threshold
+    run.params.update(scores, skipped=not needed)
+    run.mark("score")
+    run.finish()
+    if needed:
+        reason = ", ".join(scores["artifacts"]) or f"score {scores['score']:.2f} < {threshold}"
+        print(f"🔬 Step 1 scored {scores['score']:.2f} - refining with IDM-VTON ({reason})")
+    else:
+        print(f"🔬 Step 1 scored {scores['score']:.2f} >= {threshold} - skipping IDM-VTON")
+    return needed, scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a Step 1 result against its garment and person photo")
+    parser.add_argument("step1_result")
+    parser.add_argument("garment")
+    parser.add_argument("person")
+    parser.add_argument("--type", default="upper_body", choices=["upper_body", "lower_body", "dresses"])
+    args = parser.parse_args()
+
+    scores = score_step1(args.step1_result, args.garment, args.person, args.type)
+    print(f"🔬 Score {scores['score']:.3f} (color {scores['color']:.3f}, structure {scores['structure']:.3f}, "
+          f"{scores['changed']:.0%} of the region changed)")
+    if scores["artifacts"]:
+        print(f"   Artifacts: {', '.join(scores['artifacts'])}")
+    threshold = skip_threshold()
+    if threshold is not None:
+        needed = scores["artifacts"] or scores["score"] < threshold
+        print(f"   {'Refine' if needed else 'Skip'} Step 2 at threshold {threshold}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,8 @@ import os
 from pathlib import Path
 import time
 
+from jobs import JobManager, checkpoint, print_commands, run_or_submit
+
 # Try to load from .env file
 env_file = Path(".env")
 if env_file.exists():
@@ -118,10 +120,21 @@ def run_example(example_key):
             print(f"    Results saved:")
             print(f"   Main result: {result_path}")
             print(f"   Mask result: {mask_path}")
+            return result_path, mask_path
         
     except Exception as e:
         print(f" Error during processing: {e}")
 
+def run_all_examples():
+    """Every example in turn; returns their result paths"""
+    print(" Running all examples...")
+    results = []
+    for key in EXAMPLES.keys():
+        checkpoint()
+        results.append(run_example(key))
+        print("-" * 30)
+    return results
+
 def main():
     """Main interactive menu"""
     print("\n" + "="*50)
@@ -137,21 +150,28 @@ def main():
     print("• 'all' to run all examples")
     print("• 'q' to quit")
     
+    # Selections run as background jobs (VTON_JOBS_WORKERS in .env, 0 = foreground)
+    jobs = JobManager.from_env()
+    if jobs:
+        print_commands()
+    
     while True:
         choice = input("\nEnter your choice: ").strip().lower()
         
+        if jobs and jobs.command(choice):
+            continue
+        
         if choice == 'q':
+            if jobs:
+                jobs.close()
             print("👋 Goodbye!")
             break
         elif choice == 'all':
-            print(" Running all examples...")
-            for key in EXAMPLES.keys():
-                run_example(key)
-                print("-" * 30)
+            run_or_submit(jobs, "All examples", run_all_examples)
         elif choice in EXAMPLES:
-            run_example(choice)
+            run_or_submit(jobs, f"Example {choice}: {EXAMPLES[choice]['description']}", run_example, choice)
         else:
-            print("Invalid choice. Please enter 1-5, 'all', or 'q'")
+            print("Invalid choice. Please enter 1-5, 'all', 'q' or a job command")
 
 if __name__ == "__main__":
     main()
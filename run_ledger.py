@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Run Ledger
+Records every Step 1 / Step 2 execution (input hashes, Space, params, phase
+timings, bytes transferred, cache outcome, errors) in a local SQLite file and
+reports latency percentiles per stage and per Space.
+
+Usage:
+    python run_ledger.py                       # last 24h, total latency
+    python run_ledger.py --since 7d --phase predict
+    python run_ledger.py --by space
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from mask_cache import file_hash
+
+DEFAULT_LEDGER_PATH = "./examples/cache/ledger.sqlite3"
+
+# Column name -> SQLite type; columns missing from an older ledger are added on open
+COLUMNS = {
+    "id": "INTEGER PRIMARY KEY AUTOINCREMENT",
+    "started_at": "REAL",
+    "stage": "TEXT",
+    "space": "TEXT",
+    "input_hashes": "TEXT",
+    "params": "TEXT",
+    "timings": "TEXT",
+    "total_seconds": "REAL",
+    "bytes_up": "INTEGER",
+    "bytes_down": "INTEGER",
+    "cache": "TEXT",
+    "error": "TEXT",
+}
+
+
+class RunLedger:
+    """Thread-safe append-only SQLite ledger of stage executions"""
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        columns = ", ".join(f"{name} {kind}" for name, kind in COLUMNS.items())
+        self._conn.execute(f"CREATE TABLE IF NOT EXISTS runs ({columns})")
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(runs)")}
+        for name, kind in COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE runs ADD COLUMN {name} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS runs_started_at ON runs (started_at)")
+        self._conn.commit()
+
+    def record(self, **fields):
+        """Insert one run; dict/list values are stored as JSON"""
+        row = {k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in fields.items()}
+        names = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        with self._lock:
+            self._conn.execute(f"INSERT INTO runs ({names}) VALUES ({marks})", list(row.values()))
+            self._conn.commit()
+
+    def rows(self, since=None, until=None):
+        """Runs as dicts (JSON columns decoded), oldest first"""
+        query, args = "SELECT * FROM runs WHERE 1=1", []
+        if since is not None:
+            query += " AND started_at >= ?"
+            args.append(since)
+        if until is not None:
+            query += " AND started_at < ?"
+            args.append(until)
+        with self._lock:
+            cursor = self._conn.execute(query + " ORDER BY started_at", args)
+            names = [d[0] for d in cursor.description]
+            rows = [dict(zip(names, values)) for values in cursor.fetchall()]
+        for row in rows:
+            for key in ("input_hashes", "params", "timings"):
+                row[key] = json.loads(row[key]) if row.get(key) else {}
+        return rows
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RunRecord:
+    """
+    Collects one stage execution. Call mark() after each phase (the time since
+    the previous mark is stored under that phase name) and finish() once.
+    """
+
+    def __init__(self, ledger, stage, space, inputs=None, params=None):
+        self.ledger = ledger
+        self.stage = stage
+        self.space = space
+        self.params = dict(params or {})
+        self.input_hashes = {}
+        self.bytes_up = 0
+        self.bytes_down = 0
+        self.cache = None
+        self.timings = {}
+        self.started_at = time.time()
+        self._last_mark = time.perf_counter()
+        self._start = self._last_mark
+        self._finished = False
+        for name, path in (inputs or {}).items():
+            if path and Path(path).exists():
+                self.input_hashes[name] = file_hash(path)[:16]
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.timings[phase] = round(self.timings.get(phase, 0) + now - self._last_mark, 4)
+        self._last_mark = now
+
+    def add_upload(self, *paths):
+        for path in paths:
+            if path and Path(path).exists():
+                self.bytes_up += os.path.getsize(path)
+
+    def add_download(self, *paths):
+        for path in paths:
+            if path and Path(path).exists():
+                self.bytes_down += os.path.getsize(path)
+
+    def finish(self, error=None):
+        if self._finished:
+            return
+        self._finished = True
+        if not self.ledger:
+            return
+        try:
+            self.ledger.record(
+                started_at=self.started_at,
+                stage=self.stage,
+                space=self.space,
+                input_hashes=self.input_hashes,
+                params=self.params,
+                timings=self.timings,
+                total_seconds=round(time.perf_counter() - self._start, 4),
+                bytes_up=self.bytes_up,
+                bytes_down=self.bytes_down,
+                cache=self.cache,
+                error=str(error) if error else None,
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️  Could not write run ledger: {e}")
+
+
+_ledger = None
+_ledger_loaded = False
+_ledger_lock = threading.Lock()
+
+
+def get_ledger():
+    """Process-wide ledger at VTON_LEDGER (default ./examples/cache/), None if VTON_LEDGER=off"""
+    global _ledger, _ledger_loaded
+    with _ledger_lock:
+        if not _ledger_loaded:
+            path = os.getenv("VTON_LEDGER", DEFAULT_LEDGER_PATH).strip()
+            _ledger = None if path.lower() in ("", "off", "0", "false") else RunLedger(path)
+            _ledger_loaded = True
+        return _ledger
+
+
+def set_ledger(ledger):
+    """Install a ledger explicitly (or None to stop recording)"""
+    global _ledger, _ledger_loaded
+    with _ledger_lock:
+        _ledger, _ledger_loaded = ledger, True
+
+
+def start_run(stage, space, inputs=None, params=None):
+    """Begin a RunRecord against the process-wide ledger"""
+    return RunRecord(get_ledger(), stage, space, inputs, params)
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100.0
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def parse_window(text):
+    """'90m', '24h', '7d' or plain seconds -> seconds"""
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+    text = text.strip().lower()
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def latency_report(rows, by=("stage", "space"), phase="total"):
+    """
+    Group rows and compute count, error rate and p50/p95/p99 latency.
+    `phase` is 'total' or one of the recorded phase names (e.g. 'predict').
+    """
+    groups = {}
+    for row in rows:
+        key = tuple(row.get(field) or "-" for field in by)
+        groups.setdefault(key, []).append(row)
+
+    report = []
+    for key, group in sorted(groups.items()):
+        ok = [r for r in group if not r.get("error")]
+        if phase == "total":
+            values = [r["total_seconds"] for r in ok if r.get("total_seconds") is not None]
+        else:
+            values = [r["timings"][phase] for r in ok if phase in r["timings"]]
+        entry = dict(zip(by, key))
+        entry.update({
+            "runs": len(group),
+            "errors": len(group) - len(ok),
+            "bytes_up": sum(r.get("bytes_up") or 0 for r in group),
+            "bytes_down": sum(r.get("bytes_down") or 0 for r in group),
+            "p50": percentile(values, 50) if values else None,
+            "p95": percentile(values, 95) if values else None,
+            "p99": percentile(values, 99) if values else None,
+        })
+        report.append(entry)
+    return report
+
+
+def refinement_summary(rows):
+    """(scored, skipped): Step 1 results scored by quality.py and how many skipped Step 2"""
+    scored = [r for r in rows if r.get("stage") == "quality" and not r.get("error")]
+    return len(scored), sum(1 for r in scored if (r.get("params") or {}).get("skipped"))
+
+
+def print_report(report, by, phase, window):
+    print(f"\n📊 Latency in seconds ({phase}) over the last {window}")
+    print("="*90)
+    header = "  ".join(f"{field:<30}" for field in by)
+    print(f"{header}  {'runs':>5} {'err':>4} {'p50':>7} {'p95':>7} {'p99':>7} {'MB up':>7} {'MB down':>8}")
+    print("-"*90)
+    for entry in report:
+        label = "  ".join(f"{str(entry[field])[:30]:<30}" for field in by)
+        p = [f"{entry[k]:7.1f}" if entry[k] is not None else f"{'-':>7}" for k in ("p50", "p95", "p99")]
+        print(f"{label}  {entry['runs']:>5} {entry['errors']:>4} {' '.join(p)} "
+              f"{entry['bytes_up'] / 1e6:7.1f} {entry['bytes_down'] / 1e6:8.1f}")
+    if not report:
+        print("No runs recorded in this window.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency percentiles from the run ledger")
+    parser.add_argument("--ledger", default=os.getenv("VTON_LEDGER", DEFAULT_LEDGER_PATH))
+    parser.add_argument("--since", default="24h", help="time window, e.g. 90m, 24h, 7d")
+    parser.add_argument("--by", choices=["stage", "space", "both"], default="both")
+    parser.add_argument("--phase", default="total", help="'total' or a phase such as connect/predict/save")
+    args = parser.parse_args()
+
+    if not Path(args.ledger).exists():
+        print(f"❌ No ledger found at {args.ledger}")
+        return
+
+    by = {"stage": ("stage",), "space": ("space",), "both": ("stage", "space")}[args.by]
+    ledger = RunLedger(args.ledger)
+    rows = ledger.rows(since=time.time() - parse_window(args.since))
+    print_report(latency_report(rows, by, args.phase), by, args.phase, args.since)
+    scored, skipped = refinement_summary(rows)
+    if scored:
+        print(f"\n🔬 Step 2 skipped for {skipped} of {scored} scored Step 1 result(s) ({skipped / scored:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Sharded Batch Runner
+Splits a large job manifest (e.g. a 100k-combination catalog run) into
+shards on a filesystem shared by several worker hosts. Workers claim a
+shard by creating its lease file, renew the lease with heartbeats while
+they work and write every result to the shared result store. A lease that
+is not renewed within its TTL expires and the next worker takes the shard
+over, skipping the jobs already in the store. No queue service needed.
+
+Run directory layout:
+    manifest.json          shard count and size
+    shards/00000.jsonl     jobs of each shard (streaming.py job dicts + "id")
+    leases/00000.<gen>     current lease of a shard (highest generation wins)
+    done/00000.json        summary of each finished shard
+    results/<id>.json      per-job outcome; <id>.png / <id>_mask.png beside it
+
+Leases are taken with O_CREAT|O_EXCL, which is atomic on local disks and
+NFSv3+. Expiry compares wall-clock times, so keep the hosts' clocks in sync
+(NTP) and the TTL well above the skew.
+
+Usage:
+    python shard_runner.py plan /shared/run1 --manifest jobs.jsonl --shard-size 200
+    python shard_runner.py plan /shared/run1 --catalog --outfits
+    python shard_runner.py work /shared/run1 --concurrency 4      # on every worker host
+    python shard_runner.py status /shared/run1
+    python shard_runner.py retry /shared/run1                      # re-run failed jobs
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from downloads import get_downloads
+from priority import set_default_priority
+from profiling import profiled
+from spaces import get_concurrency, get_priority_gates
+from streaming import stream_results
+
+DEFAULT_SHARD_SIZE = 100
+DEFAULT_TTL = 120
+DEFAULT_POLL = 15
+
+
+def _write_json(path, data):
+    """Write atomically, so readers on other hosts never see half a file"""
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_text(json.dumps(data))
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        return json.loads(Path(path).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Lease:
+    """A worker's claim on one shard until `expires_at`"""
+
+    def __init__(self, shard, generation, worker, expires_at):
+        self.shard = shard
+        self.generation = generation
+        self.worker = worker
+        self.expires_at = expires_at
+
+    def __repr__(self):
+        return f"<Lease {self.shard}.{self.generation} {self.worker} until {self.expires_at:.0f}>"
+
+
+class ShardStore:
+    """Shards, leases and results of one run directory"""
+
+    def __init__(self, run_dir, clock=time.time):
+        self.run_dir = Path(run_dir)
+        self.clock = clock
+        self.shards_dir = self.run_dir / "shards"
+        self.leases_dir = self.run_dir / "leases"
+        self.done_dir = self.run_dir / "done"
+        self.results_dir = self.run_dir / "results"
+
+    def plan(self, jobs, shard_size=DEFAULT_SHARD_SIZE):
+        """Write the jobs as shards of `shard_size`; returns the number of shards"""
+        if (self.run_dir / "manifest.json").exists():
+            raise FileExistsError(f"{self.run_dir} already holds a planned run")
+        for directory in (self.shards_dir, self.leases_dir, self.done_dir, self.results_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        shards, total, batch = 0, 0, []
+
+        def flush():
+            nonlocal shards
+            lines = "".join(json.dumps(job) + "\n" for job in batch)
+            (self.shards_dir / f"{shards:05d}.jsonl").write_text(lines)
+            shards += 1
+            batch.clear()
+
+        for job in jobs:
+            batch.append({"id": str(job.get("id", f"{total:06d}")), **job})
+            total += 1
+            if len(batch) == shard_size:
+                flush()
+        if batch:
+            flush()
+        _write_json(self.run_dir / "manifest.json",
+                    {"shards": shards, "jobs": total, "shard_size": shard_size, "created_at": self.clock()})
+        return shards
+
+    def shards(self):
+        return sorted(path.stem for path in self.shards_dir.glob("*.jsonl"))
+
+    def jobs(self, shard):
+        with open(self.shards_dir / f"{shard}.jsonl") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def current_lease(self, shard):
+        """Highest-generation lease of a shard, or None"""
+        generations = [int(path.suffix[1:]) for path in self.leases_dir.glob(f"{shard}.*")
+                       if path.suffix[1:].isdigit()]
+        while generations:
+            generation = max(generations)
+            data = _read_json(self.leases_dir / f"{shard}.{generation}")
+            if data:
+                return Lease(shard, generation, data["worker"], data["expires_at"])
+            generations.remove(generation)  # released, or its owner is still writing it
+        return None
+
+    def claim(self, shard, worker, ttl=DEFAULT_TTL):
+        """
+        Lease a shard that is not done and not held by a live lease; returns
+        the Lease or None. An expired lease is taken over by creating the
+        next generation, which only one worker can do.
+        """
+        if self.is_done(shard):
+            return None
+        current = self.current_lease(shard)
+        if current and current.expires_at > self.clock():
+            return None
+        generation = current.generation + 1 if current else 0
+        path = self.leases_dir / f"{shard}.{generation}"
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return None  # another worker won this generation
+        lease = Lease(shard, generation, worker, self.clock() + ttl)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"worker": worker, "expires_at": lease.expires_at, "claimed_at": self.clock()}, f)
+        if current:
+            (self.leases_dir / f"{shard}.{current.generation}").unlink(missing_ok=True)
+        if self.is_done(shard):
+            # Finished (then released) by its owner since the check above
+            self.release(lease)
+            return None
+        return lease
+
+    def renew(self, lease, ttl=DEFAULT_TTL):
+        """Extend a lease; False when it has been taken over (the worker must stop)"""
+        current = self.current_lease(lease.shard)
+        if not current or current.generation != lease.generation:
+            return False
+        lease.expires_at = self.clock() + ttl
+        _write_json(self.leases_dir / f"{lease.shard}.{lease.generation}",
+                    {"worker": lease.worker, "expires_at": lease.expires_at, "renewed_at": self.clock()})
+        return True
+
+    def release(self, lease):
+        (self.leases_dir / f"{lease.shard}.{lease.generation}").unlink(missing_ok=True)
+
+    def is_done(self, shard):
+        return (self.done_dir / f"{shard}.json").exists()
+
+    def finish(self, shard, summary):
+        _write_json(self.done_dir / f"{shard}.json", summary)
+
+    def completed(self, job_id):
+        data = _read_json(self.results_dir / f"{job_id}.json")
+        return bool(data and not data.get("error"))
+
+    def store_result(self, job_id, result, worker):
+        """Copy a TryOnResult's files into the shared store and record its outcome"""
+        outcome = {"id": job_id, "job": result.job, "worker": worker, "timings": result.timings,
+                   "degraded": result.degraded, "error": result.error, "finished_at": self.clock()}
+        if result.ok:
+            image = self.results_dir / f"{job_id}{Path(result.path).suffix}"
+            shutil.copy(result.path, image)
+            outcome["path"] = image.name
+            if result.mask_path:
+                mask = self.results_dir / f"{job_id}_mask{Path(result.mask_path).suffix}"
+                shutil.copy(result.mask_path, mask)
+                outcome["mask_path"] = mask.name
+        # The JSON is written last: its presence means the files are complete
+        _write_json(self.results_dir / f"{job_id}.json", outcome)
+        return outcome
+
+    def reopen_failed(self):
+        """Mark shards with failed jobs as not done, so workers retry those jobs; returns the shards"""
+        reopened = []
+        for path in self.done_dir.glob("*.json"):
+            summary = _read_json(path)
+            if summary and summary.get("failed"):
+                path.unlink(missing_ok=True)
+                reopened.append(path.stem)
+        return sorted(reopened)
+
+    def status(self):
+        """Shard counts by state, plus the jobs finished and failed so far"""
+        counts = {"done": 0, "leased": 0, "expired": 0, "pending": 0}
+        now = self.clock()
+        for shard in self.shards():
+            if self.is_done(shard):
+                counts["done"] += 1
+                continue
+            lease = self.current_lease(shard)
+            if not lease:
+                counts["pending"] += 1
+            else:
+                counts["leased" if lease.expires_at > now else "expired"] += 1
+        outcomes = [_read_json(path) for path in self.results_dir.glob("*.json")]
+        manifest = _read_json(self.run_dir / "manifest.json") or {}
+        return {**counts, "jobs": manifest.get("jobs", 0),
+                "finished": sum(1 for o in outcomes if o and not o.get("error")),
+                "failed": sum(1 for o in outcomes if o and o.get("error"))}
+
+
+class _Heartbeat(threading.Thread):
+    """Renews a lease every ttl/3 until stopped; sets `lost` if it was taken over"""
+
+    def __init__(self, store, lease, ttl):
+        super().__init__(daemon=True)
+        self.store = store
+        self.lease = lease
+        self.ttl = ttl
+        self.lost = threading.Event()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.ttl / 3):
+            if not self.store.renew(self.lease, self.ttl):
+                self.lost.set()
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+def run_shard(store, lease, worker, ttl=DEFAULT_TTL, max_concurrency=2, mask_cache=None, crop_region=False):
+    """Run the unfinished jobs of a leased shard; returns (ok, failed) or None if the lease was lost"""
+    todo = [job for job in store.jobs(lease.shard) if not store.completed(job["id"])]
+    ok = failed = 0
+    heartbeat = _Heartbeat(store, lease, ttl)
+    heartbeat.start()
+    results = stream_results(todo, max_concurrency=max_concurrency, mask_cache=mask_cache, crop_region=crop_region)
+    try:
+        for result in results:
+            job_id = todo[result.index]["id"]
+            store.store_result(job_id, result, worker)
+            if result.ok:
+                ok += 1
+            else:
+                failed += 1
+                print(f"❌ {job_id}: {result.error}")
+            if heartbeat.lost.is_set():
+                print(f"⚠️  Lost the lease on shard {lease.shard}; another worker took it over")
+                return None
+    finally:
+        results.close()
+        heartbeat.stop()
+    return ok, failed
+
+
+def work(run_dir, worker=None, ttl=DEFAULT_TTL, max_concurrency=2, poll=DEFAULT_POLL, wait_for_others=True,
+         mask_cache=None, crop_region=False, clock=time.time):
+    """
+    Claim and run shards until every shard is done. While the remaining
+    shards are leased by live workers, poll (or return with
+    wait_for_others=False) to pick up any whose lease expires.
+    Returns the number of shards this worker finished.
+    """
+    store = ShardStore(run_dir, clock=clock)
+    worker = worker or default_worker_id()
+    shards = store.shards()
+    # Different start points so workers do not all race for the same shard
+    random.Random(worker).shuffle(shards)
+    finished = 0
+    while True:
+        claimed = False
+        for shard in shards:
+            lease = store.claim(shard, worker, ttl)
+            if not lease:
+                continue
+            claimed = True
+            print(f"📦 {worker}: shard {shard} (lease generation {lease.generation})")
+            outcome = run_shard(store, lease, worker, ttl, max_concurrency, mask_cache, crop_region)
+            if outcome is None:
+                continue
+            ok, failed = outcome
+            store.finish(shard, {"worker": worker, "ok": ok, "failed": failed, "finished_at": clock()})
+            store.release(lease)
+            finished += 1
+            print(f"✅ Shard {shard} done ({ok} ok, {failed} failed)")
+
+        remaining = [shard for shard in shards if not store.is_done(shard)]
+        if not remaining:
+            return finished
+        if not claimed:
+            if not wait_for_others:
+                return finished
+            time.sleep(poll)
+
+
+def load_manifest(path):
+    """Jobs from a JSONL file (one streaming.py job dict per line)"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def catalog_jobs(outfits=False):
+    """Every person x garment (and pants + shirt outfit) in ./examples as jobs with absolute paths"""
+    from matrix_runner import build_jobs
+    from two_step_pipeline import list_available_items
+
+    persons, shirts, pants = (sorted(item.resolve() for item in items) for items in list_available_items())
+    _, _, cells = build_jobs(persons, shirts, pants, outfits=outfits)
+    for cell in cells:
+        if cell["base"] != cell["garment"]:
+            yield {"person": str(cell["person"]), "pants": str(cell["base"]), "upper": str(cell["garment"]),
+                   "description": cell["description"]}
+        else:
+            yield {"person": str(cell["person"]), "garment": str(cell["garment"]),
+                   "description": cell["description"], "type": cell["garment_type"]}
+
+
+def print_status(run_dir):
+    status = ShardStore(run_dir).status()
+    print(f"📊 {run_dir}: {status['done']} done, {status['leased']} leased, {status['expired']} expired, "
+          f"{status['pending']} pending shard(s)")
+    print(f"   {status['finished']}/{status['jobs']} job(s) finished, {status['failed']} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a large batch across hosts sharing a filesystem")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="shard a job manifest into a run directory")
+    plan.add_argument("run_dir")
+    source = plan.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="JSONL file with one job per line")
+    source.add_argument("--catalog", action="store_true", help="every person x garment in ./examples")
+    plan.add_argument("--outfits", action="store_true", help="with --catalog: also pants + shirt outfits")
+    plan.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+
+    worker = commands.add_parser("work", help="claim and run shards until the run is complete")
+    worker.add_argument("run_dir")
+    worker.add_argument("--worker-id", help="default: <hostname>-<pid>")
+    worker.add_argument("--concurrency", type=int, help="jobs in flight (default 2, or VTON_AIMD_MAX with VTON_AIMD)")
+    worker.add_argument("--ttl", type=float, default=DEFAULT_TTL, help="lease lifetime in seconds")
+    worker.add_argument("--poll", type=float, default=DEFAULT_POLL, help="seconds between looks for expired leases")
+    worker.add_argument("--no-wait", action="store_true", help="exit when no shard is claimable")
+    worker.add_argument("--crop-region", action="store_true")
+
+    status = commands.add_parser("status", help="progress of a run")
+    status.add_argument("run_dir")
+    retry = commands.add_parser("retry", help="reopen shards with failed jobs for the workers")
+    retry.add_argument("run_dir")
+    args = parser.parse_args()
+
+    if args.command == "plan":
+        jobs = load_manifest(args.manifest) if args.manifest else catalog_jobs(args.outfits)
+        shards = ShardStore(args.run_dir).plan(jobs, args.shard_size)
+        print(f"🗂️  Planned {shards} shard(s) in {args.run_dir}")
+    elif args.command == "work":
+        from mask_cache import MaskCache
+        set_default_priority("bulk")
+        controller = get_concurrency()
+        concurrency = args.concurrency or (controller.max_limit if controller else 2)
+        with profiled("shard_runner"):
+            finished = work(args.run_dir, args.worker_id, args.ttl, concurrency, args.poll,
+                            wait_for_others=not args.no_wait, mask_cache=MaskCache.from_env(),
+                            crop_region=args.crop_region)
+        print(f"🏁 Finished {finished} shard(s)")
+        if controller:
+            controller.print_report()
+        if get_priority_gates():
+            get_priority_gates().print_report()
+        if get_downloads():
+            get_downloads().print_report()
+        print_status(args.run_dir)
+    elif args.command == "retry":
+        reopened = ShardStore(args.run_dir).reopen_failed()
+        print(f"🔁 Reopened {len(reopened)} shard(s) with failed jobs")
+    else:
+        print_status(args.run_dir)
+
+
+if __name__ == "__main__":
+    main()
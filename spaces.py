@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Space Connections
+Single place where the pipelines open gradio_client connections. The token
+for each connection comes from the multi-token scheduler when
+HUGGINGFACE_TOKENS is configured, otherwise from HUGGINGFACE_TOKEN. With a
+cassette active (see cassette.py) calls are recorded or replayed from disk,
+and with an upload cache (see uploads.py) each file is uploaded only once.
+Every call outcome feeds the per-Space circuit breakers (see health.py),
+and with VTON_AIMD each call first takes a slot from the Space's adaptive
+concurrency limit (see concurrency.py). With VTON_PRIORITY calls queue for
+those slots by priority class (see priority.py).
+Each stage can be served by another backend instead of its Space (a local
+model server or the CPU stub, see backends.py). Outputs are downloaded into
+the managed download directory, one directory per call (see downloads.py).
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from gradio_client import Client
+
+from backends import backend_spec, make_backend
+from cassette import CassetteClient, active_cassette, replaying
+from concurrency import ConcurrencyController
+from downloads import get_downloads
+from health import HealthMonitor, probe_space
+from priority import PriorityGates, current_priority
+from token_scheduler import TokenScheduler
+from uploads import UploadCache, lost_upload
+
+VIRTUAL_TRYON_SPACE = "blackmamba2408/virtual-try-on"
+IDM_VTON_SPACE = "blackmamba2408/IDM-VTON"
+STAGES = {VIRTUAL_TRYON_SPACE: "step1", IDM_VTON_SPACE: "step2"}
+
+_scheduler = None
+_scheduler_loaded = False
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide token scheduler, built from the environment on first use"""
+    global _scheduler, _scheduler_loaded
+    with _scheduler_lock:
+        if not _scheduler_loaded:
+            _scheduler = TokenScheduler.from_env()
+            _scheduler_loaded = True
+        return _scheduler
+
+
+def set_scheduler(scheduler):
+    """Install a scheduler explicitly (or None to use the single token)"""
+    global _scheduler, _scheduler_loaded
+    with _scheduler_lock:
+        _scheduler, _scheduler_loaded = scheduler, True
+
+
+_backend_specs = {}
+
+
+def backend_name(space):
+    """Backend serving `space`: 'gradio', 'stub' or a model server URL (VTON_STEP1_BACKEND / VTON_STEP2_BACKEND)"""
+    if space in _backend_specs:
+        return _backend_specs[space]
+    return backend_spec(STAGES[space]) if space in STAGES else "gradio"
+
+
+def set_backend(space, spec):
+    """Serve `space` (or stage "step1" / "step2") from another backend; None returns to the environment"""
+    space = {stage: name for name, stage in STAGES.items()}.get(space, space)
+    if spec is None:
+        _backend_specs.pop(space, None)
+    else:
+        _backend_specs[space] = spec
+
+
+def _slos():
+    """Latency SLO per Space (VTON_STEP1_SLO / VTON_STEP2_SLO)"""
+    return {
+        VIRTUAL_TRYON_SPACE: float(os.getenv("VTON_STEP1_SLO", 60)),
+        IDM_VTON_SPACE: float(os.getenv("VTON_STEP2_SLO", 90)),
+    }
+
+
+_monitor = None
+_monitor_loaded = False
+_monitor_lock = threading.Lock()
+
+
+def _probe(space):
+    if replaying():
+        return True, "replay"
+    if backend_name(space) != "gradio":
+        return True, backend_name(space)
+    return probe_space(space, default_token())
+
+
+def get_health_monitor():
+    """Process-wide circuit breakers (SLOs from VTON_STEP1_SLO / VTON_STEP2_SLO), None if VTON_HEALTH=off"""
+    global _monitor, _monitor_loaded
+    with _monitor_lock:
+        if not _monitor_loaded:
+            _monitor = HealthMonitor.from_env(_slos(), probe=_probe)
+            _monitor_loaded = True
+        return _monitor
+
+
+def set_health_monitor(monitor):
+    """Install a health monitor explicitly (or None to never trip circuits)"""
+    global _monitor, _monitor_loaded
+    with _monitor_lock:
+        _monitor, _monitor_loaded = monitor, True
+
+
+_concurrency = None
+_concurrency_loaded = False
+_concurrency_lock = threading.Lock()
+
+
+def get_concurrency():
+    """Process-wide adaptive concurrency limits (VTON_AIMD), None when calls are not limited"""
+    global _concurrency, _concurrency_loaded
+    with _concurrency_lock:
+        if not _concurrency_loaded:
+            _concurrency = ConcurrencyController.from_env(_slos())
+            _concurrency_loaded = True
+        return _concurrency
+
+
+def set_concurrency(controller):
+    """Install a concurrency controller explicitly (or None for no limit)"""
+    global _concurrency, _concurrency_loaded
+    with _concurrency_lock:
+        _concurrency, _concurrency_loaded = controller, True
+
+
+_priority_gates = None
+_priority_gates_loaded = False
+_priority_gates_lock = threading.Lock()
+
+
+def _adaptive_limit(space):
+    return get_concurrency().limit(space) if get_concurrency() else None
+
+
+def get_priority_gates():
+    """Process-wide priority queues in front of each Space (VTON_PRIORITY), None when calls are not queued"""
+    global _priority_gates, _priority_gates_loaded
+    with _priority_gates_lock:
+        if not _priority_gates_loaded:
+            _priority_gates = PriorityGates.from_env(capacity=_adaptive_limit)
+            _priority_gates_loaded = True
+        return _priority_gates
+
+
+def set_priority_gates(gates):
+    """Install priority gates explicitly (or None for first come, first served)"""
+    global _priority_gates, _priority_gates_loaded
+    with _priority_gates_lock:
+        _priority_gates, _priority_gates_loaded = gates, True
+
+
+_upload_cache = None
+_upload_cache_loaded = False
+_upload_cache_lock = threading.Lock()
+
+
+def get_upload_cache():
+    """Process-wide upload cache (VTON_UPLOAD_ONCE), None when uploads are not cached"""
+    global _upload_cache, _upload_cache_loaded
+    with _upload_cache_lock:
+        if not _upload_cache_loaded:
+            _upload_cache = UploadCache.from_env()
+            _upload_cache_loaded = True
+        return _upload_cache
+
+
+def set_upload_cache(cache):
+    """Install an upload cache explicitly (or None to upload on every call)"""
+    global _upload_cache, _upload_cache_loaded
+    with _upload_cache_lock:
+        _upload_cache, _upload_cache_loaded = cache, True
+
+
+_uploaders = {}
+_uploaders_lock = threading.Lock()
+
+
+def _uploader(space):
+    """Plain Client used only for background uploads (no scheduler token is spent)"""
+    with _uploaders_lock:
+        if space not in _uploaders:
+            _uploaders[space] = Client(space, hf_token=default_token())
+        return _uploaders[space]
+
+
+def job_uploads(job):
+    """Input files each Space needs for a job dict (example/streaming format)"""
+    if job.get("pants") and job.get("upper"):
+        return {VIRTUAL_TRYON_SPACE: [job["person"], job["pants"]], IDM_VTON_SPACE: [job["upper"]]}
+    uploads = {VIRTUAL_TRYON_SPACE: [job.get("person"), job.get("garment")], IDM_VTON_SPACE: [job.get("garment")]}
+    if job.get("plan") == "direct":
+        uploads = {IDM_VTON_SPACE: [job.get("person"), job.get("garment")]}
+    return uploads
+
+
+def prefetch_uploads(job):
+    """
+    Start uploading a job's inputs to every Space it will call, in parallel
+    and in the background, so the uploads overlap with whatever is running
+    now. Needs the upload cache (VTON_UPLOAD_ONCE); a no-op otherwise.
+    Returns the upload Futures.
+    """
+    cache = get_upload_cache()
+    if not cache or replaying():
+        return []
+    futures = []
+    for space, paths in job_uploads(job).items():
+        if backend_name(space) != "gradio":
+            continue
+        futures += cache.prefetch(space, paths, lambda space=space: _uploader(space))
+    return futures
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def in_flight(space):
+    """Calls this process currently has running or waiting for a concurrency slot on `space` (local queue depth)"""
+    waiting = get_concurrency().limiter(space).waiting if get_concurrency() else 0
+    if get_priority_gates():
+        waiting += get_priority_gates().gate(space).waiting
+    with _in_flight_lock:
+        return _in_flight.get(space, 0) + waiting
+
+
+@contextmanager
+def _observed(space, on_done=None):
+    """
+    Wait for the call's turn in its priority class and for a slot under the
+    Space's adaptive concurrency limit, count the call in the local queue
+    depth and report its outcome to the health monitor and the limiter
+    """
+    gate = get_priority_gates().gate(space) if get_priority_gates() else None
+    priority_class = current_priority()
+    if gate:
+        gate.acquire(priority_class)
+    limiter = get_concurrency().limiter(space) if get_concurrency() else None
+    if limiter:
+        limiter.acquire()
+    start_time = time.time()
+    error = None
+    with _in_flight_lock:
+        _in_flight[space] = _in_flight.get(space, 0) + 1
+    try:
+        yield
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight[space] -= 1
+        if on_done:
+            on_done(time.time() - start_time, error)
+        if limiter:
+            limiter.release(time.time() - start_time, error)
+        if get_health_monitor():
+            get_health_monitor().record(space, time.time() - start_time, error)
+        if gate:
+            gate.release(priority_class)
+
+
+def default_token():
+    """HUGGINGFACE_TOKEN, or the first of HUGGINGFACE_TOKENS"""
+    token = os.getenv("HUGGINGFACE_TOKEN")
+    if token:
+        return token
+    tokens = [t.strip() for t in os.getenv("HUGGINGFACE_TOKENS", "").split(",") if t.strip()]
+    return tokens[0] if tokens else None
+
+
+class SpaceClient:
+    """
+    gradio_client.Client wrapper that settles each predict with the token
+    scheduler and sends already-uploaded files by reference
+    """
+
+    backend = "gradio"
+
+    def __init__(self, space, token, scheduler=None, upload_cache=None, downloads=None):
+        self.space = space
+        self.token = token
+        self.scheduler = scheduler
+        self.upload_cache = upload_cache
+        self.downloads = downloads
+        self.download_dir = downloads.call_dir(STAGES.get(space, "space")) if downloads else None
+        if self.download_dir:
+            self.client = Client(space, hf_token=token, download_files=self.download_dir)
+        else:
+            self.client = Client(space, hf_token=token)
+
+    def _predict(self, kwargs):
+        if not self.upload_cache:
+            return self.client.predict(**kwargs)
+        resolved, keys = self.upload_cache.resolve(self.client, self.space, kwargs)
+        try:
+            return self.client.predict(**resolved)
+        except Exception as e:
+            # Anything but a lost upload (OOM, timeout, app error) would only fail again at twice the cost
+            if not keys or not lost_upload(e):
+                raise
+            # The Space dropped the uploaded copies; upload again once
+            self.upload_cache.invalidate(keys)
+            resolved, keys = self.upload_cache.resolve(self.client, self.space, kwargs)
+            return self.client.predict(**resolved)
+
+    def predict(self, **kwargs):
+        def settle(seconds, error):
+            if self.scheduler:
+                self.scheduler.release(self.token, self.space, seconds, error)
+
+        with _observed(self.space, settle):
+            try:
+                return self._predict(kwargs)
+            except Exception:
+                # Partial downloads of a failed call
+                if self.downloads:
+                    self.downloads.discard(self.download_dir)
+                raise
+
+
+class BackendClient:
+    """Stands in for a SpaceClient when the stage is served by another backend (see backends.py)"""
+
+    def __init__(self, space, backend):
+        self.space = space
+        self.backend = backend.backend
+        self.inner = backend
+
+    def predict(self, **kwargs):
+        with _observed(self.space):
+            return self.inner.predict(**kwargs)
+
+
+def requires_token():
+    """False when every call is replayed from a cassette or no stage is served by a Space"""
+    return not replaying() and any(backend_name(space) == "gradio" for space in STAGES)
+
+
+def connect(space):
+    """Connect to a Space with the token that has the most budget left, or to the stage's configured backend"""
+    cassette = active_cassette()
+    if cassette and cassette["mode"] == "replay":
+        return CassetteClient(space, cassette["cassette"], "replay",
+                              timing=cassette["timing"], speed=cassette["speed"])
+
+    backend = make_backend(backend_name(space), space)
+    if backend:
+        client = BackendClient(space, backend)
+    else:
+        scheduler = get_scheduler()
+        token = scheduler.acquire(space) if scheduler else default_token()
+        try:
+            client = SpaceClient(space, token, scheduler, get_upload_cache(), get_downloads())
+        except Exception as e:
+            # Settle the estimate charged by acquire(); no call was made
+            if scheduler:
+                scheduler.release(token, space, 0.0, e)
+            if get_health_monitor():
+                get_health_monitor().record(space, 0.0, e)
+            raise
+    if cassette:
+        return CassetteClient(space, cassette["cassette"], "record", inner=client)
+    return client
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Streaming Try-On API
+Feed an iterable of jobs, get results back in completion order - like
+concurrent.futures.as_completed, but for whole try-ons. Jobs are read
+lazily and only a small window is in flight, so a long (or endless) job
+source never piles up in memory and the first result is usable as soon as
+it finishes.
+
+Jobs use the same dicts as the example tables:
+    {"person": ..., "garment": ..., "description": ..., "type": "upper_body"}   # two-step
+    {"person": ..., "pants": ..., "upper": ..., "description": ...}            # layered outfit
+
+Usage:
+    from streaming import stream_results
+    for result in stream_results(jobs, max_concurrency=2):
+        if result.ok:
+            index_image(result.read())
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from layered_pipeline import apply_complete_outfit
+from priority import inherit
+from quality import step2_needed
+from spaces import prefetch_uploads
+from two_step_pipeline import step1_as_final, step1_or_degrade, step2_idm_vton
+from validation import validate_or_reject
+
+DEFAULT_CONCURRENCY = 2
+
+
+class TryOnResult:
+    """
+    One finished job. `path`/`mask_path` point at the saved outputs and
+    `read()` loads the image bytes on demand; with load_bytes=True they are
+    already in `image_bytes`/`mask_bytes`. `timings` holds seconds spent
+    queued, in each step and in total. `degraded` is the reason when Step 1
+    was skipped and IDM-VTON ran directly on the person. `step2_skipped` is
+    set when the Step 1 result scored well enough to be kept as is
+    (`quality` holds its scores, see quality.py).
+    """
+
+    def __init__(self, index, job):
+        self.index = index
+        self.job = job
+        self.path = None
+        self.mask_path = None
+        self.intermediate_path = None
+        self.image_bytes = None
+        self.mask_bytes = None
+        self.timings = {}
+        self.degraded = None
+        self.quality = None
+        self.step2_skipped = False
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.path is not None
+
+    def read(self):
+        """Result image bytes"""
+        if self.image_bytes is not None:
+            return self.image_bytes
+        return Path(self.path).read_bytes()
+
+    def read_mask(self):
+        if self.mask_bytes is not None:
+            return self.mask_bytes
+        return Path(self.mask_path).read_bytes() if self.mask_path else None
+
+    def __repr__(self):
+        status = ("degraded" if self.degraded else "ok") if self.ok else f"error={self.error!r}"
+        return f"<TryOnResult #{self.index} {status} {self.path}>"
+
+
+def _run_job(result, mask_cache, crop_region, load_bytes, submitted_at):
+    """Run one job in a worker thread, filling in `result`"""
+    job = result.job
+    started = time.perf_counter()
+    result.timings["queued"] = round(started - submitted_at, 4)
+    tag = f"job{result.index}"
+    try:
+        if "pants" in job and "upper" in job:
+            outputs = apply_complete_outfit(job["person"], job["pants"], job["upper"], job["description"],
+                                            mask_cache=mask_cache, crop_region=crop_region, output_tag=tag)
+            result.path, result.intermediate_path, result.mask_path = outputs
+        else:
+            job = validate_or_reject(job)
+            result.timings["validate"] = round(time.perf_counter() - started, 4)
+            garment_type = job.get("type", "upper_body")
+            step1_result, result.degraded = step1_or_degrade(job["person"], job["garment"], garment_type,
+                                                             output_tag=tag)
+            result.timings["step1"] = round(time.perf_counter() - started, 4)
+            if not step1_result:
+                raise RuntimeError("Step 1 failed")
+            if not result.degraded:
+                result.intermediate_path = step1_result
+                needed, result.quality = step2_needed(step1_result, job["garment"], job["person"], garment_type)
+                result.step2_skipped = not needed
+            step2_started = time.perf_counter()
+            if result.step2_skipped:
+                result.path = step1_as_final(step1_result, output_tag=tag)
+            else:
+                result.path, result.mask_path = step2_idm_vton(
+                    step1_result, job["garment"], job["description"],
+                    person_path=job["person"], garment_type=garment_type,
+                    mask_cache=mask_cache, crop_region=crop_region, output_tag=tag, degraded=result.degraded
+                )
+            result.timings["step2"] = round(time.perf_counter() - step2_started, 4)
+        if not result.path:
+            raise RuntimeError("no result image")
+        if load_bytes:
+            result.image_bytes = result.read()
+            result.mask_bytes = result.read_mask()
+    except KeyError as e:
+        result.error = f"job is missing {e}"
+    except Exception as e:
+        result.error = str(e) or type(e).__name__
+    result.timings["total"] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def stream_results(jobs, max_concurrency=DEFAULT_CONCURRENCY, mask_cache=None, crop_region=False,
+                   load_bytes=False, window=None, priority_class=None):
+    """
+    Yield a TryOnResult per job in completion order (failed jobs included,
+    with `error` set).
+
+    At most `max_concurrency` jobs run at once and at most `window` (default
+    twice the concurrency) are taken from `jobs` ahead of the consumer, so
+    memory stays bounded however many jobs there are. Closing the generator
+    early cancels jobs that have not started. Inputs of jobs in the window
+    are uploaded ahead of time when the upload cache is on. Jobs run in
+    `priority_class` (default: the caller's class, see priority.py).
+    """
+    window = window or max_concurrency * 2
+    run_job = inherit(_run_job, priority_class)
+    jobs = iter(enumerate(jobs))
+    pool = ThreadPoolExecutor(max_workers=max_concurrency)
+    pending = set()
+
+    def fill():
+        while len(pending) < window:
+            try:
+                index, job = next(jobs)
+            except StopIteration:
+                return
+            if isinstance(job, dict):
+                prefetch_uploads(job)
+            pending.add(pool.submit(run_job, TryOnResult(index, job), mask_cache, crop_region,
+                                    load_bytes, time.perf_counter()))
+
+    try:
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                yield future.result()
+            fill()
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the inference backends - runs the pipeline on the CPU stub and over the reference HTTP server
+"""
+
+import io
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import pytest
+from gradio_client import handle_file
+from PIL import Image
+
+import downloads
+import run_ledger
+import spaces
+from backends import HTTPBackend, serve
+from downloads import DownloadDir
+from mask_cache import binary_mask_from_output
+from run_ledger import RunLedger
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+PANTS = str(EXAMPLES / "garment_images" / "pants" / "pants.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+
+
+class NoClient:
+    def __init__(self, *args, **kwargs):
+        raise AssertionError("no Space should be contacted")
+
+
+@pytest.fixture
+def stub_backends(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "Client", NoClient)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    run_ledger.set_ledger(ledger)
+    yield ledger
+    run_ledger.set_ledger(None)
+
+
+def test_pipeline_runs_on_stub_backend(stub_backends):
+    from two_step_pipeline import run_two_step_pipeline
+    assert not spaces.requires_token()
+
+    result, mask = run_two_step_pipeline(PERSON, PANTS, "pants", garment_type="lower_body")
+    with Image.open(result) as image, Image.open(PERSON) as person:
+        assert image.size == person.size
+    assert binary_mask_from_output(mask).getbbox()
+    assert [(row["stage"], row["params"]["backend"]) for row in stub_backends.rows()] == [
+        ("step1", "stub"), ("step2", "stub")]
+
+
+def test_http_backend_against_reference_server(stub_backends):
+    server = serve(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        backend = HTTPBackend(spaces.IDM_VTON_SPACE, f"http://127.0.0.1:{server.server_port}")
+        result, mask = backend.predict(
+            dict={"background": handle_file(PERSON), "layers": [], "composite": None},
+            garm_img=handle_file(PANTS), garment_des="pants", is_checked=True, is_checked_crop=False,
+            denoise_steps=30, seed=42, api_name="/tryon",
+        )
+        assert Path(result).exists() and binary_mask_from_output(mask).getbbox()
+
+        spaces.set_backend("step1", f"http://127.0.0.1:{server.server_port}")
+        client = spaces.connect(spaces.VIRTUAL_TRYON_SPACE)
+        assert client.backend == "http"
+        assert Path(client.predict(person_path=handle_file(PERSON), garment_path=handle_file(PANTS),
+                                   garment_type="lower_body", api_name="/virtual_tryon")).exists()
+        with pytest.raises(Exception):
+            client.predict(api_name="/unknown")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_in_memory_results_touch_no_result_files(stub_backends, tmp_path):
+    from layered_pipeline import apply_complete_outfit
+    from two_step_pipeline import run_two_step_pipeline
+    store = DownloadDir(tmp_path / "downloads")
+    downloads.set_downloads(store)
+    try:
+        result, mask = run_two_step_pipeline(PERSON, PANTS, "pants", garment_type="lower_body", returns="bytes",
+                                             crop_region=True)
+        outfit, pants, outfit_mask = apply_complete_outfit(PERSON, PANTS, SHIRT, "outfit", returns="array")
+    finally:
+        downloads.set_downloads(None)
+    with Image.open(io.BytesIO(result)) as image, Image.open(PERSON) as person:
+        assert image.format == "PNG" and image.size == person.size
+        assert outfit.shape == pants.shape == (person.height, person.width, 3) and outfit.dtype == np.uint8
+    with Image.open(io.BytesIO(mask)) as mask_image:
+        assert mask_image.format == "PNG" and mask_image.size == image.size and outfit_mask.any()
+    assert list((tmp_path / "examples" / "results").iterdir()) == []
+    assert [p for p in store.session.rglob("*") if p.is_file()] == []
+    assert store.moved == 0
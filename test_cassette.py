@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test script for record/replay cassettes - runs the real pipeline code offline
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import cassette
+import run_ledger
+import spaces
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+PANTS = str(EXAMPLES / "garment_images" / "pants" / "pants.jpg")
+
+
+class RecordingClient:
+    """Stands in for gradio_client.Client while a cassette is recorded"""
+
+    calls = 0
+
+    def __init__(self, space, hf_token=None, **kwargs):
+        self.space = space
+
+    def predict(self, **kwargs):
+        RecordingClient.calls += 1
+        out_dir = tempfile.mkdtemp()
+        color = (RecordingClient.calls * 40 % 256, 90, 160)
+        image_path = os.path.join(out_dir, "image.webp")
+        Image.new("RGB", (96, 128), color).save(image_path)
+        if kwargs["api_name"] == "/virtual_tryon":
+            return image_path
+        mask = np.zeros((128, 96, 3), dtype=np.uint8)
+        mask[30:90, 20:70] = 128
+        mask_path = os.path.join(out_dir, "mask.png")
+        Image.fromarray(mask).save(mask_path)
+        return (image_path, mask_path)
+
+
+class OfflineClient:
+    def __init__(self, *args, **kwargs):
+        raise AssertionError("replay must not connect to a Space")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run inside a scratch dir with its own ./examples/results and no ledger"""
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    run_ledger.set_ledger(None)
+    yield tmp_path
+    cassette.use_cassette(None)
+    run_ledger.set_ledger(None)
+
+
+def test_cassette_round_trip(tmp_path, monkeypatch):
+    """Tuple results and files survive a record/replay round trip"""
+    tape = cassette.Cassette(tmp_path / "tape")
+    src = tmp_path / "person.png"
+    Image.new("RGB", (8, 8)).save(src)
+    out = tmp_path / "out.png"
+    Image.new("RGB", (8, 8), (1, 2, 3)).save(out)
+
+    fingerprint = cassette.request_fingerprint("s", {"img": {"path": str(src), "meta": {"_type": "gradio.FileData"}},
+                                                     "seed": 42, "api_name": "/tryon"})
+    tape.record(fingerprint, (str(out), str(out)), 1.5)
+    result, duration = tape.replay(fingerprint)
+    assert isinstance(result, tuple) and duration == 1.5
+    assert Path(result[0]).read_bytes() == out.read_bytes()
+    assert Path(result[0]) != out
+
+    with pytest.raises(cassette.CassetteMiss):
+        tape.replay({**fingerprint, "space": "other"})
+
+    # Timed replay at VTON_CASSETTE_SPEED=3 sleeps a third of the recorded duration
+    slept = []
+    monkeypatch.setattr(cassette.time, "sleep", slept.append)
+    client = cassette.CassetteClient("s", tape, "replay", timing=True, speed=3)
+    client.predict(img={"path": str(src), "meta": {"_type": "gradio.FileData"}}, seed=42, api_name="/tryon")
+    assert slept == [pytest.approx(0.5)]
+
+
+def test_fingerprint_ignores_file_names(tmp_path):
+    """Same content under a different (timestamped) name gives the same key"""
+    a, b = tmp_path / "step1_result_1.png", tmp_path / "step1_result_2.png"
+    Image.new("RGB", (8, 8)).save(a)
+    Image.new("RGB", (8, 8)).save(b)
+    key_a = cassette.request_key(cassette.request_fingerprint("s", {"f": {"path": str(a), "meta": {"_type": "gradio.FileData"}}}))
+    key_b = cassette.request_key(cassette.request_fingerprint("s", {"f": {"path": str(b), "meta": {"_type": "gradio.FileData"}}}))
+    assert key_a == key_b
+
+
+def test_pipelines_replay_offline(workdir, monkeypatch):
+    """Record the two-step and layered flows once, then replay them without a Space"""
+    tape = workdir / "tape"
+
+    monkeypatch.setattr(spaces, "Client", RecordingClient)
+    monkeypatch.setenv("HUGGINGFACE_TOKEN", "hf_recording_only")
+    cassette.use_cassette(tape, "record")
+    import two_step_pipeline
+    import layered_pipeline
+    recorded = [Path(p).read_bytes() for p in two_step_pipeline.run_two_step_pipeline(PERSON, SHIRT, "Test shirt", "upper_body")]
+    recorded += [Path(p).read_bytes() for p in layered_pipeline.apply_complete_outfit(PERSON, PANTS, SHIRT, "Test outfit")]
+    assert len(list((tape / "interactions").iterdir())) == 4
+    for result in (workdir / "examples" / "results").iterdir():
+        result.unlink()
+
+    monkeypatch.setattr(spaces, "Client", OfflineClient)
+    cassette.use_cassette(tape, "replay")
+    replayed = [Path(p).read_bytes() for p in two_step_pipeline.run_two_step_pipeline(PERSON, SHIRT, "Test shirt", "upper_body")]
+    replayed += [Path(p).read_bytes() for p in layered_pipeline.apply_complete_outfit(PERSON, PANTS, SHIRT, "Test outfit")]
+    assert replayed == recorded
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script for crop-to-region upload and paste-back compositing
+"""
+
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from compositing import crop_to_region, paste_back, region_box
+
+
+def test_region_box_is_three_by_four():
+    """Boxes follow the garment region and are grown to 3:4 inside the image"""
+    for garment_type in ["upper_body", "lower_body", "dresses"]:
+        left, top, right, bottom = region_box((900, 1200), garment_type)
+        assert 0 <= left < right <= 900 and 0 <= top < bottom <= 1200
+        assert abs((right - left) / (bottom - top) - 3 / 4) < 0.01
+
+    upper = region_box((900, 1200), "upper_body")
+    lower = region_box((900, 1200), "lower_body")
+    assert upper[1] < lower[1] and lower[3] == 1200
+
+
+def test_region_box_uses_mask(tmp_path):
+    """A known mask (even at 768x1024) sets the crop margins"""
+    layer = np.zeros((1024, 768, 4), dtype=np.uint8)
+    layer[300:500, 300:450] = 255
+    Image.fromarray(layer).save(tmp_path / "layer.png")
+
+    left, top, right, bottom = region_box((384, 512), "upper_body", tmp_path / "layer.png", margin=0)
+    # Mask box is (150, 150)-(225, 250) in image coordinates, already 3:4
+    assert (left, top, right, bottom) == (150, 150, 225, 250)
+
+
+def test_paste_back_keeps_untouched_pixels(tmp_path):
+    """Pixels outside the crop box are bit-exact after compositing"""
+    rng = np.random.default_rng(1)
+    original = rng.integers(0, 256, (800, 400, 3), dtype=np.uint8)
+    Image.fromarray(original).save(tmp_path / "person.png")
+
+    crop_path, box, size = crop_to_region(tmp_path / "person.png", "upper_body", output_dir=tmp_path)
+    assert Image.open(crop_path).size == (box[2] - box[0], box[3] - box[1])
+
+    Image.new("RGB", (768, 1024), (255, 0, 0)).save(tmp_path / "result.png")
+    out = paste_back(tmp_path / "person.png", tmp_path / "result.png", box, tmp_path / "out.png")
+
+    pasted = np.asarray(Image.open(out))
+    assert pasted.shape == original.shape
+    assert (pasted[box[3]:] == original[box[3]:]).all()
+    assert (pasted[:box[1]] == original[:box[1]]).all()
+    center = pasted[(box[1] + box[3]) // 2, (box[0] + box[2]) // 2]
+    assert tuple(center) == (255, 0, 0)
+
+
+if __name__ == "__main__":
+    import tempfile
+    test_region_box_is_three_by_four()
+    with tempfile.TemporaryDirectory() as d:
+        test_region_box_uses_mask(Path(d))
+        test_paste_back_keeps_untouched_pixels(Path(d))
+    print("✅ Compositing tests passed!")
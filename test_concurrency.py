@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test script for adaptive concurrency - a fake clock drives the AIMD limiter, the stub backend stands in for the Spaces
+"""
+
+import threading
+import time
+from pathlib import Path
+
+import run_ledger
+import spaces
+from backends import StubBackend
+from concurrency import AIMDLimiter, ConcurrencyController
+from run_ledger import RunLedger
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+PANTS = str(EXAMPLES / "garment_images" / "pants" / "pants.jpg")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def call(limiter, clock, seconds, error=None):
+    limiter.acquire()
+    clock.now += seconds
+    return limiter.release(seconds, error)
+
+
+def saturate(limiter, clock, seconds, calls):
+    """Complete `calls` calls while the limiter stays full"""
+    for _ in range(calls):
+        limiter.in_flight = limiter.current
+        clock.now += seconds
+        limiter.release(seconds)
+    limiter.in_flight = 0
+
+
+def test_grows_additively_and_cuts_once_per_round_trip():
+    clock = FakeClock()
+    limiter = AIMDLimiter("space", initial=2, max_limit=8, slo_seconds=60, clock=clock)
+    # An idle limit does not grow
+    for _ in range(5):
+        call(limiter, clock, 10)
+    assert limiter.current == 2 and limiter.baseline() == 10
+
+    # +1/limit per call: about one step per round of calls at the limit
+    saturate(limiter, clock, 10, 3)
+    assert limiter.current == 3
+    saturate(limiter, clock, 10, 50)
+    assert limiter.current == 8
+
+    # A burst of queued calls ending within one round trip is a single cut
+    limiter.acquire()
+    limiter.acquire()
+    clock.now += 25
+    assert limiter.release(25) == (8, 4)
+    assert limiter.release(25) is None
+    assert limiter.current == 4 and limiter.cuts == 1
+
+    clock.now += 10
+    assert call(limiter, clock, 70) == (4, 2)
+    assert "SLO" in limiter.last_signal
+    clock.now += 10
+    assert call(limiter, clock, 5, error=RuntimeError("CUDA out of memory")) == (2, 1)
+    clock.now += 10
+    assert call(limiter, clock, 5, error=RuntimeError("boom")) is None
+    assert limiter.current == 1
+
+    # Quota errors belong to the token scheduler
+    saturate(limiter, clock, 10, 1)
+    assert limiter.current == 2
+    assert call(limiter, clock, 1, error=RuntimeError("You have exceeded your GPU quota")) is None
+    assert limiter.current == 2 and limiter.cuts == 4
+
+
+def test_baseline_follows_a_lasting_latency_shift():
+    clock = FakeClock()
+    limiter = AIMDLimiter("space", initial=4, max_limit=8, clock=clock)
+    saturate(limiter, clock, 5, 3)
+    assert limiter.baseline() == 5
+
+    # Calls made alone did not queue behind ours: a slower Space is not a reason to cut
+    for _ in range(10):
+        call(limiter, clock, 12)
+    assert limiter.cuts == 0
+
+    # Under load the new latency looks congested until the old samples leave the window
+    saturate(limiter, clock, 12, 50)
+    assert limiter.baseline() == 12 and limiter.cuts > 0
+    cuts = limiter.cuts
+    saturate(limiter, clock, 12, 150)
+    assert limiter.cuts == cuts and limiter.current == 8
+
+
+def test_acquire_blocks_at_the_limit():
+    limiter = AIMDLimiter("space", initial=1)
+    limiter.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    waiter.start()
+    time.sleep(0.1)
+    assert not acquired.is_set() and limiter.waiting == 1
+    limiter.release(1.0)
+    waiter.join(timeout=5)
+    assert acquired.is_set() and limiter.in_flight == 1
+
+
+def test_pipeline_calls_respect_the_limit(tmp_path, monkeypatch):
+    from two_step_pipeline import run_two_step_pipeline
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    controller = ConcurrencyController(initial=1, max_limit=1)
+    spaces.set_concurrency(controller)
+
+    running, peak, lock = {}, {}, threading.Lock()
+    predict = StubBackend.predict
+
+    def counting_predict(self, *args, **kwargs):
+        with lock:
+            running[self.space] = running.get(self.space, 0) + 1
+            peak[self.space] = max(peak.get(self.space, 0), running[self.space])
+        time.sleep(0.05)
+        try:
+            return predict(self, *args, **kwargs)
+        finally:
+            with lock:
+                running[self.space] -= 1
+
+    monkeypatch.setattr(StubBackend, "predict", counting_predict)
+    run_ledger.set_ledger(RunLedger(tmp_path / "ledger.sqlite3"))
+    try:
+        threads = [threading.Thread(target=run_two_step_pipeline, args=(PERSON, PANTS, "pants"),
+                                    kwargs={"garment_type": "lower_body"}) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+    finally:
+        run_ledger.set_ledger(None)
+        spaces.set_concurrency(None)
+    assert peak == {spaces.VIRTUAL_TRYON_SPACE: 1, spaces.IDM_VTON_SPACE: 1}
+    assert {entry["space"] for entry in controller.status()} == set(peak)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Test script for managed downloads - fake Space clients write into the per-call directory like gradio_client does
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import downloads
+import run_ledger
+import spaces
+from downloads import DownloadDir
+from run_ledger import RunLedger
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+
+
+class DownloadingClient:
+    """Saves its outputs under download_files/<hash>/ as gradio_client does; Step 2 fails while `broken` is set"""
+
+    broken = False
+    download_dirs = []
+
+    def __init__(self, space, hf_token=None, download_files="/tmp/gradio", **kwargs):
+        self.download_files = download_files
+        DownloadingClient.download_dirs.append(download_files)
+
+    def predict(self, **kwargs):
+        out_dir = Path(self.download_files) / "0f3a9c"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        image_path = out_dir / "image.png"
+        Image.new("RGB", (96, 128), "green").save(image_path)
+        if kwargs["api_name"] == "/virtual_tryon":
+            return str(image_path)
+        if DownloadingClient.broken:
+            raise RuntimeError("connection reset while downloading")
+        mask_path = out_dir / "mask.png"
+        Image.new("RGB", (96, 128), "gray").save(mask_path)
+        return str(image_path), str(mask_path)
+
+
+def files_under(path):
+    return [p for p in Path(path).rglob("*") if p.is_file()]
+
+
+def test_take_discard_and_cap(tmp_path):
+    clock_now = [1000.0]
+    store = DownloadDir(tmp_path / "downloads", max_bytes=2500, grace=60, clock=lambda: clock_now[0])
+    first = Path(store.call_dir())
+    (first / "abc").mkdir()
+    (first / "abc" / "image.png").write_bytes(b"x" * 1000)
+    (first / "abc" / "mask.png").write_bytes(b"x" * 1000)
+
+    outside = tmp_path / "person.png"
+    outside.write_bytes(b"person")
+    assert store.take(outside, tmp_path / "copy.png") and outside.exists()
+    store.take(first / "abc" / "image.png", tmp_path / "final.png")
+    assert (tmp_path / "final.png").exists() and not (first / "abc" / "image.png").exists()
+    store.discard(first / "abc" / "mask.png", outside)
+    assert not first.exists() and outside.exists()
+
+    # Over the cap only call directories older than the grace period are evicted
+    for _ in range(3):
+        call = Path(store.call_dir())
+        (call / "image.png").write_bytes(b"x" * 1000)
+        os.utime(call, (900, 900))
+    newest = Path(store.call_dir())
+    assert store.evicted == 1 and newest.exists()
+    report = store.report()
+    assert report["moved"] == 1 and report["copied"] == 1 and report["discarded"] == 1 and report["bytes"] == 2000
+
+    store.close()
+    assert not store.session.exists()
+
+
+def test_stale_sessions_are_reaped(tmp_path):
+    root = tmp_path / "downloads"
+    store = DownloadDir(root)
+    dead = root / f"{store.host}_999999999_abcdef"
+    other_host = root / "elsewhere_999999999_abcdef"
+    alive = root / f"{store.host}_{os.getpid()}_abcdef"
+    for path in (dead, other_host, alive):
+        path.mkdir()
+    assert store.reap_stale() == 1
+    assert not dead.exists() and other_host.exists() and alive.exists()
+
+
+@pytest.fixture
+def managed(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "Client", DownloadingClient)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    spaces.set_health_monitor(None)
+    spaces.set_upload_cache(None)
+    store = DownloadDir(tmp_path / "downloads")
+    downloads.set_downloads(store)
+    run_ledger.set_ledger(RunLedger(tmp_path / "ledger.sqlite3"))
+    yield store
+    run_ledger.set_ledger(None)
+    downloads.set_downloads(None)
+    DownloadingClient.broken = False
+    DownloadingClient.download_dirs = []
+
+
+@pytest.mark.parametrize("crop_region", [False, True])
+def test_pipeline_moves_results_and_leaves_nothing(managed, crop_region):
+    from two_step_pipeline import step1_virtual_tryon, step2_idm_vton
+    step1 = step1_virtual_tryon(PERSON, SHIRT)
+    result, mask = step2_idm_vton(step1, SHIRT, "shirt", person_path=PERSON, crop_region=crop_region)
+    assert Path(result).exists() and Path(mask).exists()
+    assert all(managed.owns(path) for path in DownloadingClient.download_dirs)
+    assert files_under(managed.session) == []
+    # The crop composites are moved too; the raw crop outputs and the crop itself are discarded
+    assert managed.moved == 3 and (managed.discarded > 0) == crop_region
+
+
+def test_failed_call_leaves_nothing(managed):
+    from two_step_pipeline import step2_idm_vton
+    DownloadingClient.broken = True
+    assert step2_idm_vton(PERSON, SHIRT, "shirt") == (None, None)
+    assert files_under(managed.session) == []
+
+
+def test_crop_with_encoder_keeps_both_composites_until_encoded(managed):
+    from output_encoding import OutputEncoder
+    from two_step_pipeline import step1_virtual_tryon, step2_idm_vton
+    step1 = step1_virtual_tryon(PERSON, SHIRT)
+    # One worker: the mask is encoded only after the result's done-callback ran
+    with OutputEncoder("webp", max_workers=1) as encoder:
+        result_future, mask_future = step2_idm_vton(step1, SHIRT, "shirt", person_path=PERSON, crop_region=True,
+                                                    encoder=encoder)
+        outputs = result_future.result(), mask_future.result()
+        encoder.wait()
+    assert all(Path(output["path"]).exists() for output in outputs)
+    assert files_under(managed.session) == []
+
+
+def test_unmanaged_work_dirs_are_removed(managed, monkeypatch):
+    from two_step_pipeline import run_two_step_pipeline
+    downloads.set_downloads(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    monkeypatch.delenv("VTON_SKIP_STEP2_THRESHOLD", raising=False)
+    created = []
+    mkdtemp = downloads.tempfile.mkdtemp
+
+    def tracked_mkdtemp(**kwargs):
+        created.append(mkdtemp(**kwargs))
+        return created[-1]
+
+    monkeypatch.setattr(downloads.tempfile, "mkdtemp", tracked_mkdtemp)
+    tracked = set(downloads._temp_dirs)
+
+    result, mask = run_two_step_pipeline(PERSON, SHIRT, "shirt", crop_region=True)
+    assert Path(result).exists() and Path(mask).exists()
+    # Stub outputs and the crop lived in call_dir() temp dirs; none is left behind
+    assert len(created) >= 3 and not any(Path(path).exists() for path in created)
+    assert downloads._temp_dirs == tracked
+
+
+def test_step1_download_is_freed_after_step2_with_encoder(managed, monkeypatch):
+    from output_encoding import OutputEncoder
+    from two_step_pipeline import run_two_step_pipeline
+    monkeypatch.delenv("VTON_SKIP_STEP2_THRESHOLD", raising=False)
+    with OutputEncoder("webp", max_workers=1) as encoder:
+        result, mask = run_two_step_pipeline(PERSON, SHIRT, "shirt", encoder=encoder)
+        result.result(), mask.result()
+        encoder.wait()
+    assert list((Path("examples") / "results").glob("step1_result_*.webp"))
+    assert files_under(managed.session) == []
+
+
+def test_failed_connect_leaves_nothing(managed, monkeypatch):
+    from two_step_pipeline import step2_idm_vton
+
+    def unreachable(*args, **kwargs):
+        raise ConnectionError("Space is sleeping")
+
+    monkeypatch.setattr(spaces, "Client", unreachable)
+    assert step2_idm_vton(PERSON, SHIRT, "shirt", person_path=PERSON, crop_region=True) == (None, None)
+    assert files_under(managed.session) == []
+    rows = [row for row in run_ledger.get_ledger().rows() if row["stage"] == "step2"]
+    assert len(rows) == 1 and "sleeping" in rows[0]["error"]
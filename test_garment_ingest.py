@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test script for garment ingest - new garments become trimmed, normalized catalog assets
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import run_ledger
+from garment_ingest import GarmentCatalog, compile_garment
+from run_ledger import RunLedger
+from validation import ValidationError
+
+EXAMPLES = Path(__file__).parent / "examples"
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+
+
+def framed_garment(path, color=None):
+    """The example shirt on a wide white canvas, saved as RGBA PNG"""
+    with Image.open(SHIRT) as shirt:
+        shirt = shirt.convert("RGB").resize((400, 480))
+    if color:
+        shirt = Image.blend(shirt, Image.new("RGB", shirt.size, color), 0.6)
+    canvas = Image.new("RGBA", (1400, 900), (255, 255, 255, 0))
+    canvas.paste(shirt, (500, 200))
+    canvas.save(path)
+    return str(path)
+
+
+def test_compile_trims_and_normalizes(tmp_path):
+    asset, meta = compile_garment(framed_garment(tmp_path / "shirt.png"))
+    assert asset.mode == "RGB" and asset.width <= 768 and abs(asset.width / asset.height - 0.75) < 0.01
+    left, top, right, bottom = meta["trim_box"]
+    assert left > 400 and right < 1000 and top > 100 and bottom < 800
+    assert meta["background"] == [255, 255, 255] and len(meta["phash"]) == 16
+
+
+def test_ingest_writes_assets_once(tmp_path):
+    catalog = GarmentCatalog(tmp_path / "catalog")
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    run_ledger.set_ledger(ledger)
+    try:
+        source = framed_garment(tmp_path / "shirt.png")
+        asset = catalog.ingest(source, "upper_body")
+        assert Path(asset) == tmp_path / "catalog" / "shirts" / "shirt.jpg"
+        assert Path(asset).stat().st_size < Path(source).stat().st_size
+        with Image.open(asset) as img:
+            assert img.format == "JPEG" and img.mode == "RGB" and not img.info.get("exif")
+
+        assert catalog.ingest(source, "upper_body") == asset
+        # The same garment re-saved as a JPEG is a near-duplicate
+        with Image.open(source) as img:
+            img.convert("RGB").save(tmp_path / "shirt_copy.jpg", quality=80)
+        assert catalog.ingest(str(tmp_path / "shirt_copy.jpg"), "upper_body") == asset
+        # Another colorway is a new asset
+        recolored = catalog.ingest(framed_garment(tmp_path / "red.png", color=(200, 20, 20)), "upper_body")
+        assert recolored != asset and Path(recolored).exists()
+    finally:
+        run_ledger.set_ledger(None)
+
+    index = json.loads((tmp_path / "catalog" / "assets.json").read_text())
+    assert sorted(index) == ["shirts/red.jpg", "shirts/shirt.jpg"]
+    rows = [row for row in ledger.rows() if row["stage"] == "ingest"]
+    assert len(rows) == 4 and sum(1 for row in rows if row["params"].get("reused")) == 2
+
+
+def test_same_file_as_another_type_is_a_new_asset(tmp_path):
+    catalog = GarmentCatalog(tmp_path / "catalog")
+    source = framed_garment(tmp_path / "shirt.png")
+    shirt = catalog.ingest(source, "upper_body")
+    dress = catalog.ingest(source, "dresses")
+    assert Path(dress) == tmp_path / "catalog" / "dresses" / "shirt.jpg" and Path(shirt).exists()
+    assert catalog.ingest(source, "dresses") == dress
+    assert catalog.find(source_hash=catalog.load()["shirts/shirt.jpg"]["source_sha256"],
+                        garment_type="dresses")[0] == dress
+
+
+def test_unknown_type_is_rejected_before_any_work(tmp_path, monkeypatch):
+    import garment_ingest
+    monkeypatch.setattr(garment_ingest, "compile_garment", lambda path: pytest.fail("compiled an invalid job"))
+    with pytest.raises(ValidationError, match="unknown garment_type 'shoes'"):
+        GarmentCatalog(tmp_path / "catalog").ingest(SHIRT, "shoes")
+    assert not (tmp_path / "catalog").exists()
+
+
+def test_ingest_off_copies_unchanged(tmp_path, monkeypatch):
+    from two_step_pipeline import auto_process_new_garment
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("VTON_INGEST", "off")
+    dest = auto_process_new_garment(SHIRT, "lower_body")
+    assert dest == str(Path("examples/garment_images/pants/upper_2.jpg"))
+    assert Path(dest).read_bytes() == Path(SHIRT).read_bytes()
+
+    monkeypatch.delenv("VTON_INGEST")
+    asset = auto_process_new_garment(SHIRT, "upper_body")
+    assert asset.endswith("shirts/upper_2.jpg") and np.asarray(Image.open(asset)).shape[2] == 3
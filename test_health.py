@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test script for circuit breakers and degraded routing - uses a stand-in Space client
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import run_ledger
+import spaces
+from health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, HealthMonitor
+from run_ledger import RunLedger
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+PANTS = str(EXAMPLES / "garment_images" / "pants" / "pants.jpg")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyClient:
+    """virtual-try-on fails while `down` is set; IDM-VTON always works"""
+
+    down = True
+    step1_calls = 0
+
+    def __init__(self, space, hf_token=None, **kwargs):
+        self.space = space
+
+    def predict(self, **kwargs):
+        out_dir = tempfile.mkdtemp()
+        image_path = os.path.join(out_dir, "image.png")
+        Image.new("RGB", (96, 128), "green").save(image_path)
+        if kwargs["api_name"] == "/virtual_tryon":
+            FlakyClient.step1_calls += 1
+            if FlakyClient.down:
+                raise RuntimeError("Space is in RUNTIME_ERROR")
+            return image_path
+        mask_path = os.path.join(out_dir, "mask.png")
+        Image.fromarray(np.zeros((128, 96, 3), dtype=np.uint8)).save(mask_path)
+        return (image_path, mask_path)
+
+
+def test_breaker_state_machine():
+    clock = Clock()
+    breaker = CircuitBreaker("space", slo_seconds=10, failure_threshold=2, slow_factor=3, cooldown=60, clock=clock)
+    breaker.record(5, RuntimeError("boom"))
+    breaker.record(5)
+    breaker.record(31)            # far outside the SLO counts as a strike
+    assert breaker.state == CLOSED
+    breaker.record(1, RuntimeError("boom"))
+    assert breaker.state == OPEN and not breaker.allow()
+
+    clock.now += 60
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()    # only one trial at a time
+    breaker.record(40)
+    assert breaker.state == OPEN and "trial failed" in breaker.reason
+
+    clock.now += 60
+    assert breaker.allow()
+    breaker.record(2)
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_failed_probe_keeps_circuit_open():
+    clock = Clock()
+    probes = []
+    monitor = HealthMonitor(failure_threshold=1, cooldown=30, clock=clock,
+                            probe=lambda space: probes.append(space) or (False, "PAUSED"))
+    monitor.record("space", 1, RuntimeError("down"))
+    assert not monitor.allow("space") and probes == []
+    clock.now += 30
+    assert not monitor.allow("space") and probes == ["space"]
+    assert monitor.breaker("space").reason == "probe: PAUSED"
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "Client", FlakyClient)
+    FlakyClient.down, FlakyClient.step1_calls = True, 0
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    run_ledger.set_ledger(ledger)
+    yield ledger
+    run_ledger.set_ledger(None)
+    spaces.set_health_monitor(None)
+
+
+def test_degrades_to_direct_idm_vton_and_recovers(workdir):
+    from two_step_pipeline import run_two_step_pipeline
+    clock = Clock()
+    spaces.set_health_monitor(HealthMonitor(failure_threshold=1, cooldown=60, clock=clock,
+                                            probe=lambda space: (True, "RUNNING")))
+
+    # Step 1 fails: this job and the next run IDM-VTON directly on the person
+    first, _ = run_two_step_pipeline(PERSON, SHIRT, "Test shirt")
+    second, _ = run_two_step_pipeline(PERSON, SHIRT, "Test shirt")
+    assert first.endswith("_degraded.png") and second.endswith("_degraded.png")
+    assert FlakyClient.step1_calls == 1
+
+    # Space recovered: after the cooldown a trial call closes the circuit
+    FlakyClient.down = False
+    clock.now += 60
+    third, _ = run_two_step_pipeline(PERSON, SHIRT, "Test shirt")
+    assert "degraded" not in third
+    assert spaces.get_health_monitor().breaker(spaces.VIRTUAL_TRYON_SPACE).state == CLOSED
+
+    step2_rows = [row for row in workdir.rows() if row["stage"] == "step2"]
+    assert [row["params"]["degraded"] for row in step2_rows] == [
+        "Step 1 failed", f"{spaces.VIRTUAL_TRYON_SPACE} circuit open", None
+    ]
+    assert step2_rows[0]["input_hashes"]["background"] == step2_rows[0]["input_hashes"]["person"]
+
+
+def test_lower_body_fails_instead_of_degrading(workdir):
+    from two_step_pipeline import run_two_step_pipeline
+    clock = Clock()
+    monitor = HealthMonitor(failure_threshold=1, cooldown=60, clock=clock, probe=lambda space: (True, "RUNNING"))
+    spaces.set_health_monitor(monitor)
+    monitor.record(spaces.VIRTUAL_TRYON_SPACE, 1, RuntimeError("down"))
+    assert not monitor.allow(spaces.VIRTUAL_TRYON_SPACE)
+
+    # Direct IDM-VTON cannot apply pants: no Space call, no "degraded" result
+    assert run_two_step_pipeline(PERSON, PANTS, "Test pants", "lower_body") is None
+    assert FlakyClient.step1_calls == 0
+    assert not [row for row in workdir.rows() if row["stage"] == "step2"]
+
+
+def test_failed_upload_preparation_does_not_claim_the_trial(workdir):
+    from two_step_pipeline import step2_idm_vton
+
+    class CorruptMaskCache:
+        def get(self, person_path, garment_type):
+            raise OSError("cached mask is truncated")
+
+    clock = Clock()
+    monitor = HealthMonitor(failure_threshold=1, cooldown=60, clock=clock, probe=lambda space: (True, "RUNNING"))
+    spaces.set_health_monitor(monitor)
+    monitor.record(spaces.IDM_VTON_SPACE, 1, RuntimeError("down"))
+    clock.now += 60
+
+    assert step2_idm_vton(PERSON, SHIRT, "Test shirt", person_path=PERSON,
+                          mask_cache=CorruptMaskCache()) == (None, None)
+    assert [row["error"] for row in workdir.rows() if row["stage"] == "step2"] == ["cached mask is truncated"]
+    # The half-open trial is still available to the next call
+    assert monitor.allow(spaces.IDM_VTON_SPACE)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test script for the background job manager behind the interactive menus
+"""
+
+import threading
+from pathlib import Path
+
+import pytest
+
+import spaces
+from jobs import JobManager, checkpoint
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+
+
+@pytest.fixture
+def manager():
+    managers = []
+
+    def make(workers):
+        managers.append(JobManager(workers, notify=False))
+        return managers[-1]
+    yield make
+    for jobs in managers:
+        jobs.shutdown(cancel=True)
+
+
+def blocked(started, release, name):
+    started.set()
+    print(f"{name} working")
+    assert release.wait(5)
+    return name
+
+
+def test_jobs_run_concurrently_with_their_own_output(manager, capsys):
+    jobs = manager(2)
+    release = threading.Event()
+    started = [threading.Event(), threading.Event()]
+    first = jobs.submit("first", blocked, started[0], release, "a")
+    second = jobs.submit("second", blocked, started[1], release, "b")
+    assert all(event.wait(5) for event in started)
+    assert first.state == second.state == "running"
+    assert jobs.command("jobs") and "#2 running" in capsys.readouterr().out
+
+    release.set()
+    assert first.wait(5) and second.wait(5)
+    assert (first.state, first.result, second.result) == ("done", "a", "b")
+    assert first.output() == "a working\n"
+    assert "working" not in capsys.readouterr().out
+    assert jobs.command("open 2") and "b working" in capsys.readouterr().out
+    assert not jobs.command("2")
+
+
+def test_cancel_queued_and_running_jobs(manager):
+    jobs = manager(1)
+    started, release = threading.Event(), threading.Event()
+    ran = []
+
+    def steps():
+        for step in range(3):
+            checkpoint()
+            ran.append(step)
+            if step == 0:
+                started.set()
+                assert release.wait(5)
+
+    running = jobs.submit("steps", steps)
+    queued = jobs.submit("never", ran.append, "queued")
+    failing = jobs.submit("fails", lambda: 1 / 0)
+    assert started.wait(5)
+    assert jobs.cancel(queued.id) == "cancelled" and queued.finished
+    assert jobs.cancel(running.id) == "cancelling" and "cancelling" in running.summary()
+    release.set()
+    assert running.wait(5) and failing.wait(5)
+    assert running.state == "cancelled" and ran == [0]
+    assert failing.state == "failed" and "ZeroDivisionError" in failing.error
+    assert "ZeroDivisionError" in failing.output()
+    assert jobs.cancel(99) is None
+
+
+def test_pipeline_job_results_can_be_opened(manager, tmp_path, monkeypatch):
+    from two_step_pipeline import run_two_step_pipeline
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    monkeypatch.delenv("VTON_SKIP_STEP2_THRESHOLD", raising=False)
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+
+    jobs = manager(2)
+    job = jobs.submit("Joe + upper_2", run_two_step_pipeline, PERSON, SHIRT, "white shirt")
+    assert job.wait(10) and job.state == "done"
+    paths = jobs.open(job.id, show=False)
+    assert len(paths) == 2 and all(Path(path).exists() for path in paths)
+    assert "Step 2 completed" in job.output()
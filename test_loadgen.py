@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test script for the open-loop load generator - a sleeping handler and the stub backend stand in for the Spaces
+"""
+
+import time
+from pathlib import Path
+
+import pytest
+
+import run_ledger
+import spaces
+from loadgen import (ledger_arrivals, load_trace, outfit_jobs, poisson_arrivals, rescale, run_config, run_load,
+                     saturation, summarize, timeline)
+from run_ledger import RunLedger
+
+
+def test_arrivals_and_traces(tmp_path):
+    arrivals = poisson_arrivals(20, 10, seed=3)
+    assert arrivals == sorted(arrivals) and 150 < len(arrivals) < 250 and arrivals[-1] < 10
+    assert poisson_arrivals(20, 10, seed=3) == arrivals
+
+    trace = tmp_path / "trace.csv"
+    trace.write_text("timestamp,user\n1000.5,a\n1002.5,b\n1001.5,c\n1010.5,d\n")
+    assert load_trace(trace) == [0.0, 1.0, 2.0, 10.0]
+    # 4 arrivals over 10s at 3/s: the same shape squeezed into 1s
+    assert rescale(load_trace(trace), rate=3) == pytest.approx([0.0, 0.1, 0.2, 1.0])
+    assert rescale([0.0, 4.0], speedup=2) == [0.0, 2.0]
+
+
+def test_ledger_trace_leaves_out_stub_traffic(tmp_path):
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    now = time.time()
+    ledger.record(started_at=now - 100, stage="step1", space=spaces.VIRTUAL_TRYON_SPACE)
+    ledger.record(started_at=now - 90, stage="step1", space=spaces.VIRTUAL_TRYON_SPACE, params={"backend": "stub"})
+    ledger.record(started_at=now - 80, stage="plan", params={"plan": "direct", "backend": "gradio"})
+    ledger.record(started_at=now - 70, stage="plan", params={"plan": "direct", "backend": "stub"})
+    ledger.record(started_at=now - 60, stage="step1", space=spaces.VIRTUAL_TRYON_SPACE, params={"backend": "gradio"})
+    run_ledger.set_ledger(ledger)
+    try:
+        assert ledger_arrivals("1h") == pytest.approx([0.0, 20.0, 40.0])
+        assert ledger_arrivals("1h", backend="stub") == pytest.approx([0.0, 20.0])
+    finally:
+        run_ledger.set_ledger(None)
+
+
+def test_open_loop_queues_and_sheds_under_overload():
+    served = []
+
+    def handler(job, tag):
+        served.append(tag)
+        time.sleep(0.05)
+
+    calm = run_load([i * 0.1 for i in range(5)], handler, workers=1)
+    calm_summary = summarize(calm, 0.5)
+    assert calm_summary["ok"] == 5 and calm_summary["wait"]["p95"] < 0.04
+    assert saturation(calm_summary, calm_summary["latency"]["p50"]) is None
+
+    served.clear()
+    # 40 requests/s at ~20/s capacity: arrivals do not wait for completions, so a queue builds up
+    burst = run_load([i * 0.025 for i in range(20)], handler, workers=1, queue_limit=4, shed_after=0.15)
+    summary = summarize(burst, 0.5)
+    assert summary["offered"] == 20 and summary["shed_queue_full"] > 0 and summary["shed_deadline"] > 0
+    assert summary["ok"] + summary["shed"] == 20 and len(served) == summary["ok"]
+    assert saturation(summary).startswith("shed")
+    rows = timeline(burst, 0.25)
+    assert sum(row["requests"] for row in rows) == 20 and max(row["queue"] for row in rows) >= 3
+
+    failing = summarize(run_load([0.0, 0.01], lambda job, tag: 1 / 0, workers=2), 0.01)
+    assert failing["errors"] == 2 and saturation(failing).startswith("completed")
+
+
+@pytest.fixture
+def stub_workdir(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    for folder in ("person_images", "garment_images"):
+        (tmp_path / "examples" / folder).symlink_to(Path(__file__).parent / "examples" / folder)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    monkeypatch.setenv("VTON_STUB_LATENCY", "0.1")
+    monkeypatch.setenv("VTON_STUB_SLOTS", "1")
+    monkeypatch.delenv("VTON_SKIP_STEP2_THRESHOLD", raising=False)
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    run_ledger.set_ledger(ledger)
+    yield ledger
+    run_ledger.set_ledger(None)
+
+
+def test_outfit_target_runs_on_existing_files(stub_workdir):
+    jobs = outfit_jobs()
+    assert jobs and all(Path(job[key]).is_file() for job in jobs for key in ("person", "pants", "upper"))
+    _, results, point = run_config("outfit", lambda rate: [0.0, 0.5], [2], workers=2, duration=1)
+    assert results[0][1]["ok"] == 2 and point == 2
+
+
+def test_sweep_on_stub_backend_finds_saturation(tmp_path, stub_workdir):
+    ledger = stub_workdir
+    # One stub slot per Space at 0.1s a call: 2/s keeps up, 40/s cannot
+    arrivals_for = lambda rate: [i / rate for i in range(2 if rate < 10 else 8)]
+    config, results, point = run_config("two_step", arrivals_for, [2, 40], workers=4, queue_limit=2, duration=1)
+
+    assert [reason is None for _, _, reason in results] == [True, False]
+    assert point == 2 and "4 worker(s)" in config
+    assert results[1][1]["shed_queue_full"] > 0
+    rows = [row for row in ledger.rows() if row["stage"] == "loadtest"]
+    assert [row["params"]["rate"] for row in rows] == [2, 40]
+    assert rows[1]["params"]["saturated"]
+    assert not list((tmp_path / "examples" / "results").iterdir())
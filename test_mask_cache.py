@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Test script for the person mask cache
+"""
+
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from mask_cache import MaskCache, mask_layer_from_output
+
+
+def make_mask_output(path):
+    """Fake IDM-VTON mask preview: noisy person with a gray garment block"""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (128, 96, 3), dtype=np.uint8)
+    pixels[32:96, 16:80] = 128
+    Image.fromarray(pixels).save(path)
+    return path
+
+
+def test_mask_layer_from_output(tmp_path):
+    """The gray block becomes opaque white, the rest transparent black"""
+    layer_path = mask_layer_from_output(make_mask_output(tmp_path / "mask.png"), tmp_path / "layer.png")
+    with Image.open(layer_path) as layer:
+        assert layer.mode == "RGBA"
+        pixels = np.asarray(layer)
+    assert (pixels[40:90, 20:76] == 255).all()
+    assert (pixels[:20] == 0).all()
+    # The Space flattens to RGB: outside the mask must stay black
+    assert np.asarray(Image.open(layer_path).convert("RGB"))[:20].max() == 0
+
+
+def test_cache_round_trip(tmp_path):
+    """Masks are keyed by person content and garment type"""
+    person = tmp_path / "person.jpg"
+    Image.new("RGB", (96, 128), (10, 20, 30)).save(person)
+    other = tmp_path / "other.jpg"
+    Image.new("RGB", (96, 128), (30, 20, 10)).save(other)
+
+    cache = MaskCache(tmp_path / "cache")
+    assert cache.get(person, "upper_body") is None
+
+    cache.put(person, "upper_body", make_mask_output(tmp_path / "mask.png"))
+    assert Path(cache.get(person, "upper_body")).exists()
+    assert cache.get(person, "lower_body") is None
+    assert cache.get(other, "upper_body") is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as d:
+        test_mask_layer_from_output(Path(d))
+        test_cache_round_trip(Path(d))
+    print("✅ Mask cache tests passed!")
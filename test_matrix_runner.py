@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test script for the matrix runner - uses a stand-in Space client and upload endpoint
+"""
+
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from pathlib import Path
+
+import httpx
+import numpy as np
+import pytest
+from PIL import Image
+
+import run_ledger
+import spaces
+import uploads
+from uploads import UploadCache
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSONS = [EXAMPLES / "person_images" / "Joe.jpg", EXAMPLES / "person_images" / "Full Man.jpg"]
+SHIRTS = sorted((EXAMPLES / "garment_images" / "shirts").iterdir())
+PANTS = [EXAMPLES / "garment_images" / "pants" / "pants.jpg"]
+
+
+class FakeClient:
+    calls = []
+    lock = threading.Lock()
+    fail_next = None
+
+    def __init__(self, space, hf_token=None, **kwargs):
+        self.space = space
+        self.upload_url = f"https://{space}/upload"
+        self.headers, self.cookies, self.ssl_verify, self.httpx_kwargs = {}, {}, True, {}
+
+    def predict(self, **kwargs):
+        with FakeClient.lock:
+            FakeClient.calls.append(kwargs)
+            error, FakeClient.fail_next = FakeClient.fail_next, None
+        if error:
+            raise error
+        out_dir = tempfile.mkdtemp()
+        image_path = os.path.join(out_dir, "image.png")
+        Image.new("RGB", (96, 128), (len(FakeClient.calls) % 256, 0, 0)).save(image_path)
+        if kwargs["api_name"] == "/virtual_tryon":
+            return image_path
+        mask_path = os.path.join(out_dir, "mask.png")
+        Image.fromarray(np.zeros((128, 96, 3), dtype=np.uint8)).save(mask_path)
+        return (image_path, mask_path)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "Client", FakeClient)
+    run_ledger.set_ledger(None)
+    monkeypatch.setattr(spaces, "_uploaders", {})
+    FakeClient.calls, FakeClient.fail_next = [], None
+    uploaded = Counter()
+
+    def upload_endpoint(request):
+        name = re.search(rb'filename="([^"]+)"', request.content).group(1).decode()
+        with FakeClient.lock:
+            uploaded[(str(request.url), name)] += 1
+        return httpx.Response(200, json=[f"/tmp/gradio/{len(uploaded)}/{name}"])
+
+    real_client = httpx.Client
+    monkeypatch.setattr(uploads.httpx, "Client",
+                        lambda **kwargs: real_client(transport=httpx.MockTransport(upload_endpoint), **kwargs))
+    cache = UploadCache()
+    spaces.set_upload_cache(cache)
+    yield uploaded
+    spaces.set_upload_cache(None)
+    cache.close()
+
+
+def test_build_jobs_shares_pants_step1():
+    from matrix_runner import build_jobs
+    columns, step1_jobs, cells = build_jobs(PERSONS, SHIRTS, PANTS, outfits=True)
+    # 2 shirts + 1 pants + 2 outfits per person, but only 3 distinct Step 1 calls
+    assert len(columns) == 5 and len(cells) == 10
+    assert len(step1_jobs) == 6
+    assert len(step1_jobs[(PERSONS[0], PANTS[0], "lower_body")]) == 3
+
+
+def test_matrix_uploads_once_and_builds_sheet(workdir):
+    from matrix_runner import run_matrix
+    results, sheet = run_matrix(PERSONS, SHIRTS, PANTS, outfits=True, max_concurrency=3)
+
+    assert len(results) == 10 and all(Path(r).exists() for r in results.values())
+    assert sum(1 for c in FakeClient.calls if c["api_name"] == "/virtual_tryon") == 6
+    assert sum(1 for c in FakeClient.calls if c["api_name"] == "/tryon") == 10
+    # Every input file reached each Space once; calls carried server references
+    assert max(workdir.values()) == 1
+    # Joe.jpg has an alpha channel: its validated RGB copy is what gets sent
+    assert (f"https://{spaces.VIRTUAL_TRYON_SPACE}/upload", "Joe.png") in workdir
+    assert all(c["garm_img"]["path"].startswith("/tmp/gradio/") for c in FakeClient.calls if "garm_img" in c)
+
+    with Image.open(sheet) as image:
+        assert image.size == (192 * 6, (256 + 18) * 3)
+
+
+def test_prefetch_uploads_job_to_every_space(workdir):
+    futures = spaces.prefetch_uploads({"person": str(PERSONS[0]), "pants": str(PANTS[0]), "upper": str(SHIRTS[0])})
+    assert len(futures) == 3
+    refs = [future.result()[0] for future in futures]
+    assert all(ref["path"].startswith("/tmp/gradio/") and "meta" not in ref for ref in refs)
+    assert sorted(workdir) == sorted([
+        (f"https://{spaces.VIRTUAL_TRYON_SPACE}/upload", PERSONS[0].name),
+        (f"https://{spaces.VIRTUAL_TRYON_SPACE}/upload", PANTS[0].name),
+        (f"https://{spaces.IDM_VTON_SPACE}/upload", SHIRTS[0].name),
+    ])
+    # A predict after the prefetch sends references without uploading again
+    client = spaces.connect(spaces.VIRTUAL_TRYON_SPACE)
+    client.predict(person_path={"path": str(PERSONS[0]), "meta": {"_type": "gradio.FileData"}},
+                   garment_path={"path": str(PANTS[0]), "meta": {"_type": "gradio.FileData"}},
+                   garment_type="lower_body", api_name="/virtual_tryon")
+    assert max(workdir.values()) == 1 and spaces.get_upload_cache().hits == 2
+
+
+def test_rejected_inputs_are_never_sent(workdir, tmp_path):
+    from matrix_runner import run_matrix
+    (tmp_path / "shirts").mkdir()
+    thumbnail = tmp_path / "shirts" / "thumbnail.jpg"
+    Image.new("RGB", (64, 64), "blue").save(thumbnail)
+
+    results, _ = run_matrix(PERSONS[:1], [SHIRTS[0], thumbnail], PANTS, outfits=True)
+    assert results[(PERSONS[0], "thumbnail")] is None
+    assert results[(PERSONS[0], "pants + thumbnail")] is None
+    assert all(results[(PERSONS[0], column)] for column in (SHIRTS[0].stem, "pants", f"pants + {SHIRTS[0].stem}"))
+    # 1 shirt + 1 pants Step 1, 3 Step 2; the thumbnail never reached a Space
+    assert len(FakeClient.calls) == 5
+    assert all(name != "thumbnail.jpg" for _, name in workdir)
+
+
+def test_only_a_lost_upload_is_retried(workdir):
+    def step1():
+        client = spaces.connect(spaces.VIRTUAL_TRYON_SPACE)
+        return client.predict(person_path={"path": str(PERSONS[1]), "meta": {"_type": "gradio.FileData"}},
+                              garment_path={"path": str(PANTS[0]), "meta": {"_type": "gradio.FileData"}},
+                              garment_type="lower_body", api_name="/virtual_tryon")
+
+    # A GPU error would fail again: one call, no re-upload
+    FakeClient.fail_next = RuntimeError("CUDA out of memory")
+    with pytest.raises(RuntimeError, match="out of memory"):
+        step1()
+    assert len(FakeClient.calls) == 1 and max(workdir.values()) == 1
+
+    # The Space lost the uploaded files: upload again and retry once
+    FakeClient.fail_next = RuntimeError("File /tmp/gradio/1/Full Man.jpg does not exist")
+    assert step1()
+    assert len(FakeClient.calls) == 3 and max(workdir.values()) == 2
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test script for the background output encoding stage
+"""
+
+from pathlib import Path
+
+from PIL import Image
+
+from output_encoding import OutputEncoder, encode_image, result_file
+
+
+def make_image(path, size=(300, 400), mode="RGB"):
+    """Write a simple gradient test image"""
+    img = Image.new(mode, size)
+    img.putdata([(x % 256, y % 256, 128) + ((255,) if mode == "RGBA" else ()) for y in range(size[1]) for x in range(size[0])])
+    img.save(path)
+    return path
+
+
+def test_result_file():
+    """gradio_client results come back as dict, str or tuple"""
+    assert result_file({"path": "/tmp/a.png"}) == "/tmp/a.png"
+    assert result_file("/tmp/b.png") == "/tmp/b.png"
+    assert result_file(("/tmp/c.png", "/tmp/d.png")) == "/tmp/c.png"
+
+
+def test_encode_formats_and_thumbnails(tmp_path):
+    """Every format writes the main file plus the requested thumbnails"""
+    src = make_image(tmp_path / "result.png", mode="RGBA")
+
+    for fmt, ext in [("png", ".png"), ("webp", ".webp"), ("jpeg", ".jpg")]:
+        output = encode_image(src, tmp_path / f"out_{fmt}", fmt, 80, (64, 128))
+        assert output["path"].endswith(ext)
+        assert Path(output["path"]).read_bytes() == output["bytes"]
+        assert output["encoded_size"] == len(output["bytes"])
+        assert sorted(output["thumbnails"]) == [64, 128]
+        with Image.open(output["thumbnails"][64]) as thumb:
+            assert max(thumb.size) == 64
+
+
+def test_png_stays_lossless(tmp_path):
+    """Optimized PNG must decode to the same pixels"""
+    src = make_image(tmp_path / "mask.png")
+    output = encode_image(src, tmp_path / "mask_out", "png")
+    with Image.open(src) as a, Image.open(output["path"]) as b:
+        assert list(a.getdata()) == list(b.getdata())
+
+
+def test_encoder_pool(tmp_path):
+    """Encodes run in the process pool and resolve to paths and bytes"""
+    src = make_image(tmp_path / "final.png")
+    with OutputEncoder("webp", quality=75, thumbnail_sizes=[32]) as encoder:
+        future = encoder.submit(src, tmp_path / "final_result")
+        outputs = encoder.wait()
+        # Finished encodes are not kept by the encoder (they hold the result bytes)
+        assert not encoder.pending
+    assert future.result()["path"] == str(tmp_path / "final_result.webp")
+    assert future.result()["bytes"] and all(output["bytes"] for output in outputs)
+
+
+if __name__ == "__main__":
+    import tempfile
+    with tempfile.TemporaryDirectory() as d:
+        test_result_file()
+        test_encode_formats_and_thumbnails(Path(d))
+        test_png_stays_lossless(Path(d))
+        test_encoder_pool(Path(d))
+    print("✅ Output encoding tests passed!")
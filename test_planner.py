@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Test script for the execution planner - uses a scratch ledger and a stand-in Space client
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import run_ledger
+import spaces
+from health import HealthMonitor
+from planner import LatencyModel, choose_plan, latency_model, run_planned
+from run_ledger import RunLedger
+from spaces import IDM_VTON_SPACE, VIRTUAL_TRYON_SPACE
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+PANTS = str(EXAMPLES / "garment_images" / "pants" / "pants.jpg")
+
+SHIRT_JOB = {"person": PERSON, "garment": SHIRT, "description": "shirt", "type": "upper_body"}
+PANTS_JOB = {"person": PERSON, "garment": PANTS, "description": "pants", "type": "lower_body"}
+OUTFIT_JOB = {"person": PERSON, "pants": PANTS, "upper": SHIRT, "description": "outfit"}
+
+
+def seeded_ledger(tmp_path, step1_seconds, step2_seconds, runs=10):
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    for i in range(runs):
+        ledger.record(started_at=time.time() - 60, stage="step1", space=VIRTUAL_TRYON_SPACE,
+                      total_seconds=step1_seconds)
+        ledger.record(started_at=time.time() - 60, stage="step2", space=IDM_VTON_SPACE,
+                      total_seconds=step2_seconds)
+    ledger.record(started_at=time.time() - 60, stage="step2", space=IDM_VTON_SPACE,
+                  total_seconds=999, error="timeout")
+    return ledger
+
+
+def test_cheapest_plan_within_budget(tmp_path):
+    model = LatencyModel(seeded_ledger(tmp_path, 20, 30), queue_depth=lambda space: 0)
+    no_monitor = HealthMonitor(probe=lambda space: (True, "ok"))
+
+    decision = choose_plan({**SHIRT_JOB, "budget": 60}, model, no_monitor)
+    assert decision["plan"] == "direct" and decision["latency"] == 30.0
+    assert decision["candidates"]["two_step"]["latency"] == 50.0
+
+    decision = choose_plan({**SHIRT_JOB, "budget": 60, "plans": ["two_step"]}, model, no_monitor)
+    assert decision["plan"] == "two_step" and decision["excluded"]["direct"] == "not allowed for this job"
+
+    assert choose_plan(PANTS_JOB, model, no_monitor)["plan"] == "two_step"
+    decision = choose_plan({**OUTFIT_JOB, "budget": 10}, model, no_monitor)
+    assert decision["plan"] == "layered" and "no plan fits 10s budget" in decision["reason"]
+
+
+def test_latency_model_is_shared_between_jobs(tmp_path, monkeypatch):
+    ledger = seeded_ledger(tmp_path, 20, 30)
+    reads = []
+    rows = ledger.rows
+    monkeypatch.setattr(ledger, "rows", lambda **kwargs: reads.append(kwargs) or rows(**kwargs))
+    run_ledger.set_ledger(ledger)
+    try:
+        model = latency_model()
+        assert latency_model() is model and len(reads) == 1
+        assert model.stage(IDM_VTON_SPACE)[0] == 30
+        # Expired: the ledger is read again
+        assert latency_model(ttl=0) is not model and len(reads) == 2
+        # Another ledger never gets the previous one's model
+        run_ledger.set_ledger(RunLedger(tmp_path / "other.sqlite3"))
+        assert latency_model().stage(IDM_VTON_SPACE)[2] == "default"
+    finally:
+        run_ledger.set_ledger(None)
+
+
+def test_queue_depth_and_open_circuits(tmp_path):
+    ledger = seeded_ledger(tmp_path, 20, 30)
+    busy = LatencyModel(ledger, queue_depth=lambda space: 2 if space == IDM_VTON_SPACE else 0)
+    assert busy.estimate("direct")["latency"] == 90.0
+
+    monitor = HealthMonitor(failure_threshold=1, probe=lambda space: (True, "ok"))
+    monitor.record(VIRTUAL_TRYON_SPACE, 1, RuntimeError("down"))
+    assert choose_plan(SHIRT_JOB, busy, monitor)["plan"] == "direct"
+    decision = choose_plan(PANTS_JOB, busy, monitor)
+    assert decision["plan"] is None and "circuit open" in decision["reason"]
+
+
+class FakeClient:
+    calls = []
+
+    def __init__(self, space, hf_token=None, **kwargs):
+        self.space = space
+
+    def predict(self, **kwargs):
+        FakeClient.calls.append(kwargs["api_name"])
+        out_dir = tempfile.mkdtemp()
+        image_path = os.path.join(out_dir, "image.png")
+        Image.new("RGB", (96, 128), "gray").save(image_path)
+        mask_path = os.path.join(out_dir, "mask.png")
+        Image.fromarray(np.zeros((128, 96, 3), dtype=np.uint8)).save(mask_path)
+        return (image_path, mask_path)
+
+
+def test_run_planned_records_decision(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "Client", FakeClient)
+    FakeClient.calls = []
+    ledger = seeded_ledger(tmp_path, 20, 30)
+    run_ledger.set_ledger(ledger)
+    try:
+        result, mask, decision = run_planned({**SHIRT_JOB, "budget": 45})
+    finally:
+        run_ledger.set_ledger(None)
+
+    assert decision["plan"] == "direct" and FakeClient.calls == ["/tryon"]
+    assert result.endswith("_direct.png") and Path(result).exists()
+    plan_rows = [row for row in ledger.rows() if row["stage"] == "plan"]
+    assert plan_rows[0]["params"]["plan"] == "direct"
+    assert "within 45s budget" in plan_rows[0]["params"]["reason"]
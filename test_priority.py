@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test script for priority classes - threads queue on a gate driven by a fake clock, the stub backend stands in for the Spaces
+"""
+
+import threading
+import time
+from pathlib import Path
+
+import run_ledger
+import spaces
+from priority import PriorityGate, PriorityGates, priority
+from run_ledger import RunLedger
+from streaming import stream_results
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+PANTS = str(EXAMPLES / "garment_images" / "pants" / "pants.jpg")
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def queue(gate, name, order):
+    """Start a thread waiting on `gate` in class `name`; returns once it is queued"""
+    waiting = gate.waiting
+    thread = threading.Thread(target=lambda: (gate.acquire(name), order.append(name)), daemon=True)
+    thread.start()
+    until(lambda: gate.waiting > waiting)
+    return thread
+
+
+def admit_one(gate, order, name):
+    count = len(order)
+    gate.release(name)
+    until(lambda: len(order) > count)
+
+
+def test_interactive_uses_reserved_slot_and_goes_first():
+    gate = PriorityGate("space", slots=2, reserved=1)
+    gate.acquire("bulk")
+    order = []
+    threads = [queue(gate, "bulk", order), queue(gate, "normal", order)]
+    # The second slot is reserved: only an interactive call gets it
+    threads.append(threading.Thread(target=lambda: (gate.acquire("interactive"), order.append("interactive")),
+                                    daemon=True))
+    threads[-1].start()
+    threads[-1].join(timeout=5)
+    assert order == ["interactive"] and gate.waiting == 2
+
+    gate.release("interactive")
+    time.sleep(0.1)
+    assert order == ["interactive"]
+    admit_one(gate, order, "bulk")
+    admit_one(gate, order, "normal")
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ["interactive", "normal", "bulk"]
+    waits = {row["class"]: row for row in gate.status()}
+    assert waits["interactive"]["calls"] == 1 and waits["bulk"]["calls"] == 2
+
+
+def test_waiting_bulk_call_is_promoted():
+    clock = FakeClock()
+    gate = PriorityGate("space", slots=1, reserved=0, aging=60, clock=clock)
+    gate.acquire("normal")
+    order = []
+    threads = [queue(gate, "bulk", order)]
+    clock.now = 30
+    threads.append(queue(gate, "normal", order))
+    admit_one(gate, order, "normal")
+    assert order == ["normal"]
+
+    threads.append(queue(gate, "normal", order))
+    clock.now = 61
+    admit_one(gate, order, "normal")
+    assert order == ["normal", "bulk"] and gate.promoted == 1
+    admit_one(gate, order, "bulk")
+    for thread in threads:
+        thread.join(timeout=5)
+    assert order == ["normal", "bulk", "normal"]
+    bulk = next(row for row in gate.status() if row["class"] == "bulk")
+    assert bulk["max_wait"] == 61
+
+
+def test_stream_results_runs_jobs_in_the_given_class(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    gates = PriorityGates(slots=2)
+    spaces.set_priority_gates(gates)
+    run_ledger.set_ledger(RunLedger(tmp_path / "ledger.sqlite3"))
+    jobs = [{"person": PERSON, "garment": PANTS, "description": "pants", "type": "lower_body"}] * 2
+    try:
+        with priority("interactive"):
+            assert all(result.ok for result in stream_results(jobs, priority_class="bulk"))
+            assert all(result.ok for result in stream_results(jobs[:1]))
+    finally:
+        run_ledger.set_ledger(None)
+        spaces.set_priority_gates(None)
+    calls = {(row["space"], row["class"]): row["calls"] for row in gates.status()}
+    assert calls[(spaces.VIRTUAL_TRYON_SPACE, "bulk")] == 2 and calls[(spaces.IDM_VTON_SPACE, "bulk")] == 2
+    assert calls[(spaces.IDM_VTON_SPACE, "interactive")] == 1 and calls[(spaces.IDM_VTON_SPACE, "normal")] == 0
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Test script for the sampling profiler - profiles a replayed pipeline run
+"""
+
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import cassette
+import run_ledger
+import spaces
+from profiling import SamplingProfiler, _thread_cpu_ticks, profiled
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+
+
+class RecordingClient:
+    def __init__(self, space, hf_token=None, **kwargs):
+        self.space = space
+
+    def predict(self, **kwargs):
+        out_dir = tempfile.mkdtemp()
+        image_path = os.path.join(out_dir, "image.png")
+        Image.new("RGB", (768, 1024), "navy").save(image_path)
+        if kwargs["api_name"] == "/virtual_tryon":
+            return image_path
+        mask_path = os.path.join(out_dir, "mask.png")
+        Image.fromarray(np.zeros((1024, 768, 3), dtype=np.uint8)).save(mask_path)
+        return (image_path, mask_path)
+
+
+def spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+@pytest.mark.skipif(_thread_cpu_ticks(threading.get_native_id()) is None, reason="needs /proc")
+def test_cpu_mode_ignores_blocked_threads(tmp_path):
+    profiler = SamplingProfiler(interval=0.002, mode="cpu")
+    profiler.start()
+    sleeper = threading.Thread(target=time.sleep, args=(0.4,), name="sleeper")
+    worker = threading.Thread(target=spin, args=(0.4,), name="worker")
+    sleeper.start(), worker.start()
+    sleeper.join(), worker.join()
+    profiler.stop()
+
+    assert any(key.startswith("worker;") and "spin" in key for key in profiler.stacks)
+    assert not any(key.startswith("sleeper;") for key in profiler.stacks)
+    folded, summary = profiler.write(tmp_path / "cpu")
+    for line in folded.read_text().splitlines():
+        stack, weight = line.rsplit(" ", 1)
+        assert ";" in stack and int(weight) > 0
+    assert "spin (test_profiling.py" in summary.read_text()
+
+
+def test_custom_profiler_hook(tmp_path, monkeypatch):
+    monkeypatch.delenv("VTON_PROFILE", raising=False)
+    with profiled("off") as profiler:
+        assert profiler is None
+
+    class Hook:
+        events = []
+        def start(self): self.events.append("start")
+        def stop(self): self.events.append("stop")
+        def write(self, dest_stem):
+            self.events.append(Path(dest_stem).name.split("_")[0])
+            return [dest_stem]
+
+    with profiled("hooked", Hook(), tmp_path):
+        pass
+    assert Hook.events == ["start", "stop", "hooked"]
+
+
+def test_profile_replayed_pipeline(tmp_path, monkeypatch):
+    """Record once, then profile the replayed run - no Space involved"""
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    run_ledger.set_ledger(None)
+    from two_step_pipeline import run_two_step_pipeline
+
+    monkeypatch.setattr(spaces, "Client", RecordingClient)
+    cassette.use_cassette(tmp_path / "tape", mode="record")
+    run_two_step_pipeline(PERSON, SHIRT, "Test shirt")
+
+    monkeypatch.setattr(spaces, "Client", None)
+    cassette.use_cassette(tmp_path / "tape", mode="replay")
+    try:
+        with profiled("replay", SamplingProfiler(interval=0.001, mode="wall"), tmp_path / "profiles") as profiler:
+            assert run_two_step_pipeline(PERSON, SHIRT, "Test shirt")
+    finally:
+        cassette.use_cassette(None)
+    assert any("step2_idm_vton" in key for key in profiler.stacks)
+    assert len(list((tmp_path / "profiles").glob("replay_*.folded"))) == 1
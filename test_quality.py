@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for Step 1 quality scoring - stub backend outputs stand in for virtual-try-on results
+"""
+
+import time
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+import run_ledger
+import spaces
+from backends import StubBackend
+from planner import LatencyModel
+from quality import score_step1, step2_needed
+from run_ledger import RunLedger, refinement_summary
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Full Man.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+OTHER_SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "gucci upper.jpg")
+
+
+def test_score_separates_good_and_bad_results(tmp_path):
+    result, _ = StubBackend("stub")._try_on(PERSON, SHIRT, "upper_body")
+    good = score_step1(result, SHIRT, PERSON)
+    assert good["artifacts"] == [] and good["color"] > 0.7 and good["structure"] > 0.99
+    assert score_step1(result, OTHER_SHIRT, PERSON)["color"] < 0.3
+
+    assert score_step1(PERSON, SHIRT, PERSON)["artifacts"] == ["unchanged"]
+
+    bled = tmp_path / "bled.png"
+    with Image.open(result) as image:
+        image.rotate(8).save(bled)
+    assert "bleed" in score_step1(str(bled), SHIRT, PERSON)["artifacts"]
+
+
+def test_threshold_gates_refinement(tmp_path, monkeypatch):
+    result, _ = StubBackend("stub")._try_on(PERSON, SHIRT, "upper_body")
+    monkeypatch.delenv("VTON_SKIP_STEP2_THRESHOLD", raising=False)
+    assert step2_needed(result, SHIRT, PERSON) == (True, None)
+
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    run_ledger.set_ledger(ledger)
+    try:
+        assert step2_needed(result, SHIRT, PERSON, threshold=0.5)[0] is False
+        assert step2_needed(result, OTHER_SHIRT, PERSON, threshold=0.5)[0] is True
+    finally:
+        run_ledger.set_ledger(None)
+    assert refinement_summary(ledger.rows()) == (2, 1)
+
+
+def test_pipeline_skips_step2_and_planner_counts_it(tmp_path, monkeypatch):
+    from two_step_pipeline import run_two_step_pipeline
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    monkeypatch.setenv("VTON_SKIP_STEP2_THRESHOLD", "0.5")
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    run_ledger.set_ledger(ledger)
+    try:
+        for _ in range(5):
+            result, mask = run_two_step_pipeline(PERSON, SHIRT, "shirt")
+            assert result.endswith("_unrefined.png") and Path(result).exists() and mask is None
+    finally:
+        run_ledger.set_ledger(None)
+
+    stages = [row["stage"] for row in ledger.rows()]
+    assert stages.count("quality") == 5 and "step2" not in stages
+    for _ in range(5):
+        ledger.record(started_at=time.time(), stage="step2", space=spaces.IDM_VTON_SPACE, total_seconds=30,
+                      params={"backend": "stub"})
+    model = LatencyModel(ledger, queue_depth=lambda space: 0)
+    assert model.skip_rate == 1.0
+    skipping = model.estimate("two_step")["gpu_seconds"]
+    model.skip_rate = 0.0
+    assert model.estimate("two_step")["gpu_seconds"] == pytest.approx(skipping + 30, abs=0.1)
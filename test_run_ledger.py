@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test script for the run ledger and latency report
+"""
+
+import time
+
+import pytest
+
+from run_ledger import RunLedger, RunRecord, latency_report, parse_window, percentile
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == pytest.approx(50.5)
+    assert percentile(values, 99) == pytest.approx(99.01)
+    assert percentile([7], 95) == 7
+
+
+def test_parse_window():
+    assert parse_window("90m") == 5400
+    assert parse_window("24h") == 86400
+    assert parse_window("7d") == 7 * 86400
+    assert parse_window("30") == 30
+
+
+def test_record_and_report(tmp_path):
+    """Runs are stored with phases, bytes and cache outcome and grouped in the report"""
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    person = tmp_path / "person.jpg"
+    person.write_bytes(b"x" * 1000)
+
+    for i in range(10):
+        run = RunRecord(ledger, "step2", "space/idm", inputs={"person": person}, params={"seed": 42})
+        run.add_upload(person)
+        run.mark("predict")
+        run.cache = "hit" if i % 2 else "miss"
+        run.finish()
+    failed = RunRecord(ledger, "step1", "space/vto")
+    failed.finish(error=RuntimeError("queue full"))
+
+    rows = ledger.rows(since=time.time() - 60)
+    assert len(rows) == 11
+    assert rows[0]["params"] == {"seed": 42}
+    assert "predict" in rows[0]["timings"]
+    assert rows[0]["bytes_up"] == 1000
+    assert len(rows[0]["input_hashes"]["person"]) == 16
+
+    report = {r["stage"]: r for r in latency_report(rows)}
+    assert report["step2"]["runs"] == 10 and report["step2"]["errors"] == 0
+    assert report["step2"]["p50"] is not None
+    assert report["step1"]["errors"] == 1 and report["step1"]["p50"] is None
+
+    by_phase = latency_report(rows, by=("space",), phase="predict")
+    assert {r["space"] for r in by_phase} == {"space/idm", "space/vto"}
+
+
+def test_window_filters_old_runs(tmp_path):
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    ledger.record(started_at=time.time() - 3 * 86400, stage="step1", space="s", total_seconds=1.0)
+    ledger.record(started_at=time.time(), stage="step1", space="s", total_seconds=2.0)
+    assert len(ledger.rows(since=time.time() - 86400)) == 1
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the sharded batch runner - leases on a scratch directory, jobs on the CPU stub backend
+"""
+
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+import run_ledger
+import spaces
+from shard_runner import ShardStore, work
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSONS = [str(EXAMPLES / "person_images" / "Joe.jpg"), str(EXAMPLES / "person_images" / "Full Man.jpg")]
+GARMENTS = [(str(p), "upper_body") for p in sorted((EXAMPLES / "garment_images" / "shirts").iterdir())]
+GARMENTS.append((str(EXAMPLES / "garment_images" / "pants" / "pants.jpg"), "lower_body"))
+
+JOBS = [{"person": person, "garment": garment, "description": "garment", "type": garment_type}
+        for person in PERSONS for garment, garment_type in GARMENTS]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_leases_expire_and_are_taken_over(tmp_path):
+    clock = Clock()
+    store = ShardStore(tmp_path / "run", clock=clock)
+    assert store.plan([{"person": "p.jpg", "garment": f"g{i}.jpg"} for i in range(5)], shard_size=2) == 3
+    assert [len(store.jobs(shard)) for shard in store.shards()] == [2, 2, 1]
+
+    lease = store.claim("00000", "a", ttl=60)
+    assert lease.generation == 0 and store.claim("00000", "b", ttl=60) is None
+    clock.now += 50
+    assert store.renew(lease, ttl=60)
+    clock.now += 50
+    assert store.claim("00000", "b", ttl=60) is None
+
+    clock.now += 20
+    taken = store.claim("00000", "b", ttl=60)
+    assert taken.generation == 1 and taken.worker == "b"
+    assert not store.renew(lease, ttl=60)
+    assert store.status() == {"done": 0, "leased": 1, "expired": 0, "pending": 2, "jobs": 5,
+                              "finished": 0, "failed": 0}
+
+
+@pytest.fixture
+def stub_run(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    run_ledger.set_ledger(None)
+    store = ShardStore(tmp_path / "run")
+    store.plan(JOBS, shard_size=2)
+    return store
+
+
+def test_workers_split_the_run(stub_run):
+    workers = [threading.Thread(target=work, args=(stub_run.run_dir, f"w{i}"), kwargs={"poll": 0.05})
+               for i in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+
+    status = stub_run.status()
+    assert status["done"] == len(stub_run.shards()) and status["finished"] == len(JOBS)
+    assert len(list(stub_run.results_dir.glob("*_mask.png"))) == len(JOBS)
+    assert not list(stub_run.leases_dir.iterdir())
+    summaries = [json.loads(path.read_text()) for path in stub_run.done_dir.iterdir()]
+    assert len(summaries) == 3 and sum(summary["ok"] for summary in summaries) == len(JOBS)
+
+
+def test_expired_shard_resumes_where_it_stopped(stub_run):
+    clock = Clock()
+    store = ShardStore(stub_run.run_dir, clock=clock)
+    dead = store.claim("00000", "crashed", ttl=60)
+    first = store.jobs("00000")[0]["id"]
+    (store.results_dir / f"{first}.json").write_text('{"id": "%s", "error": null}' % first)
+
+    assert work(store.run_dir, "late", wait_for_others=False, clock=clock) == len(store.shards()) - 1
+    clock.now += 61
+    assert work(store.run_dir, "late", clock=clock) == 1
+    assert not store.renew(dead)
+    # The job finished before the crash was not run again
+    assert not (store.results_dir / f"{first}.png").exists()
+    assert store.status()["finished"] == len(JOBS)
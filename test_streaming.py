@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming API - uses a stand-in Space client
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import run_ledger
+import spaces
+
+EXAMPLES = Path(__file__).parent / "examples"
+JOE = str(EXAMPLES / "person_images" / "Joe.jpg")
+ARNAV = str(EXAMPLES / "person_images" / "Arnav_A.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+PANTS = str(EXAMPLES / "garment_images" / "pants" / "pants.jpg")
+
+
+class DelayClient:
+    """Step 2 for Joe is slow, so Arnav's job finishes first"""
+
+    def __init__(self, space, hf_token=None, **kwargs):
+        self.space = space
+
+    def predict(self, **kwargs):
+        out_dir = tempfile.mkdtemp()
+        image_path = os.path.join(out_dir, "image.png")
+        Image.new("RGB", (96, 128), "blue").save(image_path)
+        if kwargs["api_name"] == "/virtual_tryon":
+            return image_path
+        if kwargs["garment_des"] == "slow":
+            time.sleep(0.3)
+        mask_path = os.path.join(out_dir, "mask.png")
+        Image.fromarray(np.zeros((128, 96, 3), dtype=np.uint8)).save(mask_path)
+        return (image_path, mask_path)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "Client", DelayClient)
+    run_ledger.set_ledger(None)
+    return tmp_path
+
+
+def test_results_stream_in_completion_order(workdir):
+    from streaming import stream_results
+    jobs = [
+        {"person": JOE, "garment": SHIRT, "description": "slow", "type": "upper_body"},
+        {"person": ARNAV, "garment": SHIRT, "description": "fast", "type": "upper_body"},
+        {"person": ARNAV, "pants": PANTS, "upper": SHIRT, "description": "outfit"},
+        {"person": ARNAV, "description": "no garment"},
+    ]
+    results = list(stream_results(jobs, max_concurrency=4, load_bytes=True))
+
+    assert [r.index for r in results][-1] == 0
+    by_index = {r.index: r for r in results}
+    assert by_index[1].ok and by_index[1].image_bytes.startswith(b"\x89PNG")
+    assert {"queued", "step1", "step2", "total"} <= set(by_index[1].timings)
+    assert by_index[2].ok and "complete_outfit" in by_index[2].path
+    assert not by_index[3].ok and "garment" in by_index[3].error
+
+
+def test_jobs_are_pulled_lazily(workdir):
+    from streaming import stream_results
+    pulled = []
+
+    def jobs():
+        for i in range(100):
+            pulled.append(i)
+            yield {"person": JOE, "garment": SHIRT, "description": f"job {i}", "type": "upper_body"}
+
+    # window=1: nothing else is in flight while the consumer holds a result
+    stream = stream_results(jobs(), max_concurrency=1, window=1)
+    first = next(stream)
+    assert first.ok and Path(first.path).exists()
+    assert pulled == [0]
+    stream.close()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script for the quota-aware token scheduler
+"""
+
+import pytest
+
+from token_scheduler import QuotaExhausted, TokenBucket, TokenScheduler
+
+
+class FakeClock:
+    """Manual clock; sleeping just advances time"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def make_scheduler(tokens, clock, **kwargs):
+    return TokenScheduler(tokens, clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_bucket_refill():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1.0, capacity=2, clock=clock)
+    bucket.take(2)
+    assert bucket.time_until(1) == pytest.approx(1.0)
+    clock.now += 5
+    assert bucket.available() == 2
+
+
+def test_spreads_calls_across_tokens():
+    """Each call goes to the token with the most budget left"""
+    clock = FakeClock()
+    scheduler = make_scheduler(["hf_token_aaaaaaaa", "hf_token_bbbbbbbb"], clock,
+                               requests_per_minute=60, burst=4)
+    picked = [scheduler.acquire("space/a") for _ in range(4)]
+    assert picked.count("hf_token_aaaaaaaa") == 2
+    assert picked.count("hf_token_bbbbbbbb") == 2
+
+
+def test_paces_before_running_dry():
+    """Below the low-water mark calls slow down instead of failing later"""
+    clock = FakeClock()
+    scheduler = make_scheduler(["hf_token_aaaaaaaa"], clock, requests_per_minute=60, burst=4)
+    for _ in range(3):
+        scheduler.acquire("space/a")
+    assert clock.slept == []
+    scheduler.acquire("space/a")  # bucket hits zero: paced to the refill rate
+    assert clock.slept == [pytest.approx(1.0)]
+    scheduler.acquire("space/a")
+    assert sum(clock.slept) == pytest.approx(2.0)
+
+
+def test_quota_error_drains_token():
+    """A quota error moves traffic to the other token"""
+    clock = FakeClock()
+    scheduler = make_scheduler(["hf_token_aaaaaaaa", "hf_token_bbbbbbbb"], clock, daily_gpu_seconds=200)
+    token = scheduler.acquire("space/a", estimated_gpu_seconds=10)
+    scheduler.release(token, "space/a", 10, Exception("You have exceeded your GPU quota"),
+                      estimated_gpu_seconds=10)
+    other = scheduler.acquire("space/a", estimated_gpu_seconds=10)
+    assert other != token
+    left = {row["token"]: row["gpu_seconds_left"] for row in scheduler.report()}
+    assert min(left.values()) == 0
+
+
+def test_exhausted_budget_raises():
+    clock = FakeClock()
+    scheduler = make_scheduler(["hf_token_aaaaaaaa"], clock, daily_gpu_seconds=30)
+    with pytest.raises(QuotaExhausted):
+        scheduler.acquire("space/a", estimated_gpu_seconds=40)
+
+
+def test_state_persists(tmp_path):
+    clock = FakeClock()
+    state = tmp_path / "budget.json"
+    scheduler = make_scheduler(["hf_token_aaaaaaaa"], clock, state_path=state)
+    token = scheduler.acquire("space/a")
+    scheduler.release(token, "space/a", 100)
+    assert "hf_token_aaaaaaaa" not in state.read_text()
+    reloaded = make_scheduler(["hf_token_aaaaaaaa"], clock, state_path=state)
+    assert reloaded.report()[0]["gpu_seconds_left"] == pytest.approx(1400, abs=1)
+
+
+def test_failed_connect_gives_the_estimate_back(monkeypatch):
+    import downloads
+    import spaces
+
+    def unreachable(*args, **kwargs):
+        raise ConnectionError("Space is sleeping")
+
+    clock = FakeClock()
+    scheduler = make_scheduler(["hf_token_aaaaaaaa"], clock, daily_gpu_seconds=200)
+    monkeypatch.setattr(spaces, "Client", unreachable)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    spaces.set_health_monitor(None)
+    spaces.set_upload_cache(None)
+    downloads.set_downloads(None)
+    spaces.set_scheduler(scheduler)
+    try:
+        with pytest.raises(ConnectionError):
+            spaces.connect(spaces.IDM_VTON_SPACE)
+    finally:
+        spaces.set_scheduler(None)
+    assert scheduler.report()[0]["gpu_seconds_left"] == pytest.approx(200)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Test script for input validation - checks run locally and reject jobs before any Space is contacted
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import run_ledger
+import spaces
+from run_ledger import RunLedger
+from validation import ValidationError, validate_job
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Full Man.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+PANTS = str(EXAMPLES / "garment_images" / "pants" / "pants.jpg")
+
+
+def image(path, size=(600, 800), mode="RGB", color=(200, 150, 120)):
+    if mode == "CMYK":
+        color = (0, 60, 90, 20)
+    elif mode == "RGBA":
+        color = color + (0,)
+    Image.new(mode, size, color).save(path)
+    return str(path)
+
+
+def reason(job, **kwargs):
+    with pytest.raises(ValidationError) as info:
+        validate_job(job, **kwargs)
+    return str(info.value)
+
+
+def test_rejects_bad_inputs_with_a_reason(tmp_path):
+    corrupt = tmp_path / "corrupt.jpg"
+    corrupt.write_bytes(b"\xff\xd8\xff\xe0 not really a jpeg")
+    assert "not a readable image" in reason({"person": str(corrupt), "garment": SHIRT})
+    assert "not found" in reason({"person": str(tmp_path / "missing.jpg"), "garment": SHIRT})
+    assert "needs at least 192px" in reason({"person": image(tmp_path / "tiny.png", (64, 80)), "garment": SHIRT})
+    assert "aspect 3.00" in reason({"person": image(tmp_path / "wide.png", (1200, 400)), "garment": SHIRT})
+    assert "use JPEG, PNG or WebP" in reason({"person": image(tmp_path / "p.gif", mode="P"), "garment": SHIRT})
+    assert "expected lower_body" in reason({"person": PERSON, "garment": PANTS, "type": "upper_body"})
+    assert "unknown garment_type" in reason({"person": PERSON, "garment": SHIRT, "type": "hat"})
+    assert "job has no upper" in reason({"person": PERSON, "pants": PANTS, "upper": ""})
+
+    blank = image(tmp_path / "blank.png", color=(30, 60, 200))
+    assert validate_job({"person": blank, "garment": SHIRT})["person"] == blank
+    assert "no person found" in reason({"person": blank, "garment": SHIRT}, check_person_body=True)
+    validate_job({"person": PERSON, "garment": SHIRT}, check_person_body=True)
+
+
+def test_converts_color_modes(tmp_path):
+    output_dir = tmp_path / "validated"
+    job = validate_job({"person": image(tmp_path / "cmyk.jpg", mode="CMYK"), "pants": PANTS,
+                        "upper": image(tmp_path / "shirt.png", mode="RGBA")}, output_dir=output_dir)
+    assert job["pants"] == PANTS
+    for key in ("person", "upper"):
+        assert Path(job[key]).parent.parent == output_dir
+        with Image.open(job[key]) as converted:
+            assert converted.mode == "RGB"
+    # Fully transparent pixels are flattened onto white
+    with Image.open(job["upper"]) as upper:
+        assert upper.getpixel((0, 0)) == (255, 255, 255)
+
+    sixteen_bit = tmp_path / "gray16.png"
+    Image.fromarray(np.full((800, 600), 40000, dtype=np.uint16)).save(sixteen_bit)
+    with Image.open(validate_job({"person": str(sixteen_bit), "garment": SHIRT},
+                                 output_dir=output_dir)["person"]) as converted:
+        assert converted.getpixel((0, 0)) == (156, 156, 156)
+
+
+class NoClient:
+    def __init__(self, *args, **kwargs):
+        raise AssertionError("invalid jobs must not reach a Space")
+
+
+def test_pipeline_rejects_before_connecting(tmp_path, monkeypatch):
+    from two_step_pipeline import run_two_step_pipeline
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "Client", NoClient)
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    run_ledger.set_ledger(ledger)
+    try:
+        assert run_two_step_pipeline(image(tmp_path / "tiny.png", (100, 100)), SHIRT, "shirt") is None
+    finally:
+        run_ledger.set_ledger(None)
+    rows = ledger.rows()
+    assert [row["stage"] for row in rows] == ["validate"] and "192px" in rows[0]["error"]
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Test script for seed fan-out - uses a stand-in Space client
+"""
+
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import run_ledger
+import spaces
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+
+
+class SlowClient:
+    """Step 2 takes longer for larger seeds; tracks calls in flight"""
+
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    step1_calls = 0
+
+    def __init__(self, space, hf_token=None, **kwargs):
+        self.space = space
+
+    def predict(self, **kwargs):
+        out_dir = tempfile.mkdtemp()
+        image_path = os.path.join(out_dir, "image.png")
+        Image.new("RGB", (96, 128), (kwargs.get("seed", 0) % 256, 0, 0)).save(image_path)
+        if kwargs["api_name"] == "/virtual_tryon":
+            SlowClient.step1_calls += 1
+            return image_path
+        with SlowClient.lock:
+            SlowClient.in_flight += 1
+            SlowClient.peak = max(SlowClient.peak, SlowClient.in_flight)
+        time.sleep(0.02 * (kwargs["seed"] - 40))
+        with SlowClient.lock:
+            SlowClient.in_flight -= 1
+        mask_path = os.path.join(out_dir, "mask.png")
+        Image.fromarray(np.zeros((128, 96, 3), dtype=np.uint8)).save(mask_path)
+        return (image_path, mask_path)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "Client", SlowClient)
+    run_ledger.set_ledger(None)
+    SlowClient.peak = SlowClient.step1_calls = 0
+    return tmp_path
+
+
+def test_resolve_seeds():
+    from variants import resolve_seeds
+    assert resolve_seeds() == [42]
+    assert resolve_seeds(count=3) == [42, 43, 44]
+    assert resolve_seeds(seeds=[7, 7, 9], count=5) == [7, 9]
+
+
+def test_fan_out_streams_in_completion_order(workdir):
+    from variants import run_variants
+    results = list(run_variants(PERSON, SHIRT, "Test shirt", seeds=[45, 43, 44], max_concurrency=3))
+    assert [seed for seed, _, _ in results] == [43, 44, 45]
+    assert SlowClient.step1_calls == 1
+    assert len({result for _, result, _ in results}) == 3
+    assert all(Path(result).exists() for _, result, _ in results)
+
+
+def test_concurrency_limit_and_first_k(workdir):
+    from variants import run_variants
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(run_variants(PERSON, SHIRT, "Test shirt", count=4, first_k=1, executor=pool))
+        assert len(results) == 1 and results[0][0] == 42
+    # Calls already running finish; the last seed is cancelled before it starts
+    assert SlowClient.peak <= 2
+    assert len(list((workdir / "examples" / "results").glob("final_result_*"))) < 4
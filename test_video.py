@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test script for video try-on - a synthetic GIF runs through keyframe selection on the CPU stub backends
+"""
+
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+import run_ledger
+import spaces
+from run_ledger import RunLedger
+from video import iter_frames, run_video, shift_image
+
+EXAMPLES = Path(__file__).parent / "examples"
+PERSON = str(EXAMPLES / "person_images" / "Joe.jpg")
+OTHER_PERSON = str(EXAMPLES / "person_images" / "Full Man.jpg")
+SHIRT = str(EXAMPLES / "garment_images" / "shirts" / "upper_2.jpg")
+
+
+def marked(image, step):
+    """A copy with a tiny corner change (Pillow merges identical frames when saving a GIF)"""
+    image = image.copy()
+    image.paste((255, 0, 0) if step % 2 else (0, 0, 255), (0, 0, 2, 2))
+    return image
+
+
+def make_clip(path):
+    """4 near-identical frames, 4 frames panning slowly, then a cut to another photo for 4 frames"""
+    with Image.open(PERSON) as image:
+        first = image.convert("RGB").resize((240, 320))
+    with Image.open(OTHER_PERSON) as image:
+        second = image.convert("RGB").resize((240, 320))
+    frames = ([marked(first, step) for step in range(4)] + [shift_image(first, 2.5 * step, 0) for step in range(1, 5)]
+              + [marked(second, step) for step in range(4)])
+    frames[0].save(path, save_all=True, append_images=frames[1:], duration=80, loop=0)
+    return str(path)
+
+
+def test_video_calls_spaces_for_keyframes_only(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    monkeypatch.delenv("VTON_SKIP_STEP2_THRESHOLD", raising=False)
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    ledger = RunLedger(tmp_path / "ledger.sqlite3")
+    run_ledger.set_ledger(ledger)
+    try:
+        clip = make_clip(tmp_path / "clip.gif")
+        output, stats = run_video(clip, SHIRT, "white shirt", output_path=str(tmp_path / "out.gif"))
+    finally:
+        run_ledger.set_ledger(None)
+
+    assert stats["frames"] == 12 and stats["failed_frames"] == 0
+    assert stats["keyframes"] == 2 and stats["duplicates"] == 6 and stats["propagated"] == 4
+    assert stats["remote_calls"] == 4 and stats["calls_saved"] == 20
+
+    # Identical output frames (duplicates) are merged into longer ones, so compare the running time
+    frames = list(iter_frames(output))
+    assert sum(duration for _, duration in frames) == 12 * 80
+    with Image.open(clip) as original:
+        dressed = np.asarray(frames[0][0], dtype=np.int16) - np.asarray(original.convert("RGB"), dtype=np.int16)
+    assert np.abs(dressed).mean() > 1
+
+    stages = [row["stage"] for row in ledger.rows()]
+    assert stages.count("step1") == 2 and stages.count("step2") == 2
+    video_row = next(row for row in ledger.rows() if row["stage"] == "video")
+    assert video_row["params"]["calls_saved"] == 20 and video_row["error"] is None
+
+
+def test_keyframes_of_a_scene_reuse_the_previous_mask(tmp_path, monkeypatch):
+    (tmp_path / "examples" / "results").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(spaces, "_backend_specs", {})
+    monkeypatch.delenv("VTON_SKIP_STEP2_THRESHOLD", raising=False)
+    spaces.set_health_monitor(None)
+    spaces.set_backend("step1", "stub")
+    spaces.set_backend("step2", "stub")
+    run_ledger.set_ledger(None)
+    clip = make_clip(tmp_path / "clip.gif")
+
+    # A keyframe every other frame: 4 in the first scene, 2 in the second; whatever the pool size,
+    # every keyframe after the first of its scene reuses a mask
+    for workers in (1, 4, 4):
+        _, stats = run_video(clip, SHIRT, "white shirt", output_path=str(tmp_path / f"out{workers}.gif"),
+                             max_concurrency=workers, max_gap=2, duplicate=0)
+        assert stats["keyframes"] == 6 and stats["mask_reuse"] == 4
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Quota-Aware Token Scheduler
+Spreads Space calls across several Hugging Face tokens. Each token keeps a
+request bucket per Space (rate limit) and a rolling daily ZeroGPU budget, and
+calls are paced before a bucket runs dry instead of after the Space errors.
+
+Usage:
+    python token_scheduler.py          # print remaining budget per token
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_REQUESTS_PER_MINUTE = 10
+DEFAULT_BURST = 5
+DEFAULT_DAILY_GPU_SECONDS = 1500  # ZeroGPU daily quota of a PRO account (25 min)
+DEFAULT_ESTIMATED_GPU_SECONDS = 40
+LOW_WATER = 0.25
+
+# Error text the Spaces return when a token is out of quota / rate limited
+QUOTA_ERRORS = ("exceeded your gpu quota", "zerogpu quota", "429", "rate limit", "too many requests")
+
+
+class QuotaExhausted(Exception):
+    """No configured token has budget left for this Space"""
+
+
+class TokenBucket:
+    """Classic token bucket: `capacity` units, refilled at `rate` units per second"""
+
+    def __init__(self, rate, capacity, clock=time.time):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.clock = clock
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self):
+        self._refill()
+        return self.level
+
+    def time_until(self, amount):
+        """Seconds until `amount` units are available (0 if they already are)"""
+        self._refill()
+        if self.level >= amount:
+            return 0.0
+        if amount > self.capacity or self.rate <= 0:
+            return float("inf")
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        """Remove `amount` units (negative amounts refund, up to capacity)"""
+        self._refill()
+        self.level = min(self.capacity, self.level - amount)
+
+    def drain(self):
+        self._refill()
+        self.level = min(self.level, 0)
+
+
+def token_id(token):
+    """Stable fingerprint used in the state file instead of the token itself"""
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def mask_token(token):
+    """Printable token label, e.g. hf_ab…wxyz"""
+    return f"{token[:5]}…{token[-4:]}" if len(token) > 12 else "hf_…"
+
+
+class TokenScheduler:
+    """Picks the token with the most budget left for each Space call"""
+
+    def __init__(self, tokens, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE, burst=DEFAULT_BURST,
+                 daily_gpu_seconds=DEFAULT_DAILY_GPU_SECONDS, state_path=None, clock=time.time, sleep=time.sleep):
+        if not tokens:
+            raise ValueError("TokenScheduler needs at least one token")
+        self.tokens = list(dict.fromkeys(tokens))
+        self.rate = requests_per_minute / 60.0
+        self.burst = burst
+        self.daily_gpu_seconds = daily_gpu_seconds
+        self.state_path = Path(state_path) if state_path else None
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self._requests = {}  # (token, space) -> TokenBucket
+        self._gpu = {
+            token: TokenBucket(daily_gpu_seconds / 86400.0, daily_gpu_seconds, clock)
+            for token in self.tokens
+        }
+        self._load_state()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a scheduler from HUGGINGFACE_TOKENS (comma separated), or return
+        None when it is not set and the single HUGGINGFACE_TOKEN is used as-is.
+        """
+        tokens = [t.strip() for t in os.getenv("HUGGINGFACE_TOKENS", "").split(",") if t.strip()]
+        if not tokens:
+            return None
+        return cls(
+            tokens,
+            requests_per_minute=float(os.getenv("VTON_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE)),
+            burst=float(os.getenv("VTON_REQUEST_BURST", DEFAULT_BURST)),
+            daily_gpu_seconds=float(os.getenv("VTON_DAILY_GPU_SECONDS", DEFAULT_DAILY_GPU_SECONDS)),
+            state_path=os.getenv("VTON_TOKEN_STATE") or None,
+        )
+
+    def _bucket(self, token, space):
+        key = (token, space)
+        if key not in self._requests:
+            self._requests[key] = TokenBucket(self.rate, self.burst, self.clock)
+        return self._requests[key]
+
+    def acquire(self, space, estimated_gpu_seconds=DEFAULT_ESTIMATED_GPU_SECONDS):
+        """
+        Return the token to use for one call to `space`, waiting if needed.
+
+        The token with the largest remaining share of its request bucket and
+        GPU budget wins, which spreads load evenly. Once the chosen bucket
+        drops below LOW_WATER the call is paced to the refill rate.
+        """
+        while True:
+            with self._lock:
+                best, best_score, wait = None, -1.0, float("inf")
+                for token in self.tokens:
+                    requests = self._bucket(token, space)
+                    gpu = self._gpu[token]
+                    token_wait = max(requests.time_until(1), gpu.time_until(estimated_gpu_seconds))
+                    if token_wait > 0:
+                        wait = min(wait, token_wait)
+                        continue
+                    score = min(requests.available() / requests.capacity, gpu.available() / gpu.capacity)
+                    if score > best_score:
+                        best, best_score = token, score
+
+                if best is not None:
+                    requests = self._bucket(best, space)
+                    requests.take(1)
+                    self._gpu[best].take(estimated_gpu_seconds)
+                    self._save_state()
+                    level = requests.available() / requests.capacity
+                    pace = (1 - level / LOW_WATER) / self.rate if level < LOW_WATER else 0.0
+
+            if best is not None:
+                if pace > 0:
+                    self.sleep(pace)
+                return best
+            if wait == float("inf"):
+                raise QuotaExhausted(f"All {len(self.tokens)} token(s) are out of budget for {space}")
+            print(f"⏳ Token budget low for {space}, waiting {wait:.1f}s")
+            self.sleep(wait)
+
+    def release(self, token, space, gpu_seconds, error=None,
+                estimated_gpu_seconds=DEFAULT_ESTIMATED_GPU_SECONDS):
+        """
+        Settle a call: charge the real time instead of the estimate (wall time,
+        so queueing is over-counted rather than under), and drain the token's
+        buckets if the Space reported a quota/rate error.
+        """
+        with self._lock:
+            gpu = self._gpu[token]
+            gpu.take(gpu_seconds - estimated_gpu_seconds)
+            if error is not None and any(marker in str(error).lower() for marker in QUOTA_ERRORS):
+                self._bucket(token, space).drain()
+                if "quota" in str(error).lower():
+                    gpu.drain()
+            self._save_state()
+
+    def report(self):
+        """Remaining budget per token and Space"""
+        with self._lock:
+            rows = []
+            for token in self.tokens:
+                gpu = self._gpu[token]
+                spaces = {space: round(bucket.available(), 2)
+                          for (t, space), bucket in self._requests.items() if t == token}
+                rows.append({
+                    "token": mask_token(token),
+                    "gpu_seconds_left": round(max(gpu.available(), 0), 1),
+                    "gpu_seconds_daily": self.daily_gpu_seconds,
+                    "requests_left": spaces,
+                })
+            return rows
+
+    def print_report(self):
+        print("\n🔑 Token budget:")
+        for row in self.report():
+            print(f"   {row['token']}: {row['gpu_seconds_left']:.0f}/{row['gpu_seconds_daily']:.0f} GPU s left")
+            for space, left in row["requests_left"].items():
+                print(f"      {space}: {left:.1f} requests in bucket")
+
+    def _load_state(self):
+        if not self.state_path or not self.state_path.exists():
+            return
+        state = json.loads(self.state_path.read_text())
+        ids = {token_id(token): token for token in self.tokens}
+        for key, (level, updated) in state.get("gpu", {}).items():
+            if key in ids:
+                bucket = self._gpu[ids[key]]
+                bucket.level, bucket.updated = level, updated
+        for key, (level, updated) in state.get("requests", {}).items():
+            key, space = key.split("|", 1)
+            if key in ids:
+                bucket = self._bucket(ids[key], space)
+                bucket.level, bucket.updated = level, updated
+
+    def _save_state(self):
+        if not self.state_path:
+            return
+        state = {
+            "gpu": {token_id(t): [b.level, b.updated] for t, b in self._gpu.items()},
+            "requests": {f"{token_id(t)}|{s}": [b.level, b.updated] for (t, s), b in self._requests.items()},
+        }
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self.state_path)
+
+if __name__ == "__main__":
+    env_file = Path(".env")
+    if env_file.exists():
+        with open(env_file, 'r') as f:
+            for line in f:
+                if line.strip() and not line.startswith('#'):
+                    key, value = line.strip().split('=', 1)
+                    os.environ[key] = value.strip('"')
+
+    scheduler = TokenScheduler.from_env()
+    if not scheduler:
+        print("❌ Set HUGGINGFACE_TOKENS=token1,token2 in .env to use the token scheduler")
+    elif not scheduler.state_path:
+        print("⚠️  VTON_TOKEN_STATE is not set - budgets are only tracked inside each process")
+    else:
+        scheduler.print_report()
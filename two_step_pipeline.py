@@ -5,12 +5,31 @@ Two-Step Virtual Try-On Pipeline
 2. Second: Use IDM-VTON for refined shirt results
 """
 
-from gradio_client import Client, handle_file
+from gradio_client import handle_file
 import os
 from pathlib import Path
+import threading
 import time
 import shutil
 
+from compositing import crop_layer, crop_to_region, paste_back
+from downloads import call_dir, discard, discard_when_done, get_downloads, take
+from garment_ingest import ingest_garment
+from jobs import JobManager, checkpoint, print_commands, run_or_submit
+from mask_cache import MaskCache
+from output_encoding import OutputEncoder, check_return_mode, load_result, result_file
+from priority import set_default_priority
+from profiling import profiled
+from quality import step2_needed
+from run_ledger import start_run
+from spaces import (IDM_VTON_SPACE, VIRTUAL_TRYON_SPACE, backend_name, connect, default_token, get_concurrency,
+                    get_health_monitor, get_priority_gates, get_scheduler, prefetch_uploads, requires_token)
+from validation import ValidationError, validate_or_reject
+
+# Step 1 downloads handed to Step 2 while the encoder writes their saved copy
+_step1_encodes = {}
+_step1_lock = threading.Lock()
+
 # Try to load from .env file
 env_file = Path(".env")
 if env_file.exists():
@@ -20,95 +39,255 @@ if env_file.exists():
                 key, value = line.strip().split('=', 1)
                 os.environ[key] = value.strip('"')
 
-# Get token from environment
-hf_token = os.getenv("HUGGINGFACE_TOKEN")
-if not hf_token:
+# Get token from environment (HUGGINGFACE_TOKENS=tok1,tok2 spreads calls over several)
+hf_token = default_token()
+if not hf_token and requires_token():
     print("❌ Please set your Hugging Face token!")
     print("You can either:")
     print("1. Create .env file with: HUGGINGFACE_TOKEN=your_token_here")
     print("2. Set environment variable: export HUGGINGFACE_TOKEN=your_token_here")
     exit(1)
 
-def step1_virtual_tryon(person_path, garment_path, garment_type="upper_body"):
+def step1_virtual_tryon(person_path, garment_path, garment_type="upper_body", encoder=None, output_tag="",
+                        returns="path"):
     """
     Step 1: Initial virtual try-on using blackmamba2408/virtual-try-on
+
+    With an `encoder` the intermediate result is re-encoded into the results
+    folder in the background and the downloaded file is returned for Step 2.
+    `output_tag` is appended to the file name, as in step2_idm_vton.
+
+    `returns="bytes"` / `"array"` gives the result back in memory (see
+    output_encoding.load_result) without saving it, unless an encoder
+    persists it in the background. `returns="download"` hands back the
+    downloaded file itself, unsaved, for a Step 2 in the same process; the
+    caller discard()s it when done.
     """
+    if returns != "download":
+        check_return_mode(returns)
+    run = start_run("step1", VIRTUAL_TRYON_SPACE,
+                    inputs={"person": person_path, "garment": garment_path},
+                    params={"garment_type": garment_type})
+    
     print("🚀 Step 1: Connecting to virtual-try-on space...")
-    client1 = Client("blackmamba2408/virtual-try-on", hf_token=hf_token)
+    client1 = connect(VIRTUAL_TRYON_SPACE)
+    run.params["backend"] = backend_name(VIRTUAL_TRYON_SPACE)
+    run.mark("connect")
     print("✅ Connected to virtual-try-on!")
     
     print("⏳ Processing initial virtual try-on...")
     start_time = time.time()
     
     try:
+        run.add_upload(person_path, garment_path)
         result = client1.predict(
             person_path=handle_file(person_path),
             garment_path=handle_file(garment_path),
             garment_type=garment_type,
             api_name="/virtual_tryon"
         )
+        run.mark("predict")
         
         end_time = time.time()
         print(f"✅ Step 1 completed in {end_time - start_time:.1f} seconds")
         
         # Save intermediate result
-        timestamp = int(time.time())
-        intermediate_path = f"./examples/results/step1_result_{timestamp}.png"
+        timestamp = f"{int(time.time())}_{output_tag}" if output_tag else int(time.time())
         
-        # The result is a dict, we need the path
-        if isinstance(result, dict) and 'path' in result:
-            shutil.copy(result['path'], intermediate_path)
-        elif isinstance(result, str):
-            shutil.copy(result, intermediate_path)
-        else:
-            # If result is a tuple/list, take the first element
-            shutil.copy(result[0] if isinstance(result, (list, tuple)) else result, intermediate_path)
+        # The result is a dict, str or tuple - we need the path
+        downloaded_path = result_file(result)
+        run.add_download(downloaded_path)
+        
+        if returns in ("bytes", "array"):
+            output = load_result(downloaded_path, returns)
+            if encoder:
+                encoder.submit(downloaded_path, f"./examples/results/step1_result_{timestamp}").add_done_callback(
+                    lambda _: discard(downloaded_path))
+            else:
+                discard(downloaded_path)
+            run.mark("load")
+            run.finish()
+            print(f"📤 Step 1 result returned in memory ({returns})")
+            return output
+        
+        if returns == "download":
+            run.mark("save")
+            run.finish()
+            return downloaded_path
+        
+        if encoder:
+            # Step 2 uploads the download itself; release_step1() discards it once both are done
+            future = encoder.submit(downloaded_path, f"./examples/results/step1_result_{timestamp}")
+            with _step1_lock:
+                _step1_encodes[downloaded_path] = future
+            run.mark("save")
+            run.finish()
+            print(f"📦 Step 1 result queued for {encoder.fmt} encoding")
+            return downloaded_path
+        
+        intermediate_path = take(downloaded_path, f"./examples/results/step1_result_{timestamp}.png")
+        run.mark("save")
+        run.finish()
         
         print(f"💾 Step 1 result saved: {intermediate_path}")
         return intermediate_path
         
     except Exception as e:
+        run.finish(error=e)
         print(f"❌ Step 1 failed: {e}")
         return None
 
-def step2_idm_vton(step1_result_path, original_garment_path, garment_description):
+def step2_idm_vton(step1_result_path, original_garment_path, garment_description, encoder=None,
+                   person_path=None, garment_type="upper_body", mask_cache=None,
+                   crop_region=False, is_checked_crop=False, seed=42, output_tag="", degraded=None,
+                   returns="path"):
     """
     Step 2: Refined processing using IDM-VTON
+
+    Returns (result_path, mask_path), or with an `encoder` a pair of Futures
+    resolving to the encoded outputs (see output_encoding.encode_image).
+    With `returns="bytes"` / `"array"` the pair is returned in memory and
+    nothing is saved unless an `encoder` is passed, which then writes the
+    files in the background.
+
+    With a `mask_cache` and the original `person_path`, a mask cached for this
+    person and garment type is sent as the editor layer and auto-masking is
+    turned off; on a miss the returned mask is stored for the next run.
+
+    With `crop_region` only the garment region (3:4, margins from the mask
+    when one is cached) is uploaded and the result is blended back into the
+    full-resolution image locally. The crop is already 3:4, so the Space's
+    own `is_checked_crop` is turned off for it.
+
+    `output_tag` is appended to the result file names so concurrent calls
+    (e.g. several seeds) do not overwrite each other.
+
+    `degraded` is the reason Step 1 was skipped when IDM-VTON runs directly
+    on the person photo; it is stored in the ledger and the file names.
     """
-    print("🚀 Step 2: Connecting to IDM-VTON space...")
-    client2 = Client("blackmamba2408/IDM-VTON", hf_token=hf_token)
-    print("✅ Connected to IDM-VTON!")
+    check_return_mode(returns)
+    run = start_run("step2", IDM_VTON_SPACE,
+                    inputs={"background": step1_result_path, "garment": original_garment_path, "person": person_path},
+                    params={"garment_type": garment_type, "description": garment_description,
+                            "crop_region": crop_region, "denoise_steps": 30, "seed": seed, "degraded": degraded})
+    if degraded:
+        output_tag = f"{output_tag}_degraded" if output_tag else "degraded"
     
-    print("⏳ Processing refined virtual try-on...")
-    start_time = time.time()
+    # Prepare the upload before claiming a circuit trial or connecting: a failure
+    # here must not leave the Space's breaker or token half-settled
+    cached_mask, background_path, crop_box, crop_dir = None, step1_result_path, None, None
+    try:
+        if mask_cache and person_path:
+            cached_mask = mask_cache.get(person_path, garment_type)
+            run.cache = "hit" if cached_mask else "miss"
+            if cached_mask:
+                print(f"🎭 Using cached mask for {Path(person_path).name} ({garment_type})")
+        
+        mask_layer = cached_mask
+        if crop_region:
+            crop_dir = call_dir("crop")
+            background_path, crop_box, image_size = crop_to_region(step1_result_path, garment_type,
+                                                                   mask_path=cached_mask, output_dir=crop_dir)
+            if cached_mask:
+                mask_layer = crop_layer(cached_mask, crop_box, image_size, output_dir=crop_dir)
+            print(f"✂️  Uploading {garment_type} region only: {crop_box}")
+    except Exception as e:
+        discard(crop_dir)
+        run.finish(error=e)
+        print(f"❌ Step 2 failed preparing the upload: {e}")
+        return None, None
+    run.mark("prepare")
+    
+    monitor = get_health_monitor()
+    if monitor and not monitor.allow(IDM_VTON_SPACE):
+        discard(crop_dir)
+        run.finish(error="circuit open")
+        print(f"❌ Step 2 skipped: {IDM_VTON_SPACE} is unavailable (circuit open)")
+        return None, None
     
     try:
+        print("🚀 Step 2: Connecting to IDM-VTON space...")
+        client2 = connect(IDM_VTON_SPACE)
+        run.params["backend"] = backend_name(IDM_VTON_SPACE)
+        run.mark("connect")
+        print("✅ Connected to IDM-VTON!")
+        
+        print("⏳ Processing refined virtual try-on...")
+        start_time = time.time()
+        
+        run.add_upload(background_path, mask_layer, original_garment_path)
         result = client2.predict(
             dict={
-                "background": handle_file(step1_result_path),
-                "layers": [],  # No manual mask
+                "background": handle_file(background_path),
+                "layers": [handle_file(mask_layer)] if mask_layer else [],  # No manual mask unless cached
                 "composite": None
             },
             garm_img=handle_file(original_garment_path),
             garment_des=garment_description,
-            is_checked=True,
-            is_checked_crop=False,
+            is_checked=not cached_mask,
+            is_checked_crop=is_checked_crop and not crop_box,
             denoise_steps=30,
-            seed=42,
+            seed=seed,
             api_name="/tryon"
         )
+        run.mark("predict")
         
         end_time = time.time()
         print(f"✅ Step 2 completed in {end_time - start_time:.1f} seconds")
         
         # Save final results
-        timestamp = int(time.time())
+        timestamp = f"{int(time.time())}_{output_tag}" if output_tag else int(time.time())
         final_result_path = f"./examples/results/final_result_{timestamp}.png"
         final_mask_path = f"./examples/results/final_mask_{timestamp}.png"
         
         if len(result) >= 2:
-            shutil.copy(result[0], final_result_path)
-            shutil.copy(result[1], final_mask_path)
+            run.add_download(result[0], result[1])
+        
+        if len(result) >= 2 and crop_box:
+            # Blend the crop back into the full-resolution Step 1 image; the raw crop outputs are not kept
+            downloaded = result
+            result = (
+                paste_back(step1_result_path, result[0], crop_box,
+                           Path(background_path).with_name("composite.png"), blend_mask_path=result[1]),
+                paste_back(step1_result_path, result[1], crop_box,
+                           Path(background_path).with_name("composite_mask.png"))
+            )
+            discard(*downloaded[:2])
+            run.mark("composite")
+        
+        if len(result) >= 2 and mask_cache and person_path and not cached_mask:
+            mask_cache.put(person_path, garment_type, result[1])
+            print(f"🎭 Mask cached for {Path(person_path).name} ({garment_type})")
+        
+        outputs = None
+        if len(result) >= 2 and returns != "path":
+            outputs = load_result(result[0], returns), load_result(result[1], returns)
+            run.mark("load")
+        
+        if len(result) >= 2 and encoder:
+            result_future = encoder.submit(result[0], f"./examples/results/final_result_{timestamp}")
+            mask_future = encoder.submit(result[1], f"./examples/results/final_mask_{timestamp}")
+            result_future.add_done_callback(lambda _: discard(result[0]))
+            mask_future.add_done_callback(lambda _: discard(result[1]))
+            # With a crop both composites live in crop_dir: remove it only after both encodes
+            discard_when_done([result_future, mask_future], crop_dir)
+            
+            run.mark("save")
+            run.finish()
+            print(f"📦 Final results queued for {encoder.fmt} encoding")
+            
+            return outputs if outputs is not None else (result_future, mask_future)
+        elif outputs is not None:
+            discard(result[0], result[1], crop_dir)
+            run.finish()
+            print(f"📤 Final results returned in memory ({returns})")
+            return outputs
+        elif len(result) >= 2:
+            take(result[0], final_result_path)
+            take(result[1], final_mask_path)
+            discard(crop_dir)
+            run.mark("save")
+            run.finish()
             
             print(f"📸 Final results saved:")
             print(f"   Main result: {final_result_path}")
@@ -116,17 +295,95 @@ def step2_idm_vton(step1_result_path, original_garment_path, garment_description
             
             return final_result_path, final_mask_path
         else:
+            discard(crop_dir, result_file(result))
+            run.finish(error="unexpected result format")
             print("❌ Unexpected result format from IDM-VTON")
             return None, None
             
     except Exception as e:
+        discard(crop_dir)
+        run.finish(error=e)
         print(f"❌ Step 2 failed: {e}")
         return None, None
 
-def run_two_step_pipeline(person_path, garment_path, garment_description, garment_type="upper_body"):
+def release_step1(step1_result, futures=()):
+    """
+    Discard a Step 1 download returned with an encoder (path mode) once its
+    encode and the `futures` still using it are done; saved results and the
+    person photo of a degraded job are left alone.
+    """
+    with _step1_lock:
+        encode = _step1_encodes.pop(step1_result, None)
+    if encode is not None:
+        discard_when_done([encode, *futures], step1_result)
+
+def step1_or_degrade(person_path, garment_path, garment_type="upper_body", encoder=None, output_tag="",
+                     returns="path"):
+    """
+    Run Step 1 unless virtual-try-on is unhealthy. Returns (Step 2 input,
+    degraded reason): the Step 1 result and None normally, or the person
+    photo and the reason when the job should go straight to IDM-VTON.
+    Only upper-body garments degrade: IDM-VTON alone cannot apply pants or
+    dresses, so those jobs fail with (None, None) instead. Without a health
+    monitor a failed Step 1 returns (None, None) as before.
+    """
+    monitor = get_health_monitor()
+    if monitor and not monitor.allow(VIRTUAL_TRYON_SPACE):
+        reason = f"{VIRTUAL_TRYON_SPACE} circuit open"
+    else:
+        try:
+            step1_result = step1_virtual_tryon(person_path, garment_path, garment_type,
+                                               encoder=encoder, output_tag=output_tag, returns=returns)
+        except Exception as e:
+            if not monitor:
+                raise
+            print(f"❌ Step 1 failed: {e}")
+            step1_result = None
+        if step1_result or not monitor:
+            return step1_result, None
+        reason = "Step 1 failed"
+    if garment_type != "upper_body":
+        print(f"❌ {reason} - direct IDM-VTON cannot apply {garment_type} garments")
+        return None, None
+    print(f"⚠️  {reason} - running direct IDM-VTON (degraded mode)")
+    return person_path, reason
+
+def step1_as_final(step1_result, encoder=None, output_tag="", returns="path"):
+    """Save a Step 1 result as the final image when the refinement was skipped (or load it, see step2_idm_vton)"""
+    timestamp = f"{int(time.time())}_{output_tag}" if output_tag else int(time.time())
+    dest = f"./examples/results/final_result_{timestamp}_unrefined"
+    if returns != "path":
+        output = load_result(step1_result, returns)
+        if encoder:
+            encoder.submit(step1_result, dest).add_done_callback(lambda _: discard(step1_result))
+        else:
+            discard(step1_result)
+        return output
+    if encoder:
+        return encoder.submit(step1_result, dest)
+    shutil.copy(step1_result, f"{dest}.png")
+    return f"{dest}.png"
+
+def run_two_step_pipeline(person_path, garment_path, garment_description, garment_type="upper_body", encoder=None,
+                          mask_cache=None, crop_region=False, returns="path"):
     """
     Run the complete two-step pipeline
+
+    Pass an OutputEncoder to get Futures of the encoded bytes/paths back
+    instead of PNG paths; encoding then overlaps with the next remote call.
+    A MaskCache lets Step 2 reuse the person's mask from earlier runs, and
+    `crop_region` uploads only the garment region to Step 2. While
+    virtual-try-on is unhealthy the job runs IDM-VTON directly on the person
+    (degraded mode, see step1_or_degrade). With VTON_SKIP_STEP2_THRESHOLD set
+    a Step 1 result that scores well locally is returned without Step 2 (the
+    mask is then None).
+
+    With `returns="bytes"` / `"array"` the result and mask come back in
+    memory (see step2_idm_vton) and the Step 1 intermediate is never saved:
+    Step 2 uploads the download, which is deleted afterwards.
     """
+    check_return_mode(returns)
+    in_memory = returns != "path"
     print("\n" + "="*60)
     print("🎭 Two-Step Virtual Try-On Pipeline")
     print("="*60)
@@ -136,30 +393,56 @@ def run_two_step_pipeline(person_path, garment_path, garment_description, garmen
     print(f"🏷️ Type: {garment_type}")
     print("-"*60)
     
-    # Check if input files exist
-    if not Path(person_path).exists():
-        print(f"❌ Person image not found: {person_path}")
-        return
-    if not Path(garment_path).exists():
-        print(f"❌ Garment image not found: {garment_path}")
+    # Check the inputs locally before spending remote GPU time
+    try:
+        job = validate_or_reject({"person": person_path, "garment": garment_path, "type": garment_type})
+    except ValidationError:
         return
+    person_path, garment_path = job["person"], job["garment"]
+    
+    # Upload the garment to IDM-VTON while Step 1 runs (with VTON_UPLOAD_ONCE)
+    prefetch_uploads({"person": person_path, "garment": garment_path})
     
-    # Step 1: Initial virtual try-on
-    step1_result = step1_virtual_tryon(person_path, garment_path, garment_type)
+    # Step 1: Initial virtual try-on (skipped in degraded mode)
+    step1_result, degraded = step1_or_degrade(person_path, garment_path, garment_type,
+                                              encoder=None if in_memory else encoder,
+                                              returns="download" if in_memory else "path")
     if not step1_result:
         print("❌ Pipeline failed at Step 1")
         return
     
     print("-"*60)
     
+    # Skip the refinement when Step 1 already scores well (VTON_SKIP_STEP2_THRESHOLD)
+    if not degraded:
+        needed, _ = step2_needed(step1_result, garment_path, person_path, garment_type)
+        if not needed:
+            print("\n🎉 Two-step pipeline completed with the Step 1 result (refinement skipped)")
+            final = step1_as_final(step1_result, encoder=encoder, returns=returns)
+            release_step1(step1_result, [final] if returns == "path" and encoder else ())
+            return final, None
+    
     # Step 2: IDM-VTON refinement
-    final_result, final_mask = step2_idm_vton(step1_result, garment_path, garment_description)
-    if not final_result:
+    final_result, final_mask = step2_idm_vton(
+        step1_result, garment_path, garment_description, encoder=encoder,
+        person_path=person_path, garment_type=garment_type, mask_cache=mask_cache,
+        crop_region=crop_region, degraded=degraded, returns=returns
+    )
+    if in_memory:
+        # The unsaved Step 1 download (a no-op for the person photo in degraded mode)
+        discard(step1_result)
+    else:
+        release_step1(step1_result)
+    if final_result is None:
         print("❌ Pipeline failed at Step 2")
         return
     
-    print("\n🎉 Two-step pipeline completed successfully!")
-    print(f"📁 Check results in: ./examples/results/")
+    if degraded:
+        print(f"\n⚠️  Completed in degraded mode (direct IDM-VTON): {degraded}")
+    else:
+        print("\n🎉 Two-step pipeline completed successfully!")
+    if not in_memory:
+        print(f"📁 Check results in: ./examples/results/")
     
     return final_result, final_mask
 
@@ -234,26 +517,13 @@ EXAMPLES = {
 }
 
 def auto_process_new_garment(garment_path, garment_type):
-    """Auto-process new garment by moving it to appropriate folder"""
-    garment_images_dir = Path("./examples/garment_images")
-    filename = Path(garment_path).name
-    
-    if garment_type == "upper_body":
-        dest_dir = garment_images_dir / "shirts"
-        dest_path = dest_dir / filename
-    else:  # lower_body
-        dest_dir = garment_images_dir / "pants"
-        dest_path = dest_dir / filename
-    
-    # Create directory if it doesn't exist
-    dest_dir.mkdir(exist_ok=True)
-    
-    # Copy the file if it's not already in the right place
-    if not dest_path.exists():
-        shutil.copy(garment_path, dest_path)
-        print(f"✅ New garment auto-processed and saved to: {dest_path}")
-    
-    return str(dest_path)
+    """Add a new garment to the catalog as a precompiled asset (see garment_ingest.py); returns its path"""
+    try:
+        return ingest_garment(garment_path, garment_type)
+    except ValidationError as e:
+        # Keep the old behaviour of accepting any file; the try-on itself will reject it
+        print(f"⚠️  Could not compile {Path(garment_path).name} ({e}) - using it as is")
+        return str(garment_path)
 
 def list_available_items():
     """List all available persons and garments"""
@@ -492,39 +762,102 @@ def select_garment():
         except ValueError:
             print("❌ Please enter a valid number")
 
+def run_all_examples(encoder=None, mask_cache=None):
+    """Menu option 3: every predefined example in turn; returns their results"""
+    print("🚀 Running all predefined examples...")
+    examples = list(EXAMPLES.items())
+    results = []
+    for i, (key, example) in enumerate(examples):
+        checkpoint()
+        if i + 1 < len(examples):
+            prefetch_uploads(examples[i + 1][1])  # next example uploads during this one
+        print(f"\n{'='*40}")
+        print(f"Running Example {key}")
+        print('='*40)
+        results.append(run_two_step_pipeline(
+            example['person'], 
+            example['garment'], 
+            example['description'],
+            example['type'],
+            encoder=encoder,
+            mask_cache=mask_cache
+        ))
+        print("-" * 40)
+    return results
+
+def run_outfit_garments(person_path, garments, encoder=None, mask_cache=None, pause=False):
+    """Menu option 1: the selected shirt and/or pants one after the other; returns their results"""
+    results = []
+    for i, garment in enumerate(garments, 1):
+        checkpoint()
+        print(f"\n{'='*50}")
+        print(f"Processing {garment['name']} ({i}/{len(garments)})")
+        print('='*50)
+        
+        results.append(run_two_step_pipeline(
+            person_path, 
+            garment['path'], 
+            garment['description'], 
+            garment['type'],
+            encoder=encoder,
+            mask_cache=mask_cache
+        ))
+        
+        if pause and i < len(garments):
+            input("\n⏸️  Press Enter to continue to next garment...")
+    
+    print(f"\n🎉 Complete outfit try-on finished! Check results folder.")
+    return results
+
 def main():
     """Interactive virtual try-on interface"""
+    # Someone is waiting on every call made from here; batch runs in this process queue behind it
+    set_default_priority("interactive")
     print("\n" + "="*60)
     print("🎭 Two-Step Virtual Try-On Pipeline")
     print("Step 1: virtual-try-on → Step 2: IDM-VTON")
     print("="*60)
     
+    # Optional background re-encoding (VTON_OUTPUT_FORMAT in .env)
+    encoder = OutputEncoder.from_env()
+    # Optional person mask cache (VTON_MASK_CACHE in .env)
+    mask_cache = MaskCache.from_env()
+    # Selections run as background jobs (VTON_JOBS_WORKERS in .env, 0 = foreground)
+    jobs = JobManager.from_env()
+    
     while True:
         print("\n🎯 Main Menu:")
         print("1. Start Complete Outfit Try-On (Shirt + Pants)")
         print("2. Start Single Garment Try-On")
         print("3. Run All Examples (Legacy)")
         print("4. Quit")
+        if jobs:
+            print_commands()
         
         choice = input("\nSelect option (1-4): ").strip()
         
+        if jobs and jobs.command(choice):
+            continue
+        
         if choice == "4":
+            if jobs:
+                jobs.close()
+            if encoder:
+                print("⏳ Finishing background encodes...")
+                encoder.shutdown()
+            if get_scheduler():
+                get_scheduler().print_report()
+            if get_concurrency():
+                get_concurrency().print_report()
+            if get_priority_gates():
+                get_priority_gates().print_report()
+            if get_downloads():
+                get_downloads().print_report()
             print("👋 Goodbye!")
             break
         
         elif choice == "3":
-            print("🚀 Running all predefined examples...")
-            for key, example in EXAMPLES.items():
-                print(f"\n{'='*40}")
-                print(f"Running Example {key}")
-                print('='*40)
-                run_two_step_pipeline(
-                    example['person'], 
-                    example['garment'], 
-                    example['description'],
-                    example['type']
-                )
-                print("-" * 40)
+            run_or_submit(jobs, "All examples", run_all_examples, encoder, mask_cache)
         
         elif choice == "2":
             print("\n🎬 Starting Single Garment Try-On...")
@@ -551,7 +884,9 @@ def main():
             confirm = input("\nProceed with virtual try-on? (y/n) [y]: ").strip().lower() or "y"
             
             if confirm == "y":
-                run_two_step_pipeline(person_path, garment_path, description, garment_type)
+                run_or_submit(jobs, f"{Path(person_path).stem} + {Path(garment_path).stem}", run_two_step_pipeline,
+                              person_path, garment_path, description, garment_type,
+                              encoder=encoder, mask_cache=mask_cache)
             else:
                 print("❌ Try-on cancelled.")
         
@@ -603,28 +938,16 @@ def main():
             confirm = input(f"\nProceed with {len(garments_to_process)} garment(s) try-on? (y/n) [y]: ").strip().lower() or "y"
             
             if confirm == "y":
-                # Process each garment
-                for i, garment in enumerate(garments_to_process, 1):
-                    print(f"\n{'='*50}")
-                    print(f"Processing {garment['name']} ({i}/{len(garments_to_process)})")
-                    print('='*50)
-                    
-                    run_two_step_pipeline(
-                        person_path, 
-                        garment['path'], 
-                        garment['description'], 
-                        garment['type']
-                    )
-                    
-                    if i < len(garments_to_process):
-                        input("\n⏸️  Press Enter to continue to next garment...")
-                
-                print(f"\n🎉 Complete outfit try-on finished! Check results folder.")
+                label = f"{Path(person_path).stem} outfit: " + " + ".join(Path(g['path']).stem for g in garments_to_process)
+                # Pausing between garments only makes sense in the foreground
+                run_or_submit(jobs, label, run_outfit_garments, person_path, garments_to_process,
+                              encoder, mask_cache, pause=jobs is None)
             else:
                 print("❌ Try-on cancelled.")
         
         else:
-            print("❌ Invalid choice. Please enter 1, 2, 3, or 4")
+            print("❌ Invalid choice. Please enter 1, 2, 3, 4 or a job command")
 
 if __name__ == "__main__":
-    main()
+    with profiled("two_step_pipeline"):
+        main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Upload-Once Cache
+gradio_client uploads every input file again on every predict, one file
+after another. With the upload cache on, each file is uploaded to a Space
+once (all files of a call in parallel, over pooled keep-alive connections)
+and later calls pass the server-side path instead. prefetch() starts the
+uploads of the next job in the background so they overlap with the
+current job's inference.
+
+Enable from .env / the environment:
+    VTON_UPLOAD_ONCE=1
+    VTON_UPLOAD_WORKERS=4
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import httpx
+from gradio_client import utils as client_utils
+
+from mask_cache import file_hash
+
+DEFAULT_UPLOAD_WORKERS = 4
+UPLOAD_TIMEOUT = 120
+# Error text of a predict whose uploaded files the Space no longer has (restart, temp cleanup)
+LOST_UPLOAD_ERRORS = ("no such file", "file not found", "filenotfounderror", "does not exist",
+                      "invalidpatherror", "cannot find file")
+
+
+def lost_upload(error):
+    """True when a predict failed because the Space lost a file uploaded earlier"""
+    return any(marker in str(error).lower() or marker in type(error).__name__.lower()
+               for marker in LOST_UPLOAD_ERRORS)
+
+
+def is_local_file(value):
+    """A handle_file() dict pointing at a local file (URLs are never uploaded)"""
+    return (client_utils.is_file_obj_with_meta(value)
+            and not client_utils.is_http_url_like(value["path"]))
+
+
+class UploadCache:
+    """Server-side references of files already uploaded, per Space and file content"""
+
+    def __init__(self, workers=DEFAULT_UPLOAD_WORKERS):
+        self.workers = workers
+        self._refs = {}        # (space, sha256) -> {"path": server path, "orig_name": ...}
+        self._key_locks = {}
+        self._hashes = {}      # (path, mtime, size) -> sha256
+        self._lock = threading.Lock()
+        self._http = {}        # ssl verify flag -> pooled httpx.Client
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload")
+        self.uploads = 0
+        self.hits = 0
+        self.bytes_uploaded = 0
+
+    @classmethod
+    def from_env(cls):
+        """Cache when VTON_UPLOAD_ONCE is set, otherwise None"""
+        if os.getenv("VTON_UPLOAD_ONCE", "").strip().lower() in ("1", "true", "yes"):
+            return cls(workers=int(os.getenv("VTON_UPLOAD_WORKERS", DEFAULT_UPLOAD_WORKERS)))
+        return None
+
+    def _hash(self, path):
+        stat = os.stat(path)
+        key = (str(path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is None:
+            digest = file_hash(path)
+            with self._lock:
+                self._hashes[key] = digest
+        return digest
+
+    def _http_client(self, verify):
+        """One keep-alive connection pool shared by every upload (per TLS verify setting)"""
+        with self._lock:
+            if verify not in self._http:
+                self._http[verify] = httpx.Client(
+                    verify=verify,
+                    timeout=UPLOAD_TIMEOUT,
+                    limits=httpx.Limits(max_connections=self.workers * 2, max_keepalive_connections=self.workers),
+                )
+            return self._http[verify]
+
+    def _post(self, client, path):
+        headers = dict(client.headers)
+        if client.cookies:
+            headers["cookie"] = "; ".join(f"{k}={v}" for k, v in client.cookies.items())
+        name = Path(path).name
+        with open(path, "rb") as f:
+            response = self._http_client(client.ssl_verify).post(
+                client.upload_url, headers=headers, files=[("files", (name, f))],
+            )
+        response.raise_for_status()
+        # No "meta" key: gradio_client passes the reference through untouched
+        return {"path": response.json()[0], "orig_name": client_utils.strip_invalid_filename_characters(name)}
+
+    def upload(self, client, space, path):
+        """Upload `path` to the Space behind `client` unless it already has it; returns (ref, key)"""
+        key = (space, self._hash(path))
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # One upload per file even when several jobs (or a prefetch) ask for it at once
+        with key_lock:
+            with self._lock:
+                ref = self._refs.get(key)
+                if ref:
+                    self.hits += 1
+                    return ref, key
+            if callable(client):
+                client = client()
+            ref = self._post(client, path)
+            with self._lock:
+                self._refs[key] = ref
+                self.uploads += 1
+                self.bytes_uploaded += os.path.getsize(path)
+            return ref, key
+
+    def resolve(self, client, space, kwargs):
+        """Replace local files in predict kwargs with server references (uploaded in parallel); returns (kwargs, keys)"""
+        paths = []
+        client_utils.traverse(kwargs, lambda value: paths.append(value["path"]) or value, is_local_file)
+        uploaded = dict(zip(paths, self._pool.map(lambda path: self.upload(client, space, path), paths)))
+        resolved = client_utils.traverse(kwargs, lambda value: dict(uploaded[value["path"]][0]), is_local_file)
+        return resolved, [uploaded[path][1] for path in paths]
+
+    def prefetch(self, space, paths, client):
+        """
+        Start uploading `paths` to `space` in the background; returns Futures.
+        `client` may be a callable that builds the gradio Client on first use,
+        so connecting overlaps with other work too.
+        """
+        futures = []
+        for path in dict.fromkeys(str(p) for p in paths if p):
+            if Path(path).exists():
+                futures.append(self._pool.submit(self.upload, client, space, path))
+        return futures
+
+    def invalidate(self, keys):
+        """Forget references the Space no longer accepts (e.g. its temp files were cleaned)"""
+        with self._lock:
+            for key in keys:
+                self._refs.pop(key, None)
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            for http in self._http.values():
+                http.close()
+            self._http.clear()
+
+    def print_report(self):
+        print(f"\n📤 Uploads: {self.uploads} file(s), {self.bytes_uploaded / 1e6:.1f} MB, "
+              f"{self.hits} re-upload(s) avoided")
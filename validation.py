@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Input Validation
+Checks a job's images locally before any upload, so a corrupt file, a
+thumbnail, a panorama or a garment passed with the wrong type is rejected
+in milliseconds instead of after a 30+ second remote round trip (or not at
+all, with bad output). Only the image headers are read unless a color mode
+has to be converted: CMYK, palette, grayscale, 16-bit and transparent
+images become RGB copies (transparency flattened onto white) under
+./examples/cache/validated/, and the job is given those paths instead.
+
+An optional body check (VTON_VALIDATE_BODY=1) looks for skin-colored pixels
+in a small thumbnail of the person photo to catch garment photos and empty
+frames passed as the person.
+
+Configure in .env / the environment:
+    VTON_VALIDATE=off        # skip validation entirely
+    VTON_VALIDATE_BODY=1
+
+Usage:
+    python validation.py "./examples/person_images/Joe.jpg" "./examples/garment_images/pants/pants.jpg" --type lower_body
+"""
+
+import argparse
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, UnidentifiedImageError
+
+from mask_cache import file_hash
+from run_ledger import start_run
+
+GARMENT_TYPES = ("upper_body", "lower_body", "dresses")
+SUPPORTED_FORMATS = ("JPEG", "PNG", "WEBP", "MPO")
+MIN_SIDE = 192
+MAX_SIDE = 8192
+# width / height
+ASPECT_LIMITS = {"person": (0.3, 1.6), "garment": (0.25, 4.0)}
+# Catalog folders whose name says what a garment is
+FOLDER_TYPES = {
+    "shirts": "upper_body", "tops": "upper_body", "upper": "upper_body",
+    "pants": "lower_body", "trousers": "lower_body", "skirts": "lower_body", "lower": "lower_body",
+    "dresses": "dresses",
+}
+MIN_SKIN_FRACTION = 0.005
+DEFAULT_OUTPUT_DIR = "./examples/cache/validated"
+
+
+class ValidationError(ValueError):
+    """A job input that would fail or produce bad output remotely; str() is the reason"""
+
+
+def _enabled(name, default):
+    return os.getenv(name, default).strip().lower() not in ("", "0", "off", "false", "no")
+
+
+def check_image(path, role="person"):
+    """Header-only checks of one image; returns its (format, mode, size) or raises ValidationError"""
+    name = Path(path).name
+    if not Path(path).is_file():
+        raise ValidationError(f"{role} image not found: {path}")
+    try:
+        with Image.open(path) as img:
+            image_format, mode, size = img.format, img.mode, img.size
+            # Structural check without decoding pixels (PNG chunk CRCs, etc.)
+            img.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError) as e:
+        raise ValidationError(f"{role} image {name} is not a readable image ({e})")
+    if image_format not in SUPPORTED_FORMATS:
+        raise ValidationError(f"{role} image {name} is {image_format}; use JPEG, PNG or WebP")
+
+    width, height = size
+    if min(size) < MIN_SIDE:
+        raise ValidationError(f"{role} image {name} is {width}x{height}; needs at least {MIN_SIDE}px per side")
+    if max(size) > MAX_SIDE:
+        raise ValidationError(f"{role} image {name} is {width}x{height}; at most {MAX_SIDE}px per side")
+    low, high = ASPECT_LIMITS[role]
+    if not low <= width / height <= high:
+        raise ValidationError(f"{role} image {name} has aspect {width / height:.2f} (width/height); "
+                              f"expected {low}-{high}")
+    return image_format, mode, size
+
+
+def check_garment_type(garment_path, garment_type):
+    """Reject unknown types and types contradicting the garment's catalog folder"""
+    if garment_type not in GARMENT_TYPES:
+        raise ValidationError(f"unknown garment_type '{garment_type}'; use one of {', '.join(GARMENT_TYPES)}")
+    folder = Path(garment_path).parent.name.lower()
+    expected = FOLDER_TYPES.get(folder)
+    if expected and expected != garment_type:
+        raise ValidationError(f"garment {Path(garment_path).name} is in {folder}/ but was passed as "
+                              f"{garment_type}; expected {expected}")
+
+
+def check_body(path):
+    """Cheap person-presence check: enough skin-colored pixels in a 128px thumbnail"""
+    with Image.open(path) as img:
+        img.draft("RGB", (128, 128))
+        thumb = img.convert("RGB")
+        thumb.thumbnail((128, 128))
+    ycbcr = np.asarray(thumb.convert("YCbCr"), dtype=np.int16)
+    cb, cr = ycbcr[..., 1], ycbcr[..., 2]
+    skin = (cb >= 77) & (cb <= 127) & (cr >= 133) & (cr <= 173)
+    if skin.mean() < MIN_SKIN_FRACTION:
+        raise ValidationError(f"no person found in {Path(path).name} (no skin-colored pixels)")
+    if np.asarray(thumb.convert("L"), dtype=np.float32).std() < 8:
+        raise ValidationError(f"{Path(path).name} is almost uniform; expected a photo of a person")
+
+
+def to_rgb(img):
+    """RGB version of an image in any mode; transparency is flattened onto white"""
+    if "A" in img.getbands() or (img.mode == "P" and "transparency" in img.info):
+        rgba = img.convert("RGBA")
+        flat = Image.new("RGB", rgba.size, (255, 255, 255))
+        flat.paste(rgba, mask=rgba.getchannel("A"))
+        return flat
+    if img.mode.startswith("I"):
+        # 16-bit grayscale: keep the high byte
+        high_byte = (np.asarray(img, dtype=np.uint32) >> 8).clip(0, 255).astype(np.uint8)
+        return Image.fromarray(high_byte).convert("RGB")
+    return img.convert("RGB")
+
+
+def normalize_mode(path, mode, output_dir=DEFAULT_OUTPUT_DIR):
+    """RGB copy of an image in another color mode (cached by content); RGB images are returned as is"""
+    if mode == "RGB":
+        return str(path)
+    dest = Path(output_dir) / file_hash(path)[:16] / f"{Path(path).stem}.png"
+    if dest.exists():
+        return str(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with Image.open(path) as img:
+        flat = to_rgb(img)
+    tmp_path = dest.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp.png")
+    flat.save(tmp_path)
+    os.replace(tmp_path, dest)
+    return str(dest)
+
+
+def validate_input(path, garment_type=None, check_person_body=None, output_dir=DEFAULT_OUTPUT_DIR):
+    """
+    Validate one image - a garment of `garment_type`, or the person without
+    one - and return the path that is safe to send; raises ValidationError.
+    """
+    if not _enabled("VTON_VALIDATE", "on"):
+        return str(path)
+    _, mode, _ = check_image(path, "garment" if garment_type else "person")
+    if garment_type:
+        check_garment_type(path, garment_type)
+    checked = normalize_mode(path, mode, output_dir)
+    if not garment_type and (check_person_body if check_person_body is not None
+                             else _enabled("VTON_VALIDATE_BODY", "off")):
+        check_body(checked)
+    return checked
+
+
+def validate_job(job, check_person_body=None, output_dir=DEFAULT_OUTPUT_DIR):
+    """
+    Validate a job dict (streaming.py format) and return a copy whose image
+    paths are safe to send; raises ValidationError with the reason.
+    """
+    if not _enabled("VTON_VALIDATE", "on"):
+        return dict(job)
+    if check_person_body is None:
+        check_person_body = _enabled("VTON_VALIDATE_BODY", "off")
+
+    outfit = "pants" in job and "upper" in job
+    if outfit:
+        garments = {"pants": "lower_body", "upper": "upper_body"}
+    else:
+        garments = {"garment": job.get("type", "upper_body")}
+
+    checked = dict(job)
+    for key in ["person"] + list(garments):
+        if not job.get(key):
+            raise ValidationError(f"job has no {key} image")
+        checked[key] = validate_input(job[key], garments.get(key), check_person_body=False, output_dir=output_dir)
+    if check_person_body:
+        check_body(checked["person"])
+    return checked
+
+
+def record_rejection(job, error):
+    """Store a rejected job in the run ledger (stage "validate") and print the reason"""
+    run = start_run("validate", None, inputs={key: job.get(key) for key in ("person", "garment", "pants", "upper")},
+                    params={"reason": str(error)})
+    run.finish(error=error)
+    print(f"❌ Invalid input: {error}")
+
+
+def validate_or_reject(job):
+    """validate_job that records and prints a rejection before raising"""
+    try:
+        return validate_job(job)
+    except ValidationError as e:
+        record_rejection(job, e)
+        raise
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check try-on inputs locally without calling any Space")
+    parser.add_argument("person")
+    parser.add_argument("garment", help="garment image (the upper garment with --pants)")
+    parser.add_argument("--type", default="upper_body", choices=GARMENT_TYPES)
+    parser.add_argument("--pants", help="pants image of a layered outfit")
+    parser.add_argument("--body", action="store_true", help="also run the person-presence check")
+    args = parser.parse_args()
+
+    if args.pants:
+        job = {"person": args.person, "pants": args.pants, "upper": args.garment}
+    else:
+        job = {"person": args.person, "garment": args.garment, "type": args.type}
+    start = time.perf_counter()
+    try:
+        checked = validate_job(job, check_person_body=args.body or None)
+    except ValidationError as e:
+        print(f"❌ Invalid ({(time.perf_counter() - start) * 1000:.0f} ms): {e}")
+        raise SystemExit(1)
+    print(f"✅ Valid ({(time.perf_counter() - start) * 1000:.0f} ms)")
+    for key, path in checked.items():
+        if path != job.get(key):
+            print(f"   {key}: converted to RGB → {path}")
+
+
+if __name__ == "__main__":
+    main()
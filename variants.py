@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Seed Fan-Out
+Runs Step 1 once and fans the IDM-VTON refinement out over several seeds
+concurrently, yielding each variant as soon as it finishes.
+
+Usage:
+    python variants.py "./examples/person_images/Joe.jpg" "./examples/garment_images/shirts/upper_2.jpg" \\
+        "Alternative upper garment" --count 4 --concurrency 2 --first 2
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from priority import inherit
+from profiling import profiled
+from two_step_pipeline import release_step1, step1_or_degrade, step2_idm_vton
+from validation import ValidationError, validate_or_reject
+
+DEFAULT_SEED = 42
+DEFAULT_CONCURRENCY = 2
+
+
+def resolve_seeds(seeds=None, count=None):
+    """Explicit seeds win; otherwise `count` consecutive seeds starting at 42"""
+    if seeds:
+        return list(dict.fromkeys(int(s) for s in seeds))
+    if count:
+        return [DEFAULT_SEED + i for i in range(count)]
+    return [DEFAULT_SEED]
+
+
+def run_variants(person_path, garment_path, garment_description, garment_type="upper_body",
+                 seeds=None, count=None, max_concurrency=DEFAULT_CONCURRENCY, first_k=None,
+                 encoder=None, mask_cache=None, crop_region=False, executor=None):
+    """
+    Generate several Step 2 variants of one try-on.
+
+    Yields (seed, result, mask) in completion order, where result/mask are
+    paths (or Futures with an `encoder`). At most `max_concurrency` Step 2
+    calls are in flight. With `first_k` the generator stops after K variants
+    and cancels the ones not started yet; calls already running finish in
+    the background. Pass an `executor` to share a pool (max_concurrency is
+    then the pool's own limit) and to be able to wait for those calls.
+    """
+    try:
+        job = validate_or_reject({"person": person_path, "garment": garment_path, "type": garment_type})
+    except ValidationError:
+        return
+    person_path, garment_path = job["person"], job["garment"]
+
+    seeds = resolve_seeds(seeds, count)
+    print(f"\n🎲 Variant mode: {len(seeds)} seed(s), {max_concurrency} at a time"
+          + (f", stop after {first_k}" if first_k else ""))
+
+    step1_result, degraded = step1_or_degrade(person_path, garment_path, garment_type, encoder=encoder)
+    if not step1_result:
+        print("❌ Variants failed at Step 1")
+        return
+
+    pool = executor or ThreadPoolExecutor(max_workers=max_concurrency)
+    futures = {
+        pool.submit(
+            inherit(step2_idm_vton), step1_result, garment_path, garment_description,
+            encoder=encoder, person_path=person_path, garment_type=garment_type,
+            mask_cache=mask_cache, crop_region=crop_region,
+            seed=seed, output_tag=f"seed{seed}", degraded=degraded
+        ): seed
+        for seed in seeds
+    }
+
+    delivered = 0
+    try:
+        for future in as_completed(futures):
+            seed = futures[future]
+            result, mask = future.result()
+            if result is None:
+                print(f"⚠️  Variant seed={seed} failed")
+                continue
+            delivered += 1
+            print(f"✨ Variant {delivered}/{first_k or len(seeds)} ready (seed={seed})")
+            yield seed, result, mask
+            if first_k and delivered >= first_k:
+                break
+    finally:
+        for future in futures:
+            future.cancel()
+        # The Step 1 download is freed once the variants still running have uploaded it
+        release_step1(step1_result, list(futures))
+        if not executor:
+            pool.shutdown(wait=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate several IDM-VTON variants of one try-on")
+    parser.add_argument("person")
+    parser.add_argument("garment")
+    parser.add_argument("description")
+    parser.add_argument("--type", default="upper_body", choices=["upper_body", "lower_body", "dresses"])
+    parser.add_argument("--seeds", type=int, nargs="+", help="explicit seeds")
+    parser.add_argument("--count", type=int, help="number of seeds starting at 42")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--first", type=int, help="stop after the first K variants")
+    args = parser.parse_args()
+
+    for path in (args.person, args.garment):
+        if not Path(path).exists():
+            print(f"❌ File not found: {path}")
+            return
+
+    results = list(run_variants(args.person, args.garment, args.description, args.type,
+                                seeds=args.seeds, count=args.count, max_concurrency=args.concurrency,
+                                first_k=args.first))
+    print(f"\n🎉 {len(results)} variant(s):")
+    for seed, result, mask in results:
+        print(f"   seed={seed}: {result}")
+
+
+if __name__ == "__main__":
+    with profiled("variants"):
+        main()
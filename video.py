@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Video Try-On
+Applies a garment to a short clip while sending only keyframes to the
+Spaces. Frames are decoded as a stream and compared on CPU with a small
+grayscale thumbnail of the last keyframe:
+
+    duplicate   barely differs from the keyframe: its result is reused as is
+    propagated  differs mostly by camera / body motion: the keyframe result
+                is shifted by the estimated motion (phase correlation) and
+                blended into the frame through the keyframe's garment mask
+    keyframe    anything else, a scene cut, or VTON_VIDEO_MAX_GAP frames
+                since the last keyframe: runs the two-step pipeline
+
+Keyframes reuse the garment mask of the previous keyframe in the same scene
+(shifted the same way) so IDM-VTON can skip auto-masking; a scene's
+keyframes therefore run in order, and separate scenes run in parallel.
+The clip is then decoded a second time and re-encoded with the per-frame
+results. GIF, animated WebP and APNG need only Pillow; other containers
+(MP4, MOV, ...) need imageio with PyAV (pip install "imageio[pyav]").
+
+Configure in .env / the environment:
+    VTON_VIDEO_DUPLICATE=1.5    # mean gray-level difference below which a frame is a duplicate
+    VTON_VIDEO_PROPAGATE=6      # difference left after motion compensation below which a frame is propagated
+    VTON_VIDEO_MAX_GAP=12       # frames between keyframes at most
+
+Usage:
+    python video.py clip.gif "./examples/garment_images/shirts/upper_2.jpg" --description "white shirt"
+"""
+
+import argparse
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageFilter, ImageSequence
+
+from downloads import call_dir, discard
+from mask_cache import binary_mask_from_output, mask_layer_from_output
+from output_encoding import load_result
+from priority import inherit
+from profiling import profiled
+from quality import step2_needed
+from run_ledger import start_run
+from two_step_pipeline import step1_or_degrade, step2_idm_vton
+
+PILLOW_FORMATS = (".gif", ".webp", ".png", ".apng")
+SIGNATURE_WIDTH = 96
+DEFAULT_DUPLICATE = 1.5
+DEFAULT_PROPAGATE = 6.0
+DEFAULT_MAX_GAP = 12
+# Above this raw difference a frame starts a new scene: no mask reuse across it
+SCENE_CUT = 40.0
+CHANGED_LEVEL = 24
+FEATHER = 4
+DEFAULT_DURATION_MS = 100
+
+
+def iter_frames(path):
+    """Yield (RGB PIL image, duration in ms) per frame without loading the whole clip"""
+    if Path(path).suffix.lower() in PILLOW_FORMATS:
+        with Image.open(path) as clip:
+            for frame in ImageSequence.Iterator(clip):
+                yield frame.convert("RGB"), frame.info.get("duration") or DEFAULT_DURATION_MS
+        return
+    iio = _imageio()
+    fps = iio.immeta(path, plugin="pyav").get("fps") or 1000 / DEFAULT_DURATION_MS
+    for array in iio.imiter(path, plugin="pyav"):
+        yield Image.fromarray(array).convert("RGB"), 1000 / fps
+
+
+def _imageio():
+    try:
+        import imageio.v3 as iio
+    except ImportError:
+        raise RuntimeError('Only GIF, WebP and APNG clips work with Pillow alone; '
+                           'pip install "imageio[pyav]" for other video formats')
+    return iio
+
+
+class ClipWriter:
+    """Writes frames to a GIF / WebP / APNG with Pillow, or streams them to a video file with imageio"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.frames, self.durations = [], []
+        self._video = None
+        if Path(path).suffix.lower() not in PILLOW_FORMATS:
+            self._video = _imageio().imopen(self.path, "w", plugin="pyav")
+
+    def write(self, frame, duration):
+        if self._video is None:
+            self.frames.append(frame)
+            self.durations.append(int(round(duration)))
+            return
+        if not self.frames:
+            self._video.init_video_stream("libx264", fps=1000 / duration)
+            self.frames.append(None)
+        self._video.write_frame(np.asarray(frame))
+
+    def close(self):
+        if self._video is not None:
+            self._video.close()
+            return self.path
+        if self.frames:
+            self.frames[0].save(self.path, save_all=True, append_images=self.frames[1:],
+                                duration=self.durations, loop=0)
+        return self.path
+
+
+def signature(frame):
+    """Small grayscale float thumbnail used for every frame comparison"""
+    height = max(1, round(frame.height * SIGNATURE_WIDTH / frame.width))
+    return np.asarray(frame.convert("L").resize((SIGNATURE_WIDTH, height), Image.BILINEAR), dtype=np.float32)
+
+
+def estimate_shift(a, b):
+    """(dx, dy) in thumbnail pixels that moves the content of `a` onto `b` (phase correlation)"""
+    fa, fb = np.fft.fft2(a - a.mean()), np.fft.fft2(b - b.mean())
+    cross = fb * np.conj(fa)
+    cross /= np.abs(cross) + 1e-9
+    corr = np.fft.ifft2(cross).real
+    dy, dx = np.unravel_index(np.argmax(corr), corr.shape)
+    height, width = corr.shape
+    return (dx - width if dx > width // 2 else dx), (dy - height if dy > height // 2 else dy)
+
+
+def aligned_difference(a, b, shift):
+    """Mean absolute difference of `b` and `a` shifted by `shift`, over the part they both cover"""
+    dx, dy = shift
+    height, width = a.shape
+    if abs(dx) >= width or abs(dy) >= height:
+        return float("inf")
+    a_part = a[max(0, -dy):height - max(0, dy), max(0, -dx):width - max(0, dx)]
+    b_part = b[max(0, dy):height - max(0, -dy), max(0, dx):width - max(0, -dx)]
+    return float(np.abs(a_part - b_part).mean())
+
+
+def shift_image(image, dx, dy):
+    """Translate a PIL image by (dx, dy) pixels; uncovered pixels are black / zero"""
+    shifted = Image.new(image.mode, image.size)
+    shifted.paste(image, (int(round(dx)), int(round(dy))))
+    return shifted
+
+
+class FramePlan:
+    """How one frame gets its result: its kind, its keyframe and the motion from that keyframe"""
+
+    def __init__(self, index, kind, keyframe, shift=(0, 0), scene=0):
+        self.index = index
+        self.kind = kind
+        self.keyframe = keyframe
+        self.shift = shift
+        self.scene = scene
+
+
+def plan_frames(frames, duplicate=DEFAULT_DUPLICATE, propagate=DEFAULT_PROPAGATE, max_gap=DEFAULT_MAX_GAP,
+                on_keyframe=None):
+    """
+    Classify a stream of frames against the last keyframe. Returns the
+    FramePlans and the keyframe signatures; `on_keyframe(index, frame)` is
+    called for each keyframe as soon as it is found.
+    """
+    plans, signatures = [], {}
+    key, key_signature, scene = None, None, 0
+    for index, frame in enumerate(frames):
+        current = signature(frame)
+        kind, shift = "keyframe", (0, 0)
+        if key_signature is not None and current.shape == key_signature.shape:
+            raw = float(np.abs(current - key_signature).mean())
+            if raw < duplicate:
+                kind = "duplicate"
+            elif raw < SCENE_CUT and index - key < max_gap:
+                shift = estimate_shift(key_signature, current)
+                if aligned_difference(key_signature, current, shift) < propagate:
+                    kind = "propagated"
+            if kind == "keyframe" and raw >= SCENE_CUT:
+                scene += 1
+        elif key_signature is not None:
+            scene += 1
+        if kind == "keyframe":
+            key, key_signature = index, current
+            signatures[index] = current
+            if on_keyframe:
+                on_keyframe(index, frame)
+        plans.append(FramePlan(index, kind, key, shift, scene))
+    return plans, signatures
+
+
+class ClipMasks:
+    """
+    Mask cache for the keyframes of one clip (same interface as MaskCache):
+    a keyframe gets the mask of the nearest earlier keyframe of its scene,
+    shifted by the motion between the two.
+    """
+
+    def __init__(self, work_dir, keyframes, signatures, scenes):
+        self.work_dir = Path(work_dir)
+        self.keyframes = keyframes      # frame path -> keyframe index
+        self.signatures = signatures
+        self.scenes = scenes
+        self.layers = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, person_path, garment_type):
+        index = self.keyframes.get(person_path)
+        with self._lock:
+            earlier = [i for i in self.layers
+                       if index is not None and i < index and self.scenes[i] == self.scenes[index]]
+            if not earlier:
+                self.misses += 1
+                return None
+            source = max(earlier)
+            self.hits += 1
+        dx, dy = estimate_shift(self.signatures[source], self.signatures[index])
+        with Image.open(self.layers[source]) as layer:
+            scale = layer.width / SIGNATURE_WIDTH
+            shifted = shift_image(layer.convert("RGBA"), dx * scale, dy * scale)
+        path = self.work_dir / f"layer_{index:06d}_from_{source:06d}.png"
+        shifted.save(path)
+        return str(path)
+
+    def put(self, person_path, garment_type, mask_output_path):
+        index = self.keyframes.get(person_path)
+        if index is None:
+            return None
+        path = self.work_dir / f"layer_{index:06d}.png"
+        mask_layer_from_output(mask_output_path, path)
+        with self._lock:
+            self.layers[index] = str(path)
+        return str(path)
+
+
+def _garment_mask(result, frame, mask_output=None):
+    """Where the keyframe result replaces the frame: IDM-VTON's mask, else the pixels Step 1 changed"""
+    if mask_output is not None:
+        mask = binary_mask_from_output(mask_output).resize(frame.size)
+    else:
+        changed = np.abs(np.asarray(result, dtype=np.int16) - np.asarray(frame, dtype=np.int16)).mean(axis=2)
+        mask = Image.fromarray(((changed > CHANGED_LEVEL) * 255).astype(np.uint8))
+        mask = mask.filter(ImageFilter.MinFilter(5)).filter(ImageFilter.MaxFilter(9))
+    return mask.filter(ImageFilter.GaussianBlur(FEATHER))
+
+
+def try_on_keyframe(frame_path, garment_path, garment_description, garment_type="upper_body", mask_cache=None):
+    """Two-step try-on of one keyframe; returns (result array, mask preview array or None, remote calls)"""
+    step1_result, degraded = step1_or_degrade(frame_path, garment_path, garment_type, returns="download")
+    if not step1_result:
+        return None, None, 1
+    calls = 0 if degraded else 1
+    try:
+        if not degraded:
+            needed, _ = step2_needed(step1_result, garment_path, frame_path, garment_type)
+            if not needed:
+                return load_result(step1_result, "array"), None, calls
+        result, mask = step2_idm_vton(step1_result, garment_path, garment_description, person_path=frame_path,
+                                      garment_type=garment_type, mask_cache=mask_cache, degraded=degraded,
+                                      returns="array")
+        return result, mask, calls + 1
+    finally:
+        if not degraded:
+            discard(step1_result)
+
+
+def run_video(clip_path, garment_path, garment_description, garment_type="upper_body", output_path=None,
+              max_concurrency=2, duplicate=None, propagate=None, max_gap=None):
+    """
+    Try a garment on every frame of a clip, calling the Spaces for keyframes
+    only, with up to `max_concurrency` scenes in flight. Returns (output
+    path, stats dict with the frame counts and the remote calls made and
+    saved).
+    """
+    duplicate = float(os.getenv("VTON_VIDEO_DUPLICATE", DEFAULT_DUPLICATE)) if duplicate is None else duplicate
+    propagate = float(os.getenv("VTON_VIDEO_PROPAGATE", DEFAULT_PROPAGATE)) if propagate is None else propagate
+    max_gap = int(os.getenv("VTON_VIDEO_MAX_GAP", DEFAULT_MAX_GAP)) if max_gap is None else max_gap
+    output_path = output_path or f"./examples/results/video_{int(time.time())}{Path(clip_path).suffix}"
+    run = start_run("video", None, inputs={"clip": clip_path, "garment": garment_path},
+                    params={"garment_type": garment_type, "duplicate": duplicate, "propagate": propagate,
+                            "max_gap": max_gap})
+    work_dir = call_dir("video")
+    print(f"\n🎞️  Video try-on: {clip_path}")
+
+    # Pass 1: classify the frames, keeping only the keyframes on disk
+    keyframe_paths = {}
+
+    def save_keyframe(index, frame):
+        path = str(Path(work_dir) / f"frame_{index:06d}.png")
+        frame.save(path)
+        keyframe_paths[path] = index
+
+    plans, signatures = plan_frames((frame for frame, _ in iter_frames(clip_path)), duplicate, propagate,
+                                    max_gap, on_keyframe=save_keyframe)
+    run.mark("decode")
+
+    # Scenes run in parallel, the keyframes of a scene in order: each finds the previous keyframe's mask stored
+    scenes = {plan.index: plan.scene for plan in plans}
+    masks = ClipMasks(work_dir, keyframe_paths, signatures, scenes)
+    scene_keyframes = {}
+    for path, index in keyframe_paths.items():
+        scene_keyframes.setdefault(scenes[index], []).append((index, path))
+
+    def run_scene(entries):
+        return {index: try_on_keyframe(path, garment_path, garment_description, garment_type, masks)
+                for index, path in sorted(entries)}
+
+    keyframes = {}
+    with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+        for future in [pool.submit(inherit(run_scene), entries) for entries in scene_keyframes.values()]:
+            keyframes.update(future.result())
+    run.mark("keyframes")
+
+    # Pass 2: decode again and build every frame from its keyframe's result
+    writer = ClipWriter(output_path)
+    garment_masks = {}
+    failed = 0
+    for plan, (frame, duration) in zip(plans, iter_frames(clip_path)):
+        result, mask_output, _ = keyframes[plan.keyframe]
+        if result is None:
+            failed += 1
+            writer.write(frame, duration)
+            continue
+        key_result = Image.fromarray(result).convert("RGB").resize(frame.size)
+        if plan.kind != "propagated":
+            writer.write(key_result, duration)
+            continue
+        if plan.keyframe not in garment_masks:
+            with Image.open(Path(work_dir) / f"frame_{plan.keyframe:06d}.png") as key_frame:
+                garment_masks[plan.keyframe] = _garment_mask(key_result, key_frame.convert("RGB"), mask_output)
+        scale = frame.width / SIGNATURE_WIDTH
+        dx, dy = plan.shift[0] * scale, plan.shift[1] * scale
+        warped = shift_image(key_result, dx, dy)
+        alpha = shift_image(garment_masks[plan.keyframe], dx, dy)
+        writer.write(Image.composite(warped, frame, alpha), duration)
+    writer.close()
+    discard(work_dir)
+    run.mark("encode")
+
+    counts = {kind: sum(1 for plan in plans if plan.kind == kind) for kind in ("keyframe", "duplicate", "propagated")}
+    calls = sum(entry[2] for entry in keyframes.values())
+    per_keyframe = calls / max(counts["keyframe"], 1)
+    stats = dict(frames=len(plans), keyframes=counts["keyframe"], duplicates=counts["duplicate"],
+                 propagated=counts["propagated"], failed_frames=failed, remote_calls=calls,
+                 calls_saved=round(per_keyframe * (len(plans) - counts["keyframe"])),
+                 mask_reuse=masks.hits)
+    run.params.update(stats)
+    run.finish(error=f"{failed} frame(s) without a result" if failed else None)
+    print_stats(stats, output_path)
+    return output_path, stats
+
+
+def print_stats(stats, output_path):
+    every_frame = stats["remote_calls"] + stats["calls_saved"]
+    share = stats["calls_saved"] / every_frame if every_frame else 0
+    print(f"\n🎞️  {stats['frames']} frame(s): {stats['keyframes']} keyframe(s), "
+          f"{stats['duplicates']} duplicate(s), {stats['propagated']} propagated")
+    print(f"   {stats['remote_calls']} remote call(s) instead of ~{every_frame}: "
+          f"{stats['calls_saved']} saved ({share:.0%}), {stats['mask_reuse']} keyframe mask(s) reused")
+    if stats["failed_frames"]:
+        print(f"   ⚠️  {stats['failed_frames']} frame(s) kept unchanged (their keyframe failed)")
+    print(f"💾 Clip saved: {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Try a garment on a short clip, calling the Spaces on keyframes only")
+    parser.add_argument("clip", help="GIF / WebP / APNG (or MP4 etc. with imageio[pyav])")
+    parser.add_argument("garment")
+    parser.add_argument("--description", default="garment")
+    parser.add_argument("--type", default="upper_body", choices=["upper_body", "lower_body", "dresses"])
+    parser.add_argument("--out", help="output clip (default ./examples/results/video_<time>.<clip extension>)")
+    parser.add_argument("--concurrency", type=int, default=2, help="scenes in flight (the keyframes of a scene run in order)")
+    parser.add_argument("--max-gap", type=int, help="frames between keyframes at most")
+    args = parser.parse_args()
+    run_video(args.clip, args.garment, args.description, args.type, args.out, args.concurrency,
+              max_gap=args.max_gap)
+
+
+if __name__ == "__main__":
+    with profiled("video"):
+        main()